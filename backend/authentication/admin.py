@@ -1,17 +1,29 @@
 from django.contrib import admin
+from .db import EstimatedCountPaginator, ReplicaAdminMixin
 from .models import StellarWallet, AuthenticationSession
 
 
 @admin.register(StellarWallet)
-class StellarWalletAdmin(admin.ModelAdmin):
+class StellarWalletAdmin(ReplicaAdminMixin, admin.ModelAdmin):
     list_display = ['user', 'public_key', 'created_at', 'last_login']
+    # The user column; StellarWallet.__str__ reads it too
+    list_select_related = ['user']
     search_fields = ['public_key', 'user__username']
     readonly_fields = ['created_at', 'last_login']
+    raw_id_fields = ['user']
+    paginator = EstimatedCountPaginator
+    # Skip the unfiltered COUNT(*) next to every search or filter
+    show_full_result_count = False
 
 
 @admin.register(AuthenticationSession)
-class AuthenticationSessionAdmin(admin.ModelAdmin):
+class AuthenticationSessionAdmin(ReplicaAdminMixin, admin.ModelAdmin):
     list_display = ['wallet', 'is_verified', 'created_at', 'expires_at']
+    # The wallet column is rendered with StellarWallet.__str__, which reads its user
+    list_select_related = ['wallet__user']
     list_filter = ['is_verified', 'created_at']
     search_fields = ['wallet__public_key', 'session_key']
     readonly_fields = ['created_at']
+    raw_id_fields = ['wallet']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,457 @@
+"""
+Async versions of the Stellar endpoints
+
+Served when settings.STELLAR_ASYNC_VIEWS is enabled and the project runs under
+an ASGI worker. Horizon calls go through the shared aiohttp-backed
+``ServerAsync`` so a slow upstream no longer pins a worker, and independent
+upstream calls are issued concurrently. Balances are the exception: they go
+through the same balance cache as the sync views (see balances.get_balances),
+and only a miss calls Horizon, on a thread. Payments are the other one: they
+are submitted by payments.submit_payments on a thread, so the sequence
+allocator, submission leases and channel accounts are shared with the sync
+views and the job queue.
+"""
+import functools
+import json
+import logging
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from rest_framework import status
+from stellar_sdk import Keypair
+from stellar_sdk.exceptions import NotFoundError
+
+from .balances import get_balances, invalidate_balances
+from .conditional import balances_etag, history_etag, not_modified, set_validators
+from .export import aexport_response
+from .history import afetch_history, aiter_history, fetch_indexed_history, page_cursors, page_link
+from .horizon import get_async_server, get_server
+from .jobs import get_payment_queue
+from .models import PaymentJob
+from .payments import PaymentError, SubmissionUncertain, build_asset, submit_payments
+from .push import AsyncSubscription, astream_events, balance_event, get_push_hub, missed_operations
+from .serializers import (
+    BalanceSerializer,
+    HistoryExportQuerySerializer,
+    HistoryQuerySerializer,
+    PaymentSerializer,
+    TransactionSerializer
+)
+from .snapshots import read_snapshot, snapshot_age, snapshot_history
+from .throttling import UpstreamBusy, aadmit_read, client_ident, client_wait, horizon_retry_after
+from .tokens import TokenError, bearer_token, decode_token
+
+logger = logging.getLogger(__name__)
+
+
+def _retry_later(message, status_code, wait):
+    response = JsonResponse({'error': message}, status=status_code)
+    response['Retry-After'] = str(math.ceil(wait))
+    return response
+
+
+async def _admission(request, scope, horizon_reads):
+    """
+    The 429 response when admission control turns the request away, else None
+    Same limits as TokenBucketThrottle and HorizonBudgetThrottle on the sync views
+    """
+    public_key = await _session_public_key(request)
+    if scope is not None:
+        wait = await sync_to_async(client_wait)(scope, client_ident(request, public_key))
+        if wait:
+            return _retry_later('Request was throttled.', status.HTTP_429_TOO_MANY_REQUESTS, wait)
+    if horizon_reads and public_key is None:
+        wait = await aadmit_read(scope or 'unscoped')
+        if wait:
+            return _retry_later(UpstreamBusy.default_detail, UpstreamBusy.status_code, wait)
+    return None
+
+
+def async_endpoint(*methods, scope=None, horizon_reads=False):
+    """
+    Method check, admission control and CSRF exemption for coroutine views
+    Django 4.2's view decorators wrap in a sync function, hiding the coroutine
+    `scope` and `horizon_reads` match the throttle_scope and horizon_reads of the sync views
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            if scope is not None or horizon_reads:
+                rejected = await _admission(request, scope, horizon_reads)
+                if rejected is not None:
+                    return rejected
+            return await view(request, *args, **kwargs)
+
+        # Same as APIView: unauthenticated API calls are not CSRF checked
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+async def _session_public_key(request):
+    """Public key from a valid bearer token or the authenticated session, or None"""
+    token = bearer_token(request)
+    if token is not None:
+        try:
+            claims = await sync_to_async(decode_token)(token)
+        except TokenError:
+            return None
+        return claims['sub']
+
+    def read_session():
+        if not request.session.get('authenticated'):
+            return None
+        return request.session.get('wallet_public_key')
+
+    return await sync_to_async(read_session)()
+
+
+async def _cached_balances(public_key):
+    """
+    balances.get_balances for coroutine views: same cache, shared with the sync views
+    Misses call Horizon through the sync client on a thread of their own
+    """
+    return await sync_to_async(get_balances, thread_sensitive=False)(get_server(), public_key)
+
+
+@async_endpoint('GET', scope='balance', horizon_reads=True)
+async def wallet_balance(request, public_key=None):
+    """
+    Get wallet balance from Stellar network
+    Shows XLM and all other asset balances
+    """
+    per_wallet = not public_key
+    if not public_key:
+        public_key = await _session_public_key(request)
+        if not public_key:
+            return JsonResponse(
+                {'error': 'Not authenticated'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+    try:
+        Keypair.from_public_key(public_key)
+
+        snapshot = None
+        if settings.STELLAR_SNAPSHOT_READS:
+            snapshot = await sync_to_async(read_snapshot)(public_key)
+        if snapshot is not None:
+            balances, cached, cache_age = snapshot.balances, True, snapshot_age(snapshot)
+        else:
+            balances, cached, cache_age = await _cached_balances(public_key)
+
+        etag = balances_etag(public_key, balances)
+        unchanged = not_modified(request, etag, per_wallet)
+        if unchanged is not None:
+            return unchanged
+
+        response = JsonResponse({
+            'public_key': public_key,
+            'balances': BalanceSerializer.represent(balances),
+            'total_assets': len(balances),
+            'cached': cached,
+            'cache_age': round(cache_age, 3)
+        }, status=status.HTTP_200_OK)
+        return set_validators(response, etag, per_wallet)
+
+    except Exception as e:
+        retry_after = await sync_to_async(horizon_retry_after)(e)
+        if retry_after is not None:
+            return _retry_later(
+                'Stellar network is busy. Please retry later.', status.HTTP_503_SERVICE_UNAVAILABLE, retry_after
+            )
+        error_message = str(e)
+        if "Resource Missing" in error_message or "404" in error_message:
+            return JsonResponse(
+                {'error': 'Account not found on Stellar network. Account may not be funded yet.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return JsonResponse(
+            {'error': f'Failed to fetch balance: {error_message}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+def _use_queue(request):
+    flag = request.GET.get('async')
+    if flag is None:
+        return settings.STELLAR_PAYMENT_ASYNC
+    return flag.lower() in ('1', 'true', 'yes')
+
+
+def _queue_payment(source_keypair, asset, **fields):
+    job = PaymentJob.objects.create(source_account=source_keypair.public_key, **fields)
+    get_payment_queue().enqueue(job, source_keypair, asset)
+    return job
+
+
+@async_endpoint('POST')
+async def send_payment(request):
+    """
+    Send XLM or other assets to another Stellar account
+    Same submission path as SendPaymentView, on a thread, so both views share
+    the sequence allocator, submission leases and channel accounts. With
+    ?async=1 (or STELLAR_PAYMENT_ASYNC) the payment is queued and 202 returns a job id.
+    """
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'error': 'Invalid JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = PaymentSerializer(data=data)
+    if not serializer.is_valid():
+        return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    destination = serializer.validated_data['destination']
+    amount = str(serializer.validated_data['amount'])
+    asset_code = serializer.validated_data.get('asset_code', 'XLM')
+    asset_issuer = serializer.validated_data.get('asset_issuer')
+    memo_text = serializer.validated_data.get('memo', '')
+    secret_key = serializer.validated_data['secret_key']
+    base_fee = serializer.validated_data.get('base_fee')
+    max_fee = serializer.validated_data.get('max_fee')
+
+    try:
+        source_keypair = Keypair.from_secret(secret_key)
+        source_public_key = source_keypair.public_key
+
+        try:
+            asset = build_asset(asset_code, asset_issuer)
+        except PaymentError as e:
+            return JsonResponse({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if _use_queue(request):
+            job = await sync_to_async(_queue_payment)(
+                source_keypair,
+                asset,
+                destination=destination,
+                amount=amount,
+                asset_code=asset_code,
+                asset_issuer=asset_issuer,
+                memo=memo_text or None,
+                base_fee=base_fee,
+                max_fee=max_fee
+            )
+            return JsonResponse({
+                'job_id': str(job.job_id),
+                'status': job.status,
+                'status_url': request.build_absolute_uri(reverse('payment-job', args=[job.job_id]))
+            }, status=status.HTTP_202_ACCEPTED)
+
+        # Blocks on the submission lease and Horizon; off the event loop, and
+        # not serialised with the other sync_to_async calls
+        response = await sync_to_async(submit_payments, thread_sensitive=False)(
+            source_keypair,
+            [{'destination': destination, 'asset': asset, 'amount': amount}],
+            memo_text=memo_text,
+            base_fee=base_fee,
+            max_fee=max_fee
+        )
+
+        # Both sides of the payment now have new balances
+        await sync_to_async(invalidate_balances)(source_public_key, destination)
+
+        return JsonResponse({
+            'success': True,
+            'transaction_hash': response['hash'],
+            'source_account': source_public_key,
+            'destination': destination,
+            'amount': amount,
+            'asset_code': asset_code,
+            'ledger': response.get('ledger'),
+            'memo': memo_text if memo_text else None
+        }, status=status.HTTP_200_OK)
+
+    except NotFoundError:
+        return JsonResponse(
+            {'error': 'Source or destination account not found on Stellar network'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    except SubmissionUncertain as e:
+        # Submitted, but neither confirmed nor rejected: it may still be applied
+        return JsonResponse({
+            'success': False,
+            'status': 'uncertain',
+            'error': f'Submission outcome unknown ({e}); look the transaction up before retrying',
+            'transaction_hash': e.transaction_hash,
+            'source_account': source_public_key,
+            'destination': destination,
+            'amount': amount,
+            'asset_code': asset_code
+        }, status=status.HTTP_504_GATEWAY_TIMEOUT)
+    except Exception as e:
+        return JsonResponse(
+            {'error': f'Payment failed: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@async_endpoint('GET', scope='history', horizon_reads=True)
+async def transaction_history(request, public_key=None):
+    """
+    Get transaction history for a Stellar account
+    """
+    per_wallet = not public_key
+    if not public_key:
+        public_key = await _session_public_key(request)
+        if not public_key:
+            return JsonResponse(
+                {'error': 'Not authenticated'},
+                status=status.HTTP_401_UNAUTHORIZED
+            )
+
+    query = HistoryQuerySerializer(data=request.GET)
+    if not query.is_valid():
+        return JsonResponse(query.errors, status=status.HTTP_400_BAD_REQUEST)
+    limit = min(query.validated_data['limit'], 100)  # Max 100 transactions per page
+    cursor = query.validated_data.get('cursor')
+    order = query.validated_data['order']
+
+    try:
+        Keypair.from_public_key(public_key)
+
+        transactions = None
+        source = 'snapshot'
+        if settings.STELLAR_SNAPSHOT_READS and cursor is None and order == 'desc':
+            transactions = await sync_to_async(snapshot_history)(public_key, limit)
+
+        if transactions is None and settings.STELLAR_HISTORY_SOURCE == 'index':
+            transactions = await sync_to_async(fetch_indexed_history)(public_key, limit, cursor, order)
+            source = 'index'
+
+        if transactions is None:
+            transactions = await afetch_history(
+                get_async_server(), public_key, limit, cursor=cursor, order=order
+            )
+            source = 'horizon'
+
+        etag = history_etag(public_key, limit, source, cursor, order, transactions)
+        unchanged = not_modified(request, etag, per_wallet)
+        if unchanged is not None:
+            return unchanged
+
+        next_cursor, prev_cursor = page_cursors(transactions, limit, order)
+        opposite = 'asc' if order == 'desc' else 'desc'
+        response = JsonResponse({
+            'public_key': public_key,
+            'transactions': TransactionSerializer.represent(transactions),
+            'total_transactions': len(transactions),
+            'limit': limit,
+            'order': order,
+            'next': page_link(request, next_cursor, order),
+            'prev': page_link(request, prev_cursor, opposite),
+            'source': source
+        }, status=status.HTTP_200_OK)
+        return set_validators(response, etag, per_wallet)
+
+    except Exception as e:
+        retry_after = await sync_to_async(horizon_retry_after)(e)
+        if retry_after is not None:
+            return _retry_later(
+                'Stellar network is busy. Please retry later.', status.HTTP_503_SERVICE_UNAVAILABLE, retry_after
+            )
+        error_message = str(e)
+        if "Resource Missing" in error_message or "404" in error_message:
+            return JsonResponse(
+                {'error': 'Account not found on Stellar network'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return JsonResponse(
+            {'error': f'Failed to fetch transactions: {error_message}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@async_endpoint('GET', scope='export', horizon_reads=True)
+async def export_transactions(request, public_key=None):
+    """
+    Stream an account's entire operation history as NDJSON or CSV
+    Pages are awaited between chunks, so the export holds no thread while it runs
+    """
+    session_public_key = await _session_public_key(request)
+    public_key = public_key or session_public_key
+    if not public_key:
+        return JsonResponse(
+            {'error': 'Not authenticated'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+    query = HistoryExportQuerySerializer(data=request.GET)
+    if not query.is_valid():
+        return JsonResponse(query.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        Keypair.from_public_key(public_key)
+        records = await aiter_history(
+            get_async_server(),
+            public_key,
+            cursor=query.validated_data.get('cursor'),
+            order=query.validated_data['order'],
+            # Anonymous exports queue for the budget again before every further page
+            admit=None if session_public_key else functools.partial(aadmit_read, 'export')
+        )
+    except NotFoundError:
+        return JsonResponse(
+            {'error': 'Account not found on Stellar network'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    except Exception as e:
+        return JsonResponse(
+            {'error': f'Failed to export transactions: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    return aexport_response(records, query.validated_data['format'], public_key)
+
+
+@async_endpoint('GET')
+async def account_events(request):
+    """
+    Live updates for the signed-in wallet as Server-Sent Events
+    The stream waits on the event loop, so an open connection holds no thread
+    """
+    public_key = await _session_public_key(request)
+    if not public_key:
+        return JsonResponse(
+            {'error': 'Not authenticated'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+    if not get_push_hub().has_room(public_key):
+        return JsonResponse(
+            {'error': 'Too many live streams, try again later'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    last_event_id = request.headers.get('Last-Event-ID', '').strip()
+
+    async def initial():
+        """Operations missed since Last-Event-ID, then the current balances"""
+        messages = []
+        if last_event_id.isdigit():
+            try:
+                messages += await sync_to_async(missed_operations, thread_sensitive=False)(
+                    public_key, last_event_id
+                )
+            except Exception:
+                logger.warning('Replaying events for %s from %s failed', public_key, last_event_id, exc_info=True)
+        try:
+            balances, cached, cache_age = await _cached_balances(public_key)
+            messages.append(balance_event(public_key, balances))
+        except Exception:
+            # Not funded yet; its create_account operation will still be pushed
+            pass
+        return messages
+
+    # The subscription is made, and always released, by the stream itself
+    response = StreamingHttpResponse(
+        astream_events(AsyncSubscription(public_key), initial),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,101 @@
+"""
+Account balance helpers
+"""
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import cache
+from .metrics import bind_request
+from .models import AccountSnapshot
+
+
+def shape_balances(account):
+    """
+    Shape a Horizon account record's balances for BalanceSerializer
+    Each entry keeps its last_modified_ledger (the account's, for XLM) for ETags
+    """
+    balances = []
+    for balance in account['balances']:
+        balance_data = {
+            'asset_type': balance['asset_type'],
+            'balance': balance['balance'],
+            'last_modified_ledger': balance.get('last_modified_ledger', account.get('last_modified_ledger')),
+        }
+
+        if balance['asset_type'] == 'native':
+            balance_data['asset_code'] = 'XLM'
+            balance_data['asset_issuer'] = None
+        else:
+            balance_data['asset_code'] = balance.get('asset_code', 'UNKNOWN')
+            balance_data['asset_issuer'] = balance.get('asset_issuer', None)
+
+        balances.append(balance_data)
+    return balances
+
+
+def balance_cache_key(public_key):
+    return f'stellar:balance:{settings.STELLAR_NETWORK}:{public_key}'
+
+
+def get_balances(server, public_key):
+    """
+    Return (balances, hit, age) for an account, going through the balance cache
+    A TTL of 0 disables caching
+    """
+    def load():
+        account = server.accounts().account_id(public_key).call()
+        return shape_balances(account)
+
+    ttl = settings.STELLAR_BALANCE_CACHE_TTL
+    if ttl <= 0:
+        return load(), False, 0.0
+    return cache.get_or_load(
+        balance_cache_key(public_key),
+        load,
+        ttl,
+        settings.STELLAR_BALANCE_CACHE_STALE_TTL,
+    )
+
+
+def invalidate_balances(*public_keys):
+    """
+    Forget cached balances, e.g. after a payment touching these accounts
+    Their snapshots stop answering reads until the scheduler, which takes them next, refreshes them
+    """
+    cache.invalidate(*[balance_cache_key(public_key) for public_key in public_keys])
+    now = timezone.now()
+    AccountSnapshot.objects.filter(account__in=public_keys).update(
+        refreshed_at=None, active_at=now, next_refresh_at=now, idle_refreshes=0
+    )
+
+
+def get_many_balances(server, public_keys, concurrency, timeout):
+    """
+    Fetch balances for many accounts with bounded concurrency
+    Returns {public_key: (balances, hit, age) or the exception raised};
+    keys not answered within `timeout` seconds map to a TimeoutError.
+    """
+    results = {}
+    if not public_keys:
+        return results
+
+    executor = ThreadPoolExecutor(max_workers=min(concurrency, len(public_keys)))
+    futures = {
+        executor.submit(bind_request(get_balances), server, public_key): public_key
+        for public_key in public_keys
+    }
+    done, not_done = wait(futures, timeout=timeout)
+    # Do not hold the response for work that is past the latency budget
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    for future in done:
+        public_key = futures[future]
+        try:
+            results[public_key] = future.result()
+        except Exception as e:
+            results[public_key] = e
+    for future in not_done:
+        results[futures[future]] = TimeoutError('Timed out fetching balance')
+    return results
@@ -0,0 +1,142 @@
+"""
+Stale-while-revalidate caching on Django's cache framework
+
+Entries are served fresh for `ttl` seconds and stale for a further `stale_ttl`
+seconds while one background thread refreshes them. Concurrent misses for the
+same key share a single upstream call: threads of one process wait on the
+in-flight load, other processes wait on a short cache lock.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+# How long a loader may hold the cross-process lock
+LOCK_TIMEOUT = 10
+# How long other processes wait for the lock holder before loading themselves
+LOCK_WAIT = 2.0
+LOCK_POLL_INTERVAL = 0.05
+# Loads that started before an invalidation are discarded for this long
+INVALIDATION_TIMEOUT = 60
+# Backends every worker process sees the same entries of, with atomic add and incr
+SHARED_BACKENDS = ('RedisCache', 'PyMemcacheCache', 'PyLibMCCache')
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _invalidated_key(key):
+    return f'{key}:invalidated'
+
+
+def _store(key, value, fetched_at, ttl, stale_ttl):
+    """Write an entry unless it was invalidated after its load started"""
+    invalidated_at = cache.get(_invalidated_key(key))
+    if invalidated_at is not None and invalidated_at >= fetched_at:
+        return
+    cache.set(key, {'value': value, 'fetched_at': fetched_at}, ttl + stale_ttl)
+
+
+def _load(key, loader, ttl, stale_ttl):
+    started_at = time.time()
+    value = loader()
+    _store(key, value, started_at, ttl, stale_ttl)
+    return value, started_at
+
+
+def _load_coalesced(key, loader, ttl, stale_ttl):
+    """Run loader once per key no matter how many threads miss at the same time"""
+    with _inflight_lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = Future()
+            _inflight[key] = future
+
+    if not owner:
+        return future.result()
+
+    try:
+        if not cache.add(_lock_key(key), 1, LOCK_TIMEOUT):
+            # Another process is loading this key; give it a moment to finish
+            deadline = time.monotonic() + LOCK_WAIT
+            while time.monotonic() < deadline:
+                time.sleep(LOCK_POLL_INTERVAL)
+                entry = cache.get(key)
+                if entry is not None:
+                    result = (entry['value'], entry['fetched_at'])
+                    future.set_result(result)
+                    return result
+            result = _load(key, loader, ttl, stale_ttl)
+        else:
+            try:
+                result = _load(key, loader, ttl, stale_ttl)
+            finally:
+                cache.delete(_lock_key(key))
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight.pop(key, None)
+
+
+def _refresh_in_background(key, loader, ttl, stale_ttl):
+    """Refresh a stale entry on a daemon thread, at most once across processes"""
+    if not cache.add(_lock_key(key), 1, LOCK_TIMEOUT):
+        return
+
+    def refresh():
+        try:
+            _load(key, loader, ttl, stale_ttl)
+        except Exception:
+            logger.warning('Background refresh of %s failed', key, exc_info=True)
+        finally:
+            cache.delete(_lock_key(key))
+
+    threading.Thread(target=refresh, name=f'cache-refresh:{key}', daemon=True).start()
+
+
+def get_or_load(key, loader, ttl, stale_ttl=0):
+    """
+    Return (value, hit, age) for key, calling loader() on a miss
+    `hit` is True when the value came from the cache, `age` is its age in seconds
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        age = time.time() - entry['fetched_at']
+        if age > ttl:
+            record_cache(key, 'stale')
+            _refresh_in_background(key, loader, ttl, stale_ttl)
+        else:
+            record_cache(key, 'hit')
+        return entry['value'], True, age
+
+    record_cache(key, 'miss')
+    value, fetched_at = _load_coalesced(key, loader, ttl, stale_ttl)
+    return value, False, time.time() - fetched_at
+
+
+def invalidate(*keys):
+    """Drop entries and discard any load that started before this call"""
+    now = time.time()
+    cache.delete_many(keys)
+    cache.set_many({_invalidated_key(key): now for key in keys}, INVALIDATION_TIMEOUT)
+
+
+def is_shared():
+    """Whether the default cache is shared between worker processes (Redis, Memcached)"""
+    return settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1] in SHARED_BACKENDS
@@ -0,0 +1,55 @@
+"""
+Stateless sign-in challenges
+
+The challenge carries its own state: the public key and a random nonce,
+signed with SECRET_KEY and timestamped, so issuing one writes nothing to the
+database. On verification the signature and age are checked and the nonce
+is claimed in the shared cache for the rest of the challenge's lifetime,
+which makes every challenge usable once.
+"""
+import secrets
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+CHALLENGE_PREFIX = 'Sign this message to authenticate with Stellar App: '
+SALT = 'authentication.challenge'
+
+
+class ChallengeError(Exception):
+    """A stateless challenge that is forged, expired, for another key or already used"""
+
+
+def issue_challenge(public_key):
+    """Return (challenge_message, nonce, expires_at) for `public_key`"""
+    nonce = secrets.token_urlsafe(32)
+    token = signing.dumps({'pk': public_key, 'n': nonce}, salt=SALT)
+    expires_at = datetime.now(dt_timezone.utc) + timedelta(seconds=settings.STELLAR_CHALLENGE_TTL)
+    return f'{CHALLENGE_PREFIX}{token}', nonce, expires_at
+
+
+def is_stateless(challenge_message):
+    """Stateless challenges are signed tokens; database-backed ones are bare nonces"""
+    return challenge_message.startswith(CHALLENGE_PREFIX) and ':' in challenge_message[len(CHALLENGE_PREFIX):]
+
+
+def read_challenge(challenge_message, public_key):
+    """Check a challenge's signature, age and key; return its nonce"""
+    token = challenge_message[len(CHALLENGE_PREFIX):]
+    try:
+        payload = signing.loads(token, salt=SALT, max_age=settings.STELLAR_CHALLENGE_TTL)
+    except signing.SignatureExpired:
+        raise ChallengeError('Challenge expired')
+    except signing.BadSignature:
+        raise ChallengeError('Invalid challenge')
+    if payload.get('pk') != public_key:
+        raise ChallengeError('Challenge was issued for another public key')
+    return payload['n']
+
+
+def claim_nonce(nonce):
+    """Mark a nonce used; False if it was already claimed (a replay)"""
+    key = f'stellar:challenge-nonce:{nonce}'
+    return cache.add(key, True, timeout=settings.STELLAR_CHALLENGE_TTL)
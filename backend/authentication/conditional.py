@@ -0,0 +1,63 @@
+"""
+Conditional GET for balance and history responses
+
+ETags are derived from what identifies the response body on the ledger: the
+newest last_modified_ledger among an account's entries for balances, the
+first and last operation ids of a history page. A repeat request carrying the
+ETag in If-None-Match gets a 304 before anything is serialised.
+
+The ETags are weak: they vouch for the ledger data, not for the bytes, and
+fields such as `cached` and `cache_age` differ between equivalent responses.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+
+
+def make_etag(*parts):
+    """Weak ETag over the given parts; the public key keeps accounts apart on /balance/"""
+    digest = hashlib.sha256(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+
+def balances_etag(public_key, balances):
+    """
+    ETag for shaped balances, or None when they carry no ledger numbers
+    Trustlines change without touching the account entry, so every entry counts:
+    a changed entry raises the newest ledger, a removed one lowers the count.
+    The balances may be up to STELLAR_BALANCE_CACHE_STALE_TTL seconds stale, and
+    so may a 304 given for them.
+    """
+    ledgers = [balance.get('last_modified_ledger') for balance in balances]
+    if not ledgers or None in ledgers:
+        return None
+    return make_etag('balance', public_key, max(ledgers), len(ledgers))
+
+
+def history_etag(public_key, limit, source, cursor, order, transactions):
+    """ETag for a history page: its first and last operation pin down which transactions it holds"""
+    bounds = (transactions[0]['id'], transactions[-1]['id']) if transactions else ('', '')
+    return make_etag('history', public_key, limit, source, cursor, order, *bounds, len(transactions))
+
+
+def set_validators(response, etag, per_wallet=False):
+    """
+    ETag and Cache-Control for a response browsers should revalidate on every use
+    `per_wallet` marks URLs whose account comes from the session or bearer token
+    """
+    if etag is not None:
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    if per_wallet:
+        patch_vary_headers(response, ('Authorization', 'Cookie'))
+    return response
+
+
+def not_modified(request, etag, per_wallet=False):
+    """A 304 response when the request's If-None-Match matches `etag`, else None"""
+    if etag is None:
+        return None
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        return None
+    return set_validators(response, etag, per_wallet)
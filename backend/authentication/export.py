@@ -0,0 +1,162 @@
+"""
+Full-history export
+
+Encodes the records from history.iter_history as NDJSON or CSV while they
+stream to the client, so memory stays flat for accounts of any age. Every
+row carries its operation id, which is also its paging token: pass the last
+one back as ``cursor`` to resume an interrupted export.
+
+The response is already under way when a later page fails, so the error can
+no longer change its status. The export instead ends with an error row
+carrying the cursor to resume from: ``{"error": ..., "cursor": ...}`` in
+NDJSON, ``ERROR,<message>,<cursor>`` in CSV. A file without one is complete.
+"""
+import csv
+import io
+import json
+import logging
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import BaseRenderer
+
+EXPORT_FIELDS = (
+    'id', 'type', 'created_at', 'transaction_hash', 'source_account',
+    'from_address', 'to_address', 'amount', 'asset_code', 'asset_type',
+)
+ERROR_MARKER = 'ERROR'
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+class _ExportRenderer(BaseRenderer):
+    """
+    Lets DRF accept ``?format=ndjson|csv`` (its URL format override) on the export view
+    The export itself streams past the renderer; only errors are rendered, as JSON
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+class NDJSONRenderer(_ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class CSVRenderer(_ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class _LineBuffer:
+    """File-like target for csv.writer that hands back each written row"""
+
+    def write(self, value):
+        return value
+
+
+def _interrupted(error, cursor):
+    logger.warning('Export interrupted after %s', cursor, exc_info=error)
+    return f'Export interrupted: {error}'
+
+
+def _ndjson_row(record):
+    return json.dumps({field: record.get(field) for field in EXPORT_FIELDS}, default=str) + '\n'
+
+
+def _ndjson_error(message, cursor):
+    return json.dumps({'error': message, 'cursor': cursor}) + '\n'
+
+
+def _ndjson_lines(records):
+    cursor = None
+    try:
+        for record in records:
+            yield _ndjson_row(record)
+            cursor = record.get('id')
+    except Exception as e:
+        yield _ndjson_error(_interrupted(e, cursor), cursor)
+
+
+def _csv_lines(records):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(EXPORT_FIELDS)
+    cursor = None
+    try:
+        for record in records:
+            yield writer.writerow([record.get(field) for field in EXPORT_FIELDS])
+            cursor = record.get('id')
+    except Exception as e:
+        yield writer.writerow([ERROR_MARKER, _interrupted(e, cursor), cursor])
+
+
+async def _andjson_lines(records):
+    cursor = None
+    try:
+        async for record in records:
+            yield _ndjson_row(record)
+            cursor = record.get('id')
+    except Exception as e:
+        yield _ndjson_error(_interrupted(e, cursor), cursor)
+
+
+async def _acsv_lines(records):
+    writer = csv.writer(_LineBuffer())
+    yield writer.writerow(EXPORT_FIELDS)
+    cursor = None
+    try:
+        async for record in records:
+            yield writer.writerow([record.get(field) for field in EXPORT_FIELDS])
+            cursor = record.get('id')
+    except Exception as e:
+        yield writer.writerow([ERROR_MARKER, _interrupted(e, cursor), cursor])
+
+
+def _batched(lines, size=io.DEFAULT_BUFFER_SIZE):
+    """Join lines into chunks of about `size` bytes; one write per row is slow"""
+    chunk, length = [], 0
+    for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+async def _abatched(lines, size=io.DEFAULT_BUFFER_SIZE):
+    chunk, length = [], 0
+    async for line in lines:
+        chunk.append(line)
+        length += len(line)
+        if length >= size:
+            yield ''.join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+def _response(content, export_format, public_key):
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{public_key}-history.{export_format}"'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def export_response(records, export_format, public_key):
+    """Streaming download of `records` (an iterator) as 'ndjson' or 'csv'"""
+    lines = _csv_lines(records) if export_format == 'csv' else _ndjson_lines(records)
+    return _response(_batched(lines), export_format, public_key)
+
+
+def aexport_response(records, export_format, public_key):
+    """export_response for an async iterator of records (ASGI)"""
+    lines = _acsv_lines(records) if export_format == 'csv' else _andjson_lines(records)
+    return _response(_abatched(lines), export_format, public_key)
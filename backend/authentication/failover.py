@@ -0,0 +1,304 @@
+"""
+Multi-endpoint Horizon transport
+
+Wraps one pooled client per Horizon URL (settings.STELLAR_HORIZON_URLS) and
+sends each call to the healthiest endpoint, moving on to the next one when a
+call fails with a connection error or a 5xx. Every endpoint tracks a moving
+average of its latency and error rate; after enough consecutive failures its
+circuit opens and it is skipped until a cooldown has passed, when a single
+call is let through to probe it.
+
+GETs can be hedged: when the first endpoint has not answered within
+STELLAR_HORIZON_HEDGE_DELAY seconds the same read goes to a second endpoint
+and whichever answers first wins. Submissions are never hedged; a failed
+POST is retried on the next endpoint only after the previous attempt ended,
+which is safe because Stellar applies a signed envelope at most once.
+"""
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from stellar_sdk.client.base_async_client import BaseAsyncClient
+from stellar_sdk.client.base_sync_client import BaseSyncClient
+
+from .metrics import HORIZON_CIRCUIT_OPENS, HORIZON_HEDGES, bind_request
+
+# Weight of the newest sample in the latency and error-rate averages
+EWMA_ALPHA = 0.2
+# Added to an endpoint's average latency per unit of error rate when ranking
+ERROR_PENALTY = 2.0
+
+
+class Endpoint:
+    """Health of one Horizon URL: latency, error rate and circuit state"""
+
+    def __init__(self, url, client, failure_threshold, cooldown):
+        self.url = url.rstrip('/')
+        self.client = client
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.latency = 0.0
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def score(self):
+        return self.latency + self.error_rate * ERROR_PENALTY
+
+    def state(self):
+        """
+        'closed', 'probe' or 'open'
+        An open circuit lets one call through per cooldown to probe the endpoint
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at < self.cooldown:
+                return 'open'
+            # Re-arm the cooldown so concurrent callers do not all probe at once
+            self.opened_at = time.monotonic()
+            return 'probe'
+
+    def record(self, latency, failed):
+        with self._lock:
+            self.error_rate += EWMA_ALPHA * ((1.0 if failed else 0.0) - self.error_rate)
+            if not failed:
+                self.latency += EWMA_ALPHA * (latency - self.latency)
+                self.consecutive_failures = 0
+                self.opened_at = None
+                return
+            self.consecutive_failures += 1
+            if self.opened_at is not None or self.consecutive_failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    HORIZON_CIRCUIT_OPENS.labels(self.url).inc()
+                # A failed probe keeps the circuit open for another cooldown
+                self.opened_at = time.monotonic()
+
+
+def _failed(response):
+    return response.status_code >= 500 or response.status_code == 429
+
+
+class _EndpointSet:
+    """Ranking and URL rewriting shared by the sync and async transports"""
+
+    def __init__(self, endpoints):
+        self.endpoints = endpoints
+
+    def candidates(self):
+        """Endpoints to try: a due probe first, then closed circuits best first; never empty"""
+        ranked = sorted(self.endpoints, key=lambda endpoint: endpoint.score)
+        states = {endpoint: endpoint.state() for endpoint in ranked}
+        candidates = (
+            [endpoint for endpoint in ranked if states[endpoint] == 'probe']
+            + [endpoint for endpoint in ranked if states[endpoint] == 'closed']
+        )
+        if candidates:
+            return candidates
+        # Every circuit is open: try the one that opened longest ago
+        return [min(self.endpoints, key=lambda endpoint: endpoint.opened_at)]
+
+    def path(self, url):
+        """Part of `url` after its Horizon base, so it can be sent to any endpoint"""
+        for endpoint in self.endpoints:
+            if url.startswith(endpoint.url) and url[len(endpoint.url):][:1] in ('', '/', '?'):
+                return url[len(endpoint.url):]
+        return None
+
+    def target(self, endpoint, url, path):
+        return url if path is None else endpoint.url + path
+
+    @property
+    def stream_endpoint(self):
+        return self.candidates()[0]
+
+
+class FailoverClient(BaseSyncClient):
+    """Sync client spreading calls over several Horizon endpoints"""
+
+    def __init__(self, endpoints, hedge_delay=0.0, max_workers=10):
+        self._set = _EndpointSet(endpoints)
+        self.endpoints = endpoints
+        self.hedge_delay = hedge_delay
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _call(self, endpoint, method, url, path, *args):
+        target = self._set.target(endpoint, url, path)
+        started = time.perf_counter()
+        try:
+            response = getattr(endpoint.client, method)(target, *args)
+        except Exception:
+            endpoint.record(time.perf_counter() - started, failed=True)
+            raise
+        endpoint.record(time.perf_counter() - started, failed=_failed(response))
+        return response
+
+    def _sequential(self, candidates, method, url, path, *args):
+        error = response = None
+        for endpoint in candidates:
+            try:
+                response = self._call(endpoint, method, url, path, *args)
+            except Exception as e:
+                error = e
+                continue
+            if not _failed(response):
+                return response
+        if response is None:
+            raise error
+        return response
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix='horizon-hedge'
+                    )
+        return self._executor
+
+    def _hedged_get(self, candidates, url, path, params):
+        """Race the best endpoint against the next one once hedge_delay has passed"""
+        executor = self._get_executor()
+        call = bind_request(self._call)
+        first, second, rest = candidates[0], candidates[1], candidates[2:]
+        pending = {executor.submit(call, first, 'get', url, path, params): 'primary'}
+        done, _ = wait(pending, timeout=self.hedge_delay)
+        hedged = not done
+        if hedged:
+            pending[executor.submit(call, second, 'get', url, path, params)] = 'hedge'
+        else:
+            rest = [second] + rest
+
+        error = response = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                winner = pending.pop(future)
+                try:
+                    response = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if not _failed(response):
+                    # The slower call finishes in the background and still updates its endpoint
+                    if hedged:
+                        HORIZON_HEDGES.labels(winner).inc()
+                    return response
+        if rest:
+            return self._sequential(rest, 'get', url, path, params)
+        if response is None:
+            raise error
+        return response
+
+    def get(self, url, params=None):
+        path = self._set.path(url)
+        candidates = self._set.candidates()
+        if self.hedge_delay > 0 and len(candidates) > 1:
+            return self._hedged_get(candidates, url, path, params)
+        return self._sequential(candidates, 'get', url, path, params)
+
+    def post(self, url, data=None, json_data=None):
+        path = self._set.path(url)
+        return self._sequential(self._set.candidates(), 'post', url, path, data, json_data)
+
+    def stream(self, url, params=None):
+        endpoint = self._set.stream_endpoint
+        return endpoint.client.stream(self._set.target(endpoint, url, self._set.path(url)), params)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        for endpoint in self.endpoints:
+            endpoint.client.close()
+
+
+class AsyncFailoverClient(BaseAsyncClient):
+    """Async counterpart of FailoverClient for ServerAsync"""
+
+    def __init__(self, endpoints, hedge_delay=0.0):
+        self._set = _EndpointSet(endpoints)
+        self.endpoints = endpoints
+        self.hedge_delay = hedge_delay
+
+    async def _call(self, endpoint, method, url, path, *args):
+        target = self._set.target(endpoint, url, path)
+        started = time.perf_counter()
+        try:
+            response = await getattr(endpoint.client, method)(target, *args)
+        except Exception:
+            endpoint.record(time.perf_counter() - started, failed=True)
+            raise
+        endpoint.record(time.perf_counter() - started, failed=_failed(response))
+        return response
+
+    async def _sequential(self, candidates, method, url, path, *args):
+        error = response = None
+        for endpoint in candidates:
+            try:
+                response = await self._call(endpoint, method, url, path, *args)
+            except Exception as e:
+                error = e
+                continue
+            if not _failed(response):
+                return response
+        if response is None:
+            raise error
+        return response
+
+    async def _hedged_get(self, candidates, url, path, params):
+        first, second, rest = candidates[0], candidates[1], candidates[2:]
+        pending = {asyncio.ensure_future(self._call(first, 'get', url, path, params)): 'primary'}
+        done, _ = await asyncio.wait(pending, timeout=self.hedge_delay)
+        hedged = not done
+        if hedged:
+            pending[asyncio.ensure_future(self._call(second, 'get', url, path, params))] = 'hedge'
+        else:
+            rest = [second] + rest
+
+        error = response = None
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                winner = pending.pop(task)
+                try:
+                    response = task.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if not _failed(response):
+                    if hedged:
+                        HORIZON_HEDGES.labels(winner).inc()
+                    for task in pending:
+                        # Let the slower call finish without an unretrieved-exception warning
+                        task.add_done_callback(lambda task: task.cancelled() or task.exception())
+                    return response
+        if rest:
+            return await self._sequential(rest, 'get', url, path, params)
+        if response is None:
+            raise error
+        return response
+
+    async def get(self, url, params=None):
+        path = self._set.path(url)
+        candidates = self._set.candidates()
+        if self.hedge_delay > 0 and len(candidates) > 1:
+            return await self._hedged_get(candidates, url, path, params)
+        return await self._sequential(candidates, 'get', url, path, params)
+
+    async def post(self, url, data=None, json_data=None):
+        path = self._set.path(url)
+        return await self._sequential(self._set.candidates(), 'post', url, path, data, json_data)
+
+    async def stream(self, url, params=None):
+        endpoint = self._set.stream_endpoint
+        async for message in endpoint.client.stream(self._set.target(endpoint, url, self._set.path(url)), params):
+            yield message
+
+    async def close(self):
+        for endpoint in self.endpoints:
+            await endpoint.client.close()
@@ -0,0 +1,108 @@
+"""
+Fee oracle
+
+A background thread polls Horizon ``fee_stats`` about once per ledger and
+keeps the latest snapshot in process memory, so picking a fee for a new
+transaction never costs a round trip. The base fee is the configured
+percentile of recently charged fees (never below the network base fee),
+capped by settings.STELLAR_FEE_CAP or a per-request cap. Until the first
+poll answers, settings.STELLAR_BASE_FEE is used.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+from .horizon import get_server
+
+logger = logging.getLogger(__name__)
+
+PERCENTILES = ('p10', 'p20', 'p30', 'p40', 'p50', 'p60', 'p70', 'p80', 'p90', 'p95', 'p99')
+# Protocol minimum base fee, in stroops per operation
+MIN_BASE_FEE = 100
+
+
+class FeeOracle:
+    """Latest Horizon fee_stats, refreshed every `interval` seconds by a daemon thread"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stats = None
+        self.fetched_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='fee-oracle', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception:
+                logger.warning('fee_stats poll failed; keeping the previous snapshot', exc_info=True)
+            time.sleep(self.interval)
+
+    def refresh(self):
+        """Fetch fee_stats now (blocking) and store the snapshot"""
+        stats = get_server().fee_stats().call()
+        with self._lock:
+            self.stats = stats
+            self.fetched_at = time.time()
+        return stats
+
+    def snapshot(self):
+        """(stats, fetched_at) of the last successful poll; (None, None) before the first"""
+        self._start()
+        with self._lock:
+            return self.stats, self.fetched_at
+
+    def recommended_fee(self, percentile=None):
+        """Selected percentile of charged fees, or STELLAR_BASE_FEE without stats"""
+        stats, _ = self.snapshot()
+        if stats is None:
+            return settings.STELLAR_BASE_FEE
+        percentile = percentile or settings.STELLAR_FEE_PERCENTILE
+        fee = int(stats['fee_charged'][percentile])
+        return max(fee, int(stats.get('last_ledger_base_fee') or MIN_BASE_FEE))
+
+
+def select_base_fee(override=None, cap=None):
+    """
+    Base fee per operation for a new transaction
+    An explicit override wins; otherwise the oracle's fee limited by `cap`
+    (or settings.STELLAR_FEE_CAP).
+    """
+    if override:
+        return override
+    fee = get_fee_oracle().recommended_fee()
+    return max(min(fee, cap or settings.STELLAR_FEE_CAP), MIN_BASE_FEE)
+
+
+_oracle = None
+_oracle_lock = threading.Lock()
+
+
+def get_fee_oracle():
+    """Process-wide fee oracle; its poller starts on first use"""
+    global _oracle
+    if _oracle is None:
+        with _oracle_lock:
+            if _oracle is None:
+                _oracle = FeeOracle(settings.STELLAR_FEE_POLL_INTERVAL)
+    return _oracle
+
+
+def _reset_oracle():
+    global _oracle
+    _oracle = None
+
+
+# The poller thread does not survive a fork; children start their own
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_oracle)
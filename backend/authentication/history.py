@@ -0,0 +1,396 @@
+"""
+Transaction history engine
+
+Builds the ``TransactionSerializer`` payload for an account (every operation
+of each of its transactions) without issuing one
+``operations().for_transaction()`` call per transaction: only transactions
+that also carry operations of other accounts need one.
+
+Pages hold whole transactions. Their cursors sit on transaction boundaries
+(see transaction_cursor), so the same cursor works for every strategy and
+for the local index.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+from .metrics import bind_request
+from .models import IndexedOperation, IngestionCursor
+from .throttling import UpstreamBusy
+
+# Largest page Horizon will return
+HORIZON_MAX_PAGE_SIZE = 200
+# Operation ids pack the transaction's total-order id above 12 bits of op index
+OPERATION_INDEX_BITS = 12
+
+
+def operation_to_transaction_data(op, tx_source_account=None):
+    """Shape a Horizon operation record for TransactionSerializer"""
+    transaction_data = {
+        'id': op['id'],
+        'type': op['type'],
+        'created_at': op['created_at'],
+        'transaction_hash': op['transaction_hash'],
+        'source_account': op.get('source_account', tx_source_account),
+    }
+
+    # Add payment-specific details
+    if op['type'] in ['payment', 'create_account']:
+        transaction_data['from_address'] = op.get('from') or op.get('funder')
+        transaction_data['to_address'] = op.get('to') or op.get('account')
+        transaction_data['amount'] = op.get('amount') or op.get('starting_balance')
+
+        # Asset information
+        if op.get('asset_type') == 'native':
+            transaction_data['asset_code'] = 'XLM'
+            transaction_data['asset_type'] = 'native'
+        else:
+            transaction_data['asset_code'] = op.get('asset_code', 'UNKNOWN')
+            transaction_data['asset_type'] = op.get('asset_type', 'unknown')
+    else:
+        transaction_data['from_address'] = None
+        transaction_data['to_address'] = None
+        transaction_data['amount'] = None
+        transaction_data['asset_code'] = None
+        transaction_data['asset_type'] = None
+
+    return transaction_data
+
+
+def fetch_history(server, public_key, limit, strategy=None, cursor=None, order='desc'):
+    """
+    Return shaped operations for `limit` transactions of an account after `cursor`
+    Transactions in `order` (newest first by default), operations of a
+    transaction in application order
+    """
+    strategy = strategy or settings.STELLAR_HISTORY_STRATEGY
+    if strategy == 'fanout':
+        return _fetch_fanout(server, public_key, limit, cursor, order)
+    return _fetch_joined(server, public_key, limit, cursor, order)
+
+
+def transaction_cursor(operation_id, order):
+    """
+    Paging token just past the transaction of `operation_id` when paging in `order`
+    Its transaction id going down, or the last op slot of the transaction going up
+    """
+    transaction_id = int(operation_id) >> OPERATION_INDEX_BITS << OPERATION_INDEX_BITS
+    if order == 'desc':
+        return str(transaction_id)
+    return str(transaction_id | ((1 << OPERATION_INDEX_BITS) - 1))
+
+
+def page_cursors(transactions, limit, order):
+    """
+    (next, prev) cursors of a history page
+    next is None once a short page shows history is exhausted
+    """
+    if not transactions:
+        return None, None
+    opposite = 'asc' if order == 'desc' else 'desc'
+    prev_cursor = transaction_cursor(transactions[0]['id'], opposite)
+    if len({record['transaction_hash'] for record in transactions}) < limit:
+        return None, prev_cursor
+    return transaction_cursor(transactions[-1]['id'], order), prev_cursor
+
+
+def page_link(request, cursor, order):
+    """This request's URL with `cursor` and `order` swapped in, or None"""
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    params['order'] = order
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+def _index_floor(ingestion):
+    """Operation id above which the account's index is complete, or None before anything is indexed"""
+    if ingestion.start_cursor.isdigit():
+        return int(ingestion.start_cursor)
+    # Started from 'now': complete from the first operation ingested
+    first = (
+        IndexedOperation.objects.filter(account=ingestion.account)
+        .order_by('operation_id').values_list('operation_id', flat=True).first()
+    )
+    return None if first is None else first - 1
+
+
+def fetch_indexed_history(public_key, limit, cursor=None, order='desc'):
+    """
+    History page read from the local ingestion index, or None to read Horizon instead
+    The index holds the operations streamed for the account, so unlike
+    fetch_history a transaction's operations on other accounts are left out.
+    Returns None when the account is not being ingested, or when the page
+    reaches past where its ingestion started (STELLAR_INGEST_START_CURSOR).
+    """
+    ingestion = IngestionCursor.objects.filter(account=public_key).first()
+    if ingestion is None:
+        return None
+    floor = _index_floor(ingestion)
+    if floor is None:
+        return None
+    # Oldest first from before the index starts
+    if floor and order == 'asc' and (cursor is None or int(cursor) < floor):
+        return None
+
+    operations = IndexedOperation.objects.filter(account=public_key)
+    if cursor is not None:
+        lookup = 'operation_id__lt' if order == 'desc' else 'operation_id__gt'
+        operations = operations.filter(**{lookup: int(cursor)})
+    transaction_order = '-transaction_order' if order == 'desc' else 'transaction_order'
+    recent_transactions = (
+        operations.order_by(transaction_order)
+        .values('transaction_order')
+        .distinct()[:limit]
+    )
+    rows = list(
+        IndexedOperation.objects.filter(
+            account=public_key, transaction_order__in=recent_transactions
+        ).order_by(transaction_order, 'operation_id')
+    )
+    # Newest first: a short page may continue before the index starts
+    if floor and order == 'desc' and len({row.transaction_order for row in rows}) < limit:
+        return None
+
+    return [
+        {
+            'id': str(row.operation_id),
+            'type': row.type,
+            'created_at': row.created_at,
+            'transaction_hash': row.transaction_hash,
+            'source_account': row.source_account,
+            'from_address': row.from_address,
+            'to_address': row.to_address,
+            'amount': row.amount,
+            'asset_code': row.asset_code,
+            'asset_type': row.asset_type,
+        }
+        for row in rows
+    ]
+
+
+def _joined_builder(server, public_key, cursor, order):
+    builder = (
+        server.operations()
+        .for_account(public_key)
+        .join('transactions')
+        .limit(HORIZON_MAX_PAGE_SIZE)
+        .order(desc=order == 'desc')
+    )
+    if cursor is not None:
+        builder = builder.cursor(cursor)
+    return builder
+
+
+def _fetch_joined(server, public_key, limit, cursor=None, order='desc'):
+    """
+    Page through the account's operations with their transactions joined in
+    One round trip covers up to 200 operations, so limit=100 is usually a
+    single call. Transactions holding operations that do not involve the
+    account are then completed with one call each (see _complete).
+    """
+    builder = _joined_builder(server, public_key, cursor, order)
+    page = builder.call()
+
+    grouped = {}
+    while not _collect(grouped, page['_embedded']['records'], limit):
+        page = builder.next()
+    _complete(server, grouped)
+    return _flatten(grouped)
+
+
+def _collect(grouped, records, limit):
+    """
+    Group a page of operations by transaction
+    Returns True once `limit` transactions are complete or history is exhausted
+    """
+    for op in records:
+        tx_hash = op['transaction_hash']
+        if tx_hash not in grouped:
+            if len(grouped) == limit:
+                return True
+            grouped[tx_hash] = []
+        grouped[tx_hash].append(op)
+    return len(records) < HORIZON_MAX_PAGE_SIZE
+
+
+def _partial_transactions(grouped):
+    """
+    Joined transactions missing some of their operations
+    The account's operations endpoint leaves out operations of the same
+    transaction that only involve other accounts
+    """
+    partial = []
+    for ops in grouped.values():
+        transaction = ops[0].get('transaction') or {}
+        if len(ops) < transaction.get('operation_count', 0):
+            partial.append(transaction)
+    return partial
+
+
+def _transaction_operations(server, tx_hash):
+    return server.operations().for_transaction(tx_hash).limit(HORIZON_MAX_PAGE_SIZE).call()
+
+
+def _complete(server, grouped):
+    """Replace the operations of partial transactions with all of them, fetched concurrently"""
+    partial = _partial_transactions(grouped)
+    if not partial:
+        return
+
+    def operations_for(tx):
+        return _transaction_operations(server, tx['hash'])['_embedded']['records']
+
+    workers = min(settings.STELLAR_HISTORY_CONCURRENCY, len(partial))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for tx, operations in zip(partial, executor.map(bind_request(operations_for), partial)):
+            grouped[tx['hash']] = [dict(op, transaction=tx) for op in operations]
+
+
+def _flatten(grouped):
+    transactions = []
+    for ops in grouped.values():
+        # Descending pages arrive newest first; restore application order within a transaction
+        for op in sorted(ops, key=lambda record: int(record['id'])):
+            tx_source_account = op.get('transaction', {}).get('source_account')
+            transactions.append(operation_to_transaction_data(op, tx_source_account))
+    return transactions
+
+
+def _transactions_builder(server, public_key, limit, cursor, order):
+    builder = server.transactions().for_account(public_key).limit(limit).order(desc=order == 'desc')
+    if cursor is not None:
+        builder = builder.cursor(cursor)
+    return builder
+
+
+def _fetch_fanout(server, public_key, limit, cursor=None, order='desc'):
+    """
+    List the account's transactions, then fetch their operations concurrently
+    Keeps every operation of each transaction at the cost of one call per
+    transaction, bounded by settings.STELLAR_HISTORY_CONCURRENCY.
+    """
+    transactions_response = _transactions_builder(server, public_key, limit, cursor, order).call()
+    records = transactions_response['_embedded']['records']
+
+    def operations_for(tx):
+        operations = _transaction_operations(server, tx['hash'])
+        return [
+            operation_to_transaction_data(op, tx['source_account'])
+            for op in operations['_embedded']['records']
+        ]
+
+    if not records:
+        return []
+
+    workers = min(settings.STELLAR_HISTORY_CONCURRENCY, len(records))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(bind_request(operations_for), records)
+
+    transactions = []
+    for shaped in results:
+        transactions.extend(shaped)
+    return transactions
+
+
+async def afetch_history(server, public_key, limit, strategy=None, cursor=None, order='desc'):
+    """fetch_history for a ServerAsync; fan-out requests run concurrently"""
+    strategy = strategy or settings.STELLAR_HISTORY_STRATEGY
+    if strategy == 'fanout':
+        return await _afetch_fanout(server, public_key, limit, cursor, order)
+    return await _afetch_joined(server, public_key, limit, cursor, order)
+
+
+async def _afetch_joined(server, public_key, limit, cursor=None, order='desc'):
+    builder = _joined_builder(server, public_key, cursor, order)
+    page = await builder.call()
+
+    grouped = {}
+    while not _collect(grouped, page['_embedded']['records'], limit):
+        page = await builder.next()
+    await _acomplete(server, grouped)
+    return _flatten(grouped)
+
+
+async def _acomplete(server, grouped):
+    semaphore = asyncio.Semaphore(settings.STELLAR_HISTORY_CONCURRENCY)
+
+    async def complete(tx):
+        async with semaphore:
+            operations = await _transaction_operations(server, tx['hash'])
+        grouped[tx['hash']] = [dict(op, transaction=tx) for op in operations['_embedded']['records']]
+
+    await asyncio.gather(*(complete(tx) for tx in _partial_transactions(grouped)))
+
+
+async def _afetch_fanout(server, public_key, limit, cursor=None, order='desc'):
+    transactions_response = await _transactions_builder(server, public_key, limit, cursor, order).call()
+    records = transactions_response['_embedded']['records']
+    semaphore = asyncio.Semaphore(settings.STELLAR_HISTORY_CONCURRENCY)
+
+    async def operations_for(tx):
+        async with semaphore:
+            operations = await _transaction_operations(server, tx['hash'])
+        return [
+            operation_to_transaction_data(op, tx['source_account'])
+            for op in operations['_embedded']['records']
+        ]
+
+    transactions = []
+    for shaped in await asyncio.gather(*(operations_for(tx) for tx in records)):
+        transactions.extend(shaped)
+    return transactions
+
+
+def _export_record(op):
+    return operation_to_transaction_data(op, op.get('transaction', {}).get('source_account'))
+
+
+def iter_history(server, public_key, cursor=None, order='asc', admit=None):
+    """
+    Every operation of an account, one Horizon page at a time
+    Only the current page is held in memory, however long the history. The
+    first page is fetched before this returns, so a missing account raises here.
+    `admit`, when given, is called before each further page and returns 0 or
+    the seconds to wait; a wait stops the iteration with UpstreamBusy.
+    """
+    builder = _joined_builder(server, public_key, cursor, order)
+    first_page = builder.call()
+
+    def records():
+        page = first_page
+        while True:
+            operations = page['_embedded']['records']
+            for op in operations:
+                yield _export_record(op)
+            if len(operations) < HORIZON_MAX_PAGE_SIZE:
+                return
+            wait = admit() if admit is not None else 0
+            if wait:
+                raise UpstreamBusy(wait)
+            page = builder.next()
+
+    return records()
+
+
+async def aiter_history(server, public_key, cursor=None, order='asc', admit=None):
+    """iter_history for a ServerAsync; returns an async iterator, `admit` is a coroutine function"""
+    builder = _joined_builder(server, public_key, cursor, order)
+    first_page = await builder.call()
+
+    async def records():
+        page = first_page
+        while True:
+            operations = page['_embedded']['records']
+            for op in operations:
+                yield _export_record(op)
+            if len(operations) < HORIZON_MAX_PAGE_SIZE:
+                return
+            wait = await admit() if admit is not None else 0
+            if wait:
+                raise UpstreamBusy(wait)
+            page = await builder.next()
+
+    return records()
@@ -0,0 +1,129 @@
+"""
+Process-wide Horizon client
+
+Every view shares one pooled ``Server`` per worker process instead of opening
+a fresh connection (and TLS handshake) for each request. With several URLs in
+settings.STELLAR_HORIZON_URLS the server fails over between them (see
+failover.py). Every call spends from the shared Horizon budget (see
+throttling.py).
+"""
+import asyncio
+import os
+import threading
+import weakref
+
+from django.conf import settings
+from stellar_sdk import Network, Server, ServerAsync
+
+from .failover import AsyncFailoverClient, Endpoint, FailoverClient
+from .throttling import BudgetedAiohttpClient, BudgetedRequestsClient
+
+_lock = threading.Lock()
+_server = None
+_server_pid = None
+# aiohttp sessions are bound to the event loop that created them
+_async_servers = weakref.WeakKeyDictionary()
+
+
+def _endpoint(url, client):
+    return Endpoint(
+        url, client,
+        failure_threshold=settings.STELLAR_HORIZON_BREAKER_FAILURES,
+        cooldown=settings.STELLAR_HORIZON_BREAKER_COOLDOWN,
+    )
+
+
+def _build_client(num_retries):
+    """Create a keep-alive connection pool for one Horizon URL"""
+    connect_timeout = settings.STELLAR_HORIZON_CONNECT_TIMEOUT
+    return BudgetedRequestsClient(
+        pool_size=settings.STELLAR_HORIZON_POOL_SIZE,
+        num_retries=num_retries,
+        # requests accepts a (connect, read) tuple for its timeout
+        request_timeout=(connect_timeout, settings.STELLAR_HORIZON_READ_TIMEOUT),
+        post_timeout=(connect_timeout, settings.STELLAR_HORIZON_SUBMIT_TIMEOUT),
+    )
+
+
+def _build_server():
+    """Create a Server backed by pooled connections to every configured Horizon"""
+    urls = settings.STELLAR_HORIZON_URLS
+    if len(urls) == 1:
+        return Server(horizon_url=urls[0], client=_build_client(settings.STELLAR_HORIZON_NUM_RETRIES))
+    # Failing over to the next URL replaces retrying the same one
+    client = FailoverClient(
+        [_endpoint(url, _build_client(0)) for url in urls],
+        hedge_delay=settings.STELLAR_HORIZON_HEDGE_DELAY,
+        max_workers=settings.STELLAR_HORIZON_POOL_SIZE,
+    )
+    return Server(horizon_url=urls[0], client=client)
+
+
+def get_server():
+    """
+    Return the shared Horizon server for this process
+    The pool is rebuilt lazily after a fork so workers never share sockets
+    """
+    global _server, _server_pid
+
+    pid = os.getpid()
+    if _server is None or _server_pid != pid:
+        with _lock:
+            if _server is None or _server_pid != pid:
+                _server = _build_server()
+                _server_pid = pid
+    return _server
+
+
+def _build_async_client():
+    return BudgetedAiohttpClient(
+        pool_size=settings.STELLAR_HORIZON_POOL_SIZE,
+        request_timeout=settings.STELLAR_HORIZON_CONNECT_TIMEOUT + settings.STELLAR_HORIZON_READ_TIMEOUT,
+        post_timeout=settings.STELLAR_HORIZON_CONNECT_TIMEOUT + settings.STELLAR_HORIZON_SUBMIT_TIMEOUT,
+    )
+
+
+def _build_async_server():
+    urls = settings.STELLAR_HORIZON_URLS
+    if len(urls) == 1:
+        return ServerAsync(horizon_url=urls[0], client=_build_async_client())
+    client = AsyncFailoverClient(
+        [_endpoint(url, _build_async_client()) for url in urls],
+        hedge_delay=settings.STELLAR_HORIZON_HEDGE_DELAY,
+    )
+    return ServerAsync(horizon_url=urls[0], client=client)
+
+
+def get_async_server():
+    """
+    Return the shared async Horizon server for the running event loop
+    Under an ASGI worker there is a single loop, so this is one pool per process
+    """
+    loop = asyncio.get_running_loop()
+    server = _async_servers.get(loop)
+    if server is None:
+        server = _build_async_server()
+        _async_servers[loop] = server
+    return server
+
+
+def reset_server():
+    """Drop the shared servers so the next call builds a new pool"""
+    global _server, _server_pid, _lock, _async_servers
+
+    # The lock may have been held by another thread at fork time
+    _lock = threading.Lock()
+    _server = None
+    _server_pid = None
+    _async_servers = weakref.WeakKeyDictionary()
+
+
+def get_network_passphrase():
+    """Network passphrase matching settings.STELLAR_NETWORK"""
+    if settings.STELLAR_NETWORK == 'public':
+        return Network.PUBLIC_NETWORK_PASSPHRASE
+    return Network.TESTNET_NETWORK_PASSPHRASE
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_server)
@@ -0,0 +1,171 @@
+"""
+Streaming Horizon ingester
+
+Keeps one Horizon operations stream open per registered wallet and writes
+every operation into IndexedOperation. Stream threads only read; a single
+writer thread stores rows in batches together with each account's cursor, so
+a restart resumes exactly after the last stored paging token.
+"""
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils.dateparse import parse_datetime
+from stellar_sdk.exceptions import StreamClientError
+
+from .history import OPERATION_INDEX_BITS, operation_to_transaction_data
+from .horizon import get_server
+from .models import IndexedOperation, IngestionCursor, StellarWallet
+
+logger = logging.getLogger(__name__)
+
+PAYMENT_TYPES = ('payment', 'create_account')
+
+
+def operation_to_row(account, op):
+    """Build an (unsaved) IndexedOperation from a Horizon operation record"""
+    data = operation_to_transaction_data(op)
+    operation_id = int(op['id'])
+    return IndexedOperation(
+        account=account,
+        operation_id=operation_id,
+        transaction_order=operation_id >> OPERATION_INDEX_BITS,
+        paging_token=op['paging_token'],
+        type=data['type'],
+        created_at=parse_datetime(data['created_at']),
+        transaction_hash=data['transaction_hash'],
+        source_account=data['source_account'],
+        is_payment=data['type'] in PAYMENT_TYPES,
+        from_address=data['from_address'],
+        to_address=data['to_address'],
+        amount=data['amount'],
+        asset_code=data['asset_code'],
+        asset_type=data['asset_type'],
+    )
+
+
+def store_operations(events):
+    """
+    Persist a batch of (account, operation) events and advance cursors
+    Rows and cursors commit together; duplicates from a replayed stream are ignored
+    """
+    if not events:
+        return
+    cursors = {}
+    rows = []
+    for account, op in events:
+        rows.append(operation_to_row(account, op))
+        cursors[account] = op['paging_token']
+
+    with transaction.atomic():
+        IndexedOperation.objects.bulk_create(rows, ignore_conflicts=True)
+        for account, paging_token in cursors.items():
+            IngestionCursor.objects.update_or_create(
+                account=account, defaults={'paging_token': paging_token}
+            )
+
+
+class AccountStream(threading.Thread):
+    """Follows one account's operations stream and hands events to the writer"""
+
+    def __init__(self, account, cursor, events, stop_event):
+        super().__init__(name=f'ingest:{account}', daemon=True)
+        self.account = account
+        self.cursor = cursor
+        self.events = events
+        self.stop_event = stop_event
+
+    def run(self):
+        backoff = 1
+        while not self.stop_event.is_set():
+            try:
+                stream = (
+                    get_server().operations()
+                    .for_account(self.account)
+                    .cursor(self.cursor)
+                    .stream()
+                )
+                for op in stream:
+                    if self.stop_event.is_set():
+                        return
+                    self.events.put((self.account, op))
+                    self.cursor = op['paging_token']
+                    backoff = 1
+            except StreamClientError:
+                logger.warning('Stream for %s failed at cursor %s, retrying in %ss',
+                               self.account, self.cursor, backoff, exc_info=True)
+            except Exception:
+                logger.exception('Stream for %s stopped unexpectedly', self.account)
+            self.stop_event.wait(backoff)
+            backoff = min(backoff * 2, 60)
+
+
+class Ingester:
+    """Streams operations for every StellarWallet into the local index"""
+
+    def __init__(self, batch_size=None, flush_interval=None, rescan_interval=None):
+        self.batch_size = batch_size or settings.STELLAR_INGEST_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.STELLAR_INGEST_FLUSH_INTERVAL
+        self.rescan_interval = rescan_interval or settings.STELLAR_INGEST_RESCAN_INTERVAL
+        self.events = queue.Queue()
+        self.stop_event = threading.Event()
+        self.streams = {}
+
+    def start_streams(self):
+        """Open a stream for every wallet that does not have one yet"""
+        cursors = dict(IngestionCursor.objects.values_list('account', 'paging_token'))
+        for account in StellarWallet.objects.values_list('public_key', flat=True):
+            stream = self.streams.get(account)
+            if stream is not None and stream.is_alive():
+                continue
+            cursor = cursors.get(account)
+            if cursor is None:
+                # Remember where the index starts, so history reads past it go to Horizon
+                cursor = settings.STELLAR_INGEST_START_CURSOR
+                IngestionCursor.objects.get_or_create(
+                    account=account, defaults={'paging_token': cursor, 'start_cursor': cursor}
+                )
+            stream = AccountStream(account, cursor, self.events, self.stop_event)
+            self.streams[account] = stream
+            stream.start()
+            logger.info('Ingesting %s from cursor %s', account, cursor)
+
+    def flush(self):
+        """Write everything queued so far, in batches of batch_size"""
+        written = 0
+        while True:
+            batch = []
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.events.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return written
+            store_operations(batch)
+            written += len(batch)
+
+    def run(self, duration=None):
+        """Ingest until stop() is called or `duration` seconds have passed"""
+        deadline = time.monotonic() + duration if duration else None
+        next_rescan = 0
+        try:
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                if deadline is not None and now >= deadline:
+                    break
+                if now >= next_rescan:
+                    close_old_connections()
+                    self.start_streams()
+                    next_rescan = now + self.rescan_interval
+                self.stop_event.wait(self.flush_interval)
+                self.flush()
+        finally:
+            self.stop_event.set()
+            self.flush()
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,206 @@
+"""
+Asynchronous payment jobs
+
+In async mode the payment endpoint only validates the request, stores a
+PaymentJob row and puts the job on an in-process queue; a small pool of worker
+threads builds, signs and submits it through ``submit_payments`` and records
+the outcome on the row, where the status endpoint reads it.
+
+Secret keys are never written to the database: they travel with the queued
+job in memory only, so jobs still queued when a worker process exits cannot be
+resumed and stay in their last recorded status.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from stellar_sdk.exceptions import BadRequestError, BadResponseError
+from stellar_sdk.exceptions import ConnectionError as HorizonConnectionError
+
+from .balances import invalidate_balances
+from .horizon import get_server
+from .models import PaymentJob
+from .payments import (
+    PaymentError, SubmissionUncertain, find_transaction, is_bad_sequence, result_codes, submit_payments
+)
+
+logger = logging.getLogger(__name__)
+
+MAX_BACKOFF = 30
+
+
+def _error_message(error):
+    codes = result_codes(error)
+    if codes.get('transaction'):
+        operations = [code for code in codes.get('operations') or [] if code != 'op_success']
+        return ', '.join([codes['transaction'], *operations])
+    return str(error) or type(error).__name__
+
+
+def _is_transient(error):
+    """Failures worth another attempt with a freshly built transaction"""
+    # A rebuilt transaction gets a fresh sequence number and the current fee
+    if is_bad_sequence(error) or result_codes(error).get('transaction') == 'tx_insufficient_fee':
+        return True
+    # Asset and issuer are checked before queueing, so this is a busy channel or source account
+    if isinstance(error, PaymentError):
+        return True
+    return isinstance(error, (HorizonConnectionError, BadResponseError))
+
+
+def _confirm(server, uncertain):
+    """
+    Settle a submission whose outcome is unknown
+    Looks the transaction up and resubmits the same envelope until it lands.
+    Returns its record, or None once it can no longer be applied (time bounds
+    passed, or its sequence number was used by another transaction).
+    """
+    transaction_hash = uncertain.transaction_hash
+    max_time = uncertain.envelope.transaction.preconditions.time_bounds.max_time
+    backoff = settings.STELLAR_PAYMENT_JOB_BACKOFF
+    superseded = False
+
+    while True:
+        try:
+            record = find_transaction(server, transaction_hash)
+        except (HorizonConnectionError, BadResponseError):
+            if time.time() > max_time + MAX_BACKOFF:
+                raise
+        else:
+            if record is not None:
+                if not record.get('successful', True):
+                    raise PaymentError(f'Transaction {transaction_hash} failed in ledger {record.get("ledger")}')
+                return record
+            if superseded or time.time() > max_time:
+                return None
+
+        try:
+            # Same envelope, same hash: it can be applied at most once
+            return server.submit_transaction(uncertain.envelope, skip_memo_required_check=True)
+        except BadRequestError as e:
+            if not is_bad_sequence(e):
+                raise
+            # The sequence number is spent: by this envelope or by another one
+            superseded = True
+        except (HorizonConnectionError, BadResponseError):
+            pass
+        time.sleep(backoff)
+        backoff = min(backoff * 2, MAX_BACKOFF)
+
+
+def _save(job, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=[*fields, 'updated_at'])
+
+
+def process_job(job_pk, keypair, asset):
+    """Submit one queued payment, retrying transient failures, and record the outcome"""
+    close_old_connections()
+    job = PaymentJob.objects.get(pk=job_pk)
+    payment = {'destination': job.destination, 'asset': asset, 'amount': job.amount}
+    backoff = settings.STELLAR_PAYMENT_JOB_BACKOFF
+    error = None
+
+    for attempt in range(1, settings.STELLAR_PAYMENT_JOB_MAX_ATTEMPTS + 1):
+        _save(job, status=PaymentJob.STATUS_SUBMITTED, attempts=attempt)
+        try:
+            response = submit_payments(
+                keypair, [payment], memo_text=job.memo, base_fee=job.base_fee, max_fee=job.max_fee
+            )
+        except SubmissionUncertain as e:
+            _save(job, transaction_hash=e.transaction_hash)
+            try:
+                response = _confirm(get_server(), e)
+            except Exception as confirm_error:
+                _save(job, status=PaymentJob.STATUS_FAILED, error=_error_message(confirm_error))
+                return
+            error = 'Transaction expired before it was applied'
+        except Exception as e:
+            if not _is_transient(e):
+                _save(job, status=PaymentJob.STATUS_FAILED, error=_error_message(e))
+                return
+            response = None
+            error = _error_message(e)
+
+        if response is not None:
+            _save(
+                job,
+                status=PaymentJob.STATUS_SUCCEEDED,
+                transaction_hash=response['hash'],
+                ledger=response.get('ledger'),
+                error=None,
+            )
+            invalidate_balances(job.source_account, job.destination)
+            return
+
+        logger.info('Payment job %s attempt %s failed (%s), retrying in %ss', job.job_id, attempt, error, backoff)
+        time.sleep(backoff)
+        backoff = min(backoff * 2, MAX_BACKOFF)
+
+    _save(job, status=PaymentJob.STATUS_FAILED, error=error)
+
+
+class PaymentQueue:
+    """In-process job queue drained by daemon worker threads started on first use"""
+
+    def __init__(self, workers):
+        self.workers = workers
+        self.jobs = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'payment-job-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            job_pk, keypair, asset = self.jobs.get()
+            try:
+                process_job(job_pk, keypair, asset)
+            except Exception:
+                logger.exception('Payment job %s crashed', job_pk)
+                PaymentJob.objects.filter(pk=job_pk).exclude(
+                    status=PaymentJob.STATUS_SUCCEEDED
+                ).update(status=PaymentJob.STATUS_FAILED, error='Internal error')
+            finally:
+                self.jobs.task_done()
+
+    def enqueue(self, job, keypair, asset):
+        """Queue a saved PaymentJob; the keypair stays in memory only"""
+        self._start()
+        self.jobs.put((job.pk, keypair, asset))
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_payment_queue():
+    """Process-wide payment queue"""
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = PaymentQueue(max(settings.STELLAR_PAYMENT_WORKERS, 1))
+    return _queue
+
+
+def _reset_queue():
+    global _queue
+    _queue = None
+
+
+# Worker threads do not survive a fork; children start their own
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_queue)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from authentication.ingest import Ingester
+
+
+class Command(BaseCommand):
+    help = 'Stream Horizon operations for every registered wallet into the local index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Rows written per transaction')
+        parser.add_argument('--flush-interval', type=float, help='Seconds between writes')
+        parser.add_argument('--rescan-interval', type=float, help='Seconds between checks for new wallets')
+        parser.add_argument('--duration', type=float, help='Stop after this many seconds (default: run forever)')
+
+    def handle(self, *args, **options):
+        ingester = Ingester(
+            batch_size=options['batch_size'],
+            flush_interval=options['flush_interval'],
+            rescan_interval=options['rescan_interval'],
+        )
+        self.stdout.write('Ingesting operations for registered wallets...')
+        try:
+            ingester.run(duration=options['duration'])
+        except KeyboardInterrupt:
+            ingester.stop()
+        self.stdout.write(self.style.SUCCESS(f'Stopped; {len(ingester.streams)} account stream(s) were open'))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from authentication.purge import purge_cutoff, purge_expired_sessions
+
+
+class Command(BaseCommand):
+    help = 'Delete expired authentication sessions in bounded batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Rows deleted per transaction')
+        parser.add_argument('--retention', type=int, help='Seconds to keep sessions after they expire')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+        parser.add_argument('--interval', type=float, help='Purge again every this many seconds (default: once)')
+
+    def handle(self, *args, **options):
+        total = 0
+        try:
+            while True:
+                started = time.monotonic()
+                deleted = purge_expired_sessions(
+                    cutoff=purge_cutoff(options['retention']),
+                    batch_size=options['batch_size'],
+                    pause=options['pause'],
+                )
+                total += deleted
+                self.stdout.write(f'Purged {deleted} expired session(s) in {time.monotonic() - started:.1f}s')
+                if not options['interval']:
+                    break
+                time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(self.style.SUCCESS(f'Stopped; {total} session(s) purged'))
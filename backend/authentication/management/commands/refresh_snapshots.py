@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from authentication.snapshots import SnapshotScheduler
+
+
+class Command(BaseCommand):
+    help = 'Keep an AccountSnapshot of every registered wallet fresh from Horizon'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Snapshots refreshed per batch')
+        parser.add_argument('--concurrency', type=int, help='Horizon calls in flight per batch')
+        parser.add_argument('--min-interval', type=float, help='Seconds between refreshes of an active account')
+        parser.add_argument('--max-interval', type=float, help='Longest back-off for an idle account, seconds')
+        parser.add_argument('--rescan-interval', type=float, default=30, help='Seconds between checks for new wallets')
+        parser.add_argument('--once', action='store_true', help='Refresh everything due once and exit')
+        parser.add_argument('--duration', type=float, help='Stop after this many seconds (default: run forever)')
+
+    def handle(self, *args, **options):
+        scheduler = SnapshotScheduler(
+            batch_size=options['batch_size'],
+            concurrency=options['concurrency'],
+            min_interval=options['min_interval'],
+            max_interval=options['max_interval'],
+        )
+        self.stdout.write('Refreshing account snapshots for registered wallets...')
+        try:
+            if options['once']:
+                scheduler.run_once()
+            else:
+                scheduler.run(duration=options['duration'], rescan_interval=options['rescan_interval'])
+        except KeyboardInterrupt:
+            scheduler.stop()
+        self.stdout.write(self.style.SUCCESS(
+            f'Stopped; {scheduler.refreshed} snapshot(s) refreshed, {scheduler.changed} changed'
+        ))
@@ -0,0 +1,305 @@
+"""
+Prometheus metrics
+
+Request latency and status per view, Horizon call latency and errors per
+endpoint type, database queries and cache hit/miss counts, served at
+/metrics. Each request also gets a breakdown of its time: how much went to
+Horizon, how much to the database, and named phases such as serialization.
+
+Under gunicorn set PROMETHEUS_MULTIPROC_DIR (entrypoint.sh does) so every
+worker writes its samples to shared files and /metrics aggregates them.
+/metrics is served only to settings.METRICS_ALLOWED_NETWORKS.
+"""
+import contextvars
+import ipaddress
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from urllib.parse import urlparse
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+)
+from stellar_sdk.client.aiohttp_client import AiohttpClient
+from stellar_sdk.client.requests_client import RequestsClient
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+REQUESTS = Counter(
+    'http_requests_total', 'HTTP requests by view, method and status', ['view', 'method', 'status']
+)
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by view', ['view', 'method'],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_HORIZON_CALLS = Histogram(
+    'http_request_horizon_calls', 'Horizon calls made while serving one request', ['view'],
+    buckets=COUNT_BUCKETS
+)
+REQUEST_HORIZON_SECONDS = Histogram(
+    'http_request_horizon_seconds', 'Time spent waiting on Horizon per request', ['view'],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries per request', ['view'], buckets=COUNT_BUCKETS
+)
+REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds', 'Time spent in database queries per request', ['view'],
+    buckets=LATENCY_BUCKETS
+)
+VIEW_PHASE_SECONDS = Histogram(
+    'view_phase_duration_seconds', 'Time spent in a named phase of a view', ['view', 'phase'],
+    buckets=LATENCY_BUCKETS
+)
+HORIZON_LATENCY = Histogram(
+    'horizon_request_duration_seconds', 'Horizon call latency by endpoint type', ['endpoint', 'method'],
+    buckets=LATENCY_BUCKETS
+)
+HORIZON_ERRORS = Counter(
+    'horizon_request_errors_total', 'Failed Horizon calls by endpoint type and status (or "connection")',
+    ['endpoint', 'status']
+)
+HORIZON_HEDGES = Counter(
+    'horizon_hedged_reads_total', 'Hedged Horizon reads by which request answered first', ['winner']
+)
+HORIZON_CIRCUIT_OPENS = Counter(
+    'horizon_circuit_opens_total', 'Times the circuit breaker of a Horizon URL opened', ['url']
+)
+CACHE_REQUESTS = Counter(
+    'cache_requests_total', 'Stale-while-revalidate cache lookups by result (hit, stale, miss)',
+    ['cache', 'result']
+)
+ADMISSION_REJECTIONS = Counter(
+    'admission_rejections_total', 'Requests turned away by admission control by scope and limit (client, upstream)',
+    ['scope', 'limit']
+)
+
+
+class RequestStats:
+    """Horizon and database time accumulated while serving one request"""
+
+    def __init__(self, view):
+        self.view = view
+        self.horizon_calls = 0
+        self.horizon_seconds = 0.0
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add_horizon(self, seconds):
+        with self._lock:
+            self.horizon_calls += 1
+            self.horizon_seconds += seconds
+
+    def add_query(self, seconds):
+        with self._lock:
+            self.db_queries += 1
+            self.db_seconds += seconds
+
+
+_request_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+def bind_request(fn):
+    """Wrap `fn` so calls on pool threads count towards the current request"""
+    stats = _request_stats.get()
+
+    def wrapper(*args, **kwargs):
+        token = _request_stats.set(stats)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _request_stats.reset(token)
+    return wrapper
+
+
+@contextmanager
+def phase(name):
+    """Time a named phase of the current view (e.g. 'serialize')"""
+    stats = _request_stats.get()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if stats is not None:
+            VIEW_PHASE_SECONDS.labels(stats.view, name).observe(time.perf_counter() - started)
+
+
+def record_cache(key, result):
+    """Count a cache lookup; the cache label is the key's kind (stellar:<kind>:...)"""
+    parts = key.split(':')
+    CACHE_REQUESTS.labels(parts[1] if len(parts) > 2 else 'other', result).inc()
+
+
+# -- Horizon ------------------------------------------------------------------
+
+def horizon_endpoint(url, method):
+    """Endpoint type of a Horizon URL: accounts, transactions, operations, submit..."""
+    parts = [part for part in urlparse(url).path.split('/') if part]
+    if method == 'POST' and parts[-1:] == ['transactions']:
+        return 'submit'
+    if not parts:
+        return 'root'
+    if parts[0] in ('accounts', 'transactions', 'ledgers', 'liquidity_pools') and len(parts) > 2:
+        # /accounts/{id}/operations, /transactions/{hash}/operations...
+        return parts[2]
+    return parts[0]
+
+
+def _observe_horizon(url, method, started, status=None, failed=False):
+    elapsed = time.perf_counter() - started
+    endpoint = horizon_endpoint(url, method)
+    HORIZON_LATENCY.labels(endpoint, method).observe(elapsed)
+    if failed:
+        HORIZON_ERRORS.labels(endpoint, 'connection').inc()
+    elif status >= 400:
+        HORIZON_ERRORS.labels(endpoint, str(status)).inc()
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.add_horizon(elapsed)
+
+
+class InstrumentedRequestsClient(RequestsClient):
+    """RequestsClient recording latency and errors of every GET and POST"""
+
+    def get(self, url, params=None):
+        started = time.perf_counter()
+        try:
+            response = super().get(url, params)
+        except Exception:
+            _observe_horizon(url, 'GET', started, failed=True)
+            raise
+        _observe_horizon(url, 'GET', started, response.status_code)
+        return response
+
+    def post(self, url, data=None, json_data=None):
+        started = time.perf_counter()
+        try:
+            response = super().post(url, data, json_data)
+        except Exception:
+            _observe_horizon(url, 'POST', started, failed=True)
+            raise
+        _observe_horizon(url, 'POST', started, response.status_code)
+        return response
+
+
+class InstrumentedAiohttpClient(AiohttpClient):
+    """AiohttpClient recording latency and errors of every GET and POST"""
+
+    async def get(self, url, params=None):
+        started = time.perf_counter()
+        try:
+            response = await super().get(url, params)
+        except Exception:
+            _observe_horizon(url, 'GET', started, failed=True)
+            raise
+        _observe_horizon(url, 'GET', started, response.status_code)
+        return response
+
+    async def post(self, url, data=None, json_data=None):
+        started = time.perf_counter()
+        try:
+            response = await super().post(url, data, json_data)
+        except Exception:
+            _observe_horizon(url, 'POST', started, failed=True)
+            raise
+        _observe_horizon(url, 'POST', started, response.status_code)
+        return response
+
+
+# -- Requests -----------------------------------------------------------------
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else 'unmatched'
+
+
+def _record_request(request, response, stats, started):
+    view = _view_name(request)
+    REQUESTS.labels(view, request.method, str(response.status_code)).inc()
+    REQUEST_LATENCY.labels(view, request.method).observe(time.perf_counter() - started)
+    REQUEST_HORIZON_CALLS.labels(view).observe(stats.horizon_calls)
+    REQUEST_HORIZON_SECONDS.labels(view).observe(stats.horizon_seconds)
+    REQUEST_DB_QUERIES.labels(view).observe(stats.db_queries)
+    REQUEST_DB_SECONDS.labels(view).observe(stats.db_seconds)
+
+
+class MetricsMiddleware:
+    """Records latency, status, Horizon and database time for every request"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats('unmatched')
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+
+        def count_query(execute, sql, params, many, context):
+            query_started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stats.add_query(time.perf_counter() - query_started)
+
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(count_query))
+                response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        _record_request(request, response, stats, started)
+        return response
+
+    async def __acall__(self, request):
+        # Database work happens on sync_to_async threads here and is not counted
+        stats = RequestStats('unmatched')
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        _record_request(request, response, stats, started)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.view = _view_name(request)
+
+
+def _metrics_allowed(request):
+    # REMOTE_ADDR only: forwarded headers are the client's to set
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_NETWORKS
+    )
+
+
+def metrics_view(request):
+    """Prometheus text exposition, aggregated across workers in multiprocess mode"""
+    if not _metrics_allowed(request):
+        return HttpResponseForbidden()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -1,7 +1,15 @@
+import hashlib
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 
 
+def challenge_digest(challenge):
+    """Indexed lookup key for a challenge message (SHA-256, hex)"""
+    return hashlib.sha256(challenge.encode()).hexdigest()
+
+
 class StellarWallet(models.Model):
     """Model to store Stellar wallet information"""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='stellar_wallet')
@@ -21,6 +29,8 @@ class AuthenticationSession(models.Model):
     wallet = models.ForeignKey(StellarWallet, on_delete=models.CASCADE, related_name='sessions')
     session_key = models.CharField(max_length=255, unique=True)
     challenge = models.TextField()  # Challenge message for signature verification
+    # challenge_digest(challenge), set on save; TextField columns cannot be indexed everywhere
+    challenge_digest = models.CharField(max_length=64, default='', editable=False)
     signature = models.TextField(null=True, blank=True)  # User's signature
     is_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -28,6 +38,126 @@ class AuthenticationSession(models.Model):
     
     class Meta:
         db_table = 'authentication_sessions'
+        indexes = [
+            models.Index(fields=['challenge_digest'], name='auth_session_challenge_idx'),
+            # purge_auth_sessions deletes oldest first
+            models.Index(fields=['expires_at'], name='auth_session_expiry_idx'),
+        ]
         
     def __str__(self):
         return f"Session for {self.wallet.public_key}"
+    
+    def save(self, *args, **kwargs):
+        self.challenge_digest = challenge_digest(self.challenge)
+        super().save(*args, **kwargs)
+
+
+class IndexedOperation(models.Model):
+    """Operation on a registered wallet's account, ingested from Horizon"""
+    account = models.CharField(max_length=56)  # Wallet public key the operation was streamed for
+    operation_id = models.BigIntegerField()
+    # Horizon total-order id of the parent transaction (operation_id >> 12)
+    transaction_order = models.BigIntegerField()
+    paging_token = models.CharField(max_length=32)
+    type = models.CharField(max_length=64)
+    created_at = models.DateTimeField()
+    transaction_hash = models.CharField(max_length=64)
+    source_account = models.CharField(max_length=69)
+    is_payment = models.BooleanField(default=False)
+    from_address = models.CharField(max_length=69, null=True, blank=True)
+    to_address = models.CharField(max_length=69, null=True, blank=True)
+    amount = models.CharField(max_length=32, null=True, blank=True)
+    asset_code = models.CharField(max_length=12, null=True, blank=True)
+    asset_type = models.CharField(max_length=32, null=True, blank=True)
+
+    class Meta:
+        db_table = 'indexed_operations'
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'operation_id'], name='indexed_operation_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['account', '-transaction_order', 'operation_id'], name='indexed_op_history_idx'),
+            models.Index(fields=['account', 'is_payment', '-operation_id'], name='indexed_op_payments_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} {self.operation_id} for {self.account}"
+
+
+class IngestionCursor(models.Model):
+    """Last Horizon paging token ingested for an account"""
+    account = models.CharField(max_length=56, unique=True)
+    paging_token = models.CharField(max_length=32)
+    # Cursor ingestion began from: '0' backfilled the whole history, 'now' or a
+    # paging token only covers what came after it
+    start_cursor = models.CharField(max_length=32, default='0')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'ingestion_cursors'
+
+    def __str__(self):
+        return f"{self.account} @ {self.paging_token}"
+
+
+class AccountSnapshot(models.Model):
+    """Materialised Horizon state of a registered wallet, kept fresh by refresh_snapshots"""
+    account = models.CharField(max_length=56, unique=True)
+    found = models.BooleanField(default=False)  # False until funded on the network
+    balances = models.JSONField(default=list)  # Shaped as balances.shape_balances
+    sequence = models.CharField(max_length=20, null=True, blank=True)
+    last_modified_ledger = models.BigIntegerField(null=True, blank=True)
+    # Operations of the latest STELLAR_SNAPSHOT_HISTORY_LIMIT transactions, newest first
+    operations = models.JSONField(default=list)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+    # Last on-chain change seen or wallet login; due snapshots refresh most recent first
+    active_at = models.DateTimeField(null=True, blank=True)
+    next_refresh_at = models.DateTimeField()
+    idle_refreshes = models.PositiveIntegerField(default=0)  # Unchanged refreshes in a row
+    error = models.TextField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'account_snapshots'
+        indexes = [
+            models.Index(fields=['next_refresh_at'], name='account_snapshot_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Snapshot of {self.account} @ {self.last_modified_ledger}"
+
+
+class PaymentJob(models.Model):
+    """Payment accepted in async mode; status is updated by the job workers"""
+    STATUS_QUEUED = 'queued'
+    STATUS_SUBMITTED = 'submitted'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_SUBMITTED, 'Submitted'),
+        (STATUS_SUCCEEDED, 'Succeeded'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    source_account = models.CharField(max_length=56)
+    destination = models.CharField(max_length=56)
+    amount = models.CharField(max_length=32)
+    asset_code = models.CharField(max_length=12, default='XLM')
+    asset_issuer = models.CharField(max_length=56, null=True, blank=True)
+    memo = models.CharField(max_length=28, null=True, blank=True)
+    base_fee = models.PositiveIntegerField(null=True, blank=True)  # Stroops per operation; None uses the fee oracle
+    max_fee = models.PositiveIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    transaction_hash = models.CharField(max_length=64, null=True, blank=True)
+    ledger = models.BigIntegerField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'payment_jobs'
+
+    def __str__(self):
+        return f"Payment job {self.job_id} ({self.status})"
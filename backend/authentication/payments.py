@@ -0,0 +1,136 @@
+"""
+Payment building and submission
+
+Shared by the payment endpoints: picks the transaction source (a leased
+channel account when configured, otherwise the sender under a per-account
+lease), allocates its sequence number (see sequence), and retries with a
+fresh sequence when Horizon answers ``tx_bad_seq``.
+
+A timeout, 5xx or dropped connection does not mean the transaction failed:
+it may still be applied. Those raise ``SubmissionUncertain`` carrying the
+signed envelope, which can be resubmitted as is (same hash, so it cannot pay
+twice) until it lands or its time bounds expire.
+
+Fees come from the fee oracle (see fees) unless the caller overrides them.
+"""
+from django.conf import settings
+from stellar_sdk import Asset, TransactionBuilder
+from stellar_sdk.exceptions import BadRequestError, BadResponseError, NotFoundError
+from stellar_sdk.exceptions import ConnectionError as HorizonConnectionError
+
+from .fees import select_base_fee
+from .horizon import get_network_passphrase, get_server
+from .sequence import LeaseUnavailable, get_channel_pool, get_sequence_allocator, submission_lock
+
+
+class PaymentError(Exception):
+    """A payment request that cannot be built (bad asset, missing issuer...)"""
+
+
+class SubmissionUncertain(Exception):
+    """Horizon neither confirmed nor rejected a submitted transaction"""
+
+    def __init__(self, envelope, error):
+        super().__init__(str(error) or type(error).__name__)
+        self.envelope = envelope
+        self.transaction_hash = envelope.hash_hex()
+
+
+def build_asset(asset_code, asset_issuer=None):
+    """Asset for a payment; XLM is native, anything else needs an issuer"""
+    if asset_code == 'XLM':
+        return Asset.native()
+    if not asset_issuer:
+        raise PaymentError('asset_issuer is required for non-XLM assets')
+    return Asset(asset_code, asset_issuer)
+
+
+def result_codes(error):
+    """Horizon result codes from a failed submission, if any"""
+    if isinstance(error, BadRequestError) and error.extras:
+        return error.extras.get('result_codes') or {}
+    return {}
+
+
+def is_bad_sequence(error):
+    return result_codes(error).get('transaction') == 'tx_bad_seq'
+
+
+def find_transaction(server, transaction_hash):
+    """Horizon's record of a transaction, or None if it is not in a ledger"""
+    try:
+        return server.transactions().transaction(transaction_hash).call()
+    except NotFoundError:
+        return None
+
+
+def _submit(server, source_keypair, payments, memo_text, tx_source_keypair, fee_options):
+    allocator = get_sequence_allocator()
+    tx_source = tx_source_keypair.public_key
+    # Payment operations carry their own source only when a channel fronts the transaction
+    op_source = source_keypair.public_key if tx_source_keypair is not source_keypair else None
+
+    for attempt in range(settings.STELLAR_BAD_SEQ_RETRIES + 1):
+        builder = TransactionBuilder(
+            source_account=allocator.next_account(server, tx_source),
+            network_passphrase=get_network_passphrase(),
+            base_fee=select_base_fee(**fee_options)
+        )
+        for payment in payments:
+            builder.append_payment_op(
+                destination=payment['destination'],
+                asset=payment['asset'],
+                amount=payment['amount'],
+                source=op_source
+            )
+        if memo_text:
+            builder.add_text_memo(memo_text)
+
+        transaction = builder.set_timeout(30).build()
+        transaction.sign(tx_source_keypair)
+        if op_source:
+            transaction.sign(source_keypair)
+
+        try:
+            return server.submit_transaction(transaction)
+        except Exception as e:
+            # Whatever happened, the local sequence can no longer be trusted
+            allocator.resync(tx_source)
+            if is_bad_sequence(e):
+                # The HTTP client retries POSTs, so a bad sequence can mean an
+                # earlier try of this very envelope was applied
+                try:
+                    landed = find_transaction(server, transaction.hash_hex())
+                except (HorizonConnectionError, BadResponseError) as lookup_error:
+                    raise SubmissionUncertain(transaction, lookup_error) from e
+                if landed:
+                    return landed
+                if attempt < settings.STELLAR_BAD_SEQ_RETRIES:
+                    continue
+            if isinstance(e, (HorizonConnectionError, BadResponseError)):
+                raise SubmissionUncertain(transaction, e) from e
+            raise
+
+
+def submit_payments(source_keypair, payments, memo_text=None, base_fee=None, max_fee=None):
+    """
+    Build, sign and submit one transaction carrying `payments`
+    Each payment is a dict with destination, asset (stellar_sdk.Asset) and
+    amount. base_fee overrides the fee oracle; max_fee caps it (stroops per
+    operation). Returns Horizon's submit response.
+    """
+    server = get_server()
+    fee_options = {'override': base_fee, 'cap': max_fee}
+    channels = get_channel_pool()
+    if channels is None:
+        try:
+            with submission_lock(source_keypair.public_key):
+                return _submit(server, source_keypair, payments, memo_text, source_keypair, fee_options)
+        except LeaseUnavailable:
+            raise PaymentError('Another payment from this account is still being submitted; try again later')
+
+    try:
+        with channels.checkout(timeout=settings.STELLAR_CHANNEL_CHECKOUT_TIMEOUT) as channel:
+            return _submit(server, source_keypair, payments, memo_text, channel, fee_options)
+    except LeaseUnavailable:
+        raise PaymentError('No channel account became available; try again later')
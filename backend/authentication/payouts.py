@@ -0,0 +1,148 @@
+"""
+Bulk payouts
+
+Rows are validated one at a time, grouped by source account and packed into
+transactions of up to settings.STELLAR_MAX_OPS_PER_TX payment operations,
+which are submitted as soon as they fill up. CSV uploads are read in full
+before the first row is queued, so a file that turns out to be unreadable
+halfway through is rejected without paying any of it.
+"""
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from stellar_sdk import Keypair
+
+from .balances import invalidate_balances
+from .payments import PaymentError, SubmissionUncertain, build_asset, result_codes, submit_payments
+from .sequence import get_channel_pool
+from .serializers import BulkPaymentRowSerializer
+
+
+def read_csv_rows(uploaded_file):
+    """
+    CSV rows as dicts; empty cells are treated as missing
+    Raises UnicodeDecodeError or csv.Error if any part of the file cannot be read.
+    """
+    text = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+    return [
+        {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+        for row in csv.DictReader(text)
+    ]
+
+
+class PayoutRun:
+    """Collects rows, submits full transactions in the background, reports per row"""
+
+    def __init__(self, default_secret=None, memo_text=None, base_fee=None, max_fee=None):
+        self.default_secret = default_secret
+        self.memo_text = memo_text or None
+        self.fee_options = {'base_fee': base_fee, 'max_fee': max_fee}
+        self.max_ops = settings.STELLAR_MAX_OPS_PER_TX
+        self.results = []
+        self.transactions = 0
+        self._keypairs = {}
+        self._pending = {}
+        self._futures = []
+        self._touched = set()
+
+        channels = get_channel_pool()
+        workers = channels.size if channels else settings.STELLAR_PAYOUT_CONCURRENCY
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1))
+
+    def _keypair(self, secret):
+        if secret not in self._keypairs:
+            self._keypairs[secret] = Keypair.from_secret(secret)
+        return self._keypairs[secret]
+
+    def add(self, row):
+        """Validate one row and queue it on its source account's next transaction"""
+        result = {
+            'index': len(self.results),
+            'destination': row.get('destination'),
+            'amount': row.get('amount'),
+            'asset_code': row.get('asset_code', 'XLM'),
+            'status': 'pending',
+        }
+        self.results.append(result)
+
+        serializer = BulkPaymentRowSerializer(data=row)
+        if not serializer.is_valid():
+            result.update(status='invalid', error=serializer.errors)
+            return
+        data = serializer.validated_data
+
+        secret = data.get('secret_key') or self.default_secret
+        if not secret:
+            result.update(status='invalid', error='secret_key is required')
+            return
+        try:
+            keypair = self._keypair(secret)
+            asset = build_asset(data['asset_code'], data.get('asset_issuer'))
+        except PaymentError as e:
+            result.update(status='invalid', error=str(e))
+            return
+        except Exception:
+            result.update(status='invalid', error='Invalid secret key')
+            return
+
+        result['amount'] = str(data['amount'])
+        batch = self._pending.setdefault(keypair.public_key, (keypair, []))[1]
+        batch.append((result, {'destination': data['destination'], 'asset': asset, 'amount': result['amount']}))
+        if len(batch) == self.max_ops:
+            self._flush(keypair.public_key)
+
+    def _flush(self, public_key):
+        keypair, batch = self._pending.pop(public_key)
+        self.transactions += 1
+        self._futures.append(self._executor.submit(self._submit, keypair, batch))
+
+    def _submit(self, keypair, batch):
+        payments = [payment for _, payment in batch]
+        try:
+            response = submit_payments(keypair, payments, memo_text=self.memo_text, **self.fee_options)
+        except SubmissionUncertain as e:
+            # It may still be applied: re-running these rows could pay them twice
+            for index, (result, _) in enumerate(batch):
+                result.update(
+                    status='uncertain',
+                    error=f'Submission outcome unknown ({e}); look the transaction up before retrying',
+                    transaction_hash=e.transaction_hash,
+                    operation_index=index,
+                )
+            return
+        except Exception as e:
+            codes = result_codes(e)
+            operation_codes = codes.get('operations') or []
+            for index, (result, _) in enumerate(batch):
+                code = operation_codes[index] if index < len(operation_codes) else None
+                if code and code != 'op_success':
+                    error = code
+                elif codes.get('transaction'):
+                    error = f"{codes['transaction']} (transaction rolled back)"
+                else:
+                    error = f'Payment failed: {e}'
+                result.update(status='failed', error=error, operation_index=index)
+            return
+
+        for index, (result, _) in enumerate(batch):
+            result.update(
+                status='success',
+                transaction_hash=response['hash'],
+                operation_index=index,
+                ledger=response.get('ledger'),
+            )
+        # Invalidated by finish() on the request thread, which owns the database connection
+        self._touched.update([keypair.public_key, *(payment['destination'] for payment in payments)])
+
+    def finish(self):
+        """Submit partially filled transactions, wait for every submission and forget paid accounts' balances"""
+        for public_key in list(self._pending):
+            self._flush(public_key)
+        for future in self._futures:
+            future.result()
+        self._executor.shutdown()
+        if self._touched:
+            invalidate_balances(*self._touched)
+        return self.results
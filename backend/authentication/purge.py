@@ -0,0 +1,46 @@
+"""
+Expired sign-in session purge
+
+An AuthenticationSession is only used until its challenge expires; rows are
+kept STELLAR_AUTH_SESSION_RETENTION seconds longer and then deleted. The purge
+walks the expires_at index oldest first and deletes by primary key in
+batches, each in its own short transaction, so a backlog of millions of rows
+never becomes one long-running DELETE holding locks on the table.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AuthenticationSession
+
+
+def purge_cutoff(retention=None):
+    """Sessions that expired before this are purged"""
+    if retention is None:
+        retention = settings.STELLAR_AUTH_SESSION_RETENTION
+    return timezone.now() - timedelta(seconds=retention)
+
+
+def purge_expired_sessions(cutoff=None, batch_size=None, pause=0):
+    """
+    Delete sessions that expired before `cutoff` (default: purge_cutoff()), `batch_size` rows at a time
+    Sleeps `pause` seconds between batches; returns how many rows were deleted
+    """
+    cutoff = cutoff or purge_cutoff()
+    batch_size = batch_size or settings.STELLAR_AUTH_SESSION_PURGE_BATCH_SIZE
+    expired = AuthenticationSession.objects.filter(expires_at__lt=cutoff).order_by('expires_at')
+    deleted = 0
+    while True:
+        with transaction.atomic():
+            ids = list(expired.values_list('pk', flat=True)[:batch_size])
+            if ids:
+                # No signals or cascades: a single DELETE ... WHERE id IN (...)
+                deleted += AuthenticationSession.objects.filter(pk__in=ids).delete()[0]
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted
@@ -0,0 +1,335 @@
+"""
+Live account updates over Server-Sent Events
+
+One upstream Horizon operations stream per watched account is fanned out to
+every browser subscribed to it. Subscriptions are reference counted: the
+first subscriber starts the account's feed, and the feed stops when the last
+one leaves. Each new operation is pushed as an ``operation`` event, followed
+by a ``balance`` event with the account's refreshed balances. Streams are
+served by the coroutine view only (async_views.account_events), so an open
+one holds no worker thread.
+
+Operation events carry their paging token as the SSE id. A browser that
+reconnects (the stream ends after STELLAR_PUSH_MAX_AGE) sends it back as
+Last-Event-ID and is first sent the operations it missed, up to
+REPLAY_LIMIT of them; past that it should reload the history endpoint.
+
+A feed thread only notices that it has been stopped at its next upstream
+message or reconnect, so an idle upstream connection can outlive its last
+subscriber by up to the stream's read timeout.
+"""
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.renderers import BaseRenderer
+from stellar_sdk.exceptions import StreamClientError
+
+from .balances import get_balances, invalidate_balances
+from .history import operation_to_transaction_data
+from .horizon import get_server
+from .serializers import BalanceSerializer
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per subscriber before it is treated as too slow and dropped
+SUBSCRIBER_QUEUE_SIZE = 100
+# Sent as the stream's `retry:` so browsers reconnect quickly after max age
+RECONNECT_MS = 1000
+# Most missed operations replayed to a reconnecting browser (one Horizon page)
+REPLAY_LIMIT = 200
+
+
+class HubFull(Exception):
+    """No more accounts can be watched by this process"""
+
+
+def format_event(event, data, event_id=None):
+    """One SSE message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, default=str)}')
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+KEEPALIVE = b': keepalive\n\n'
+CLOSED = object()
+
+
+def balance_event(public_key, balances):
+    data = {'public_key': public_key, 'balances': BalanceSerializer.represent(balances)}
+    return format_event('balance', data)
+
+
+def _event_id(message):
+    """Paging token of an operation event, or None for other messages"""
+    if not message.startswith(b'id: '):
+        return None
+    return int(message[4:message.index(b'\n')])
+
+
+def missed_operations(public_key, cursor):
+    """Operation events after paging token `cursor`, oldest first, for a reconnecting browser"""
+    page = (
+        get_server().operations().for_account(public_key)
+        .cursor(cursor).order(desc=False).limit(REPLAY_LIMIT).call()
+    )
+    return [
+        format_event('operation', operation_to_transaction_data(op), op['paging_token'])
+        for op in page['_embedded']['records']
+    ]
+
+
+class Subscription:
+    """A subscriber's buffered events; the feed thread calls deliver()"""
+
+    def __init__(self, account):
+        self.account = account
+        self._queue = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def deliver(self, message):
+        """Queue a message, closing the subscription if the client is not keeping up"""
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            self.close()
+
+    def close(self):
+        # Make room so the close marker always gets through
+        while True:
+            try:
+                self._queue.put_nowait(CLOSED)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout):
+        """Next message, KEEPALIVE after `timeout` seconds of silence, or CLOSED"""
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return KEEPALIVE
+
+
+class AsyncSubscription(Subscription):
+    """Subscription read from an event loop without tying up a thread"""
+
+    def __init__(self, account):
+        self.account = account
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+
+    def _put(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(CLOSED)
+
+    def deliver(self, message):
+        try:
+            self._loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The subscriber's event loop has closed; the stream unsubscribes on its way out
+            pass
+
+    def close(self):
+        self.deliver(CLOSED)
+
+    async def get(self, timeout):
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return KEEPALIVE
+
+
+class AccountFeed(threading.Thread):
+    """Follows one account's operations stream and publishes to its subscribers"""
+
+    def __init__(self, account):
+        super().__init__(name=f'push:{account}', daemon=True)
+        self.account = account
+        self.subscribers = set()
+        self.stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def publish(self, message):
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+    def _publish_balances(self, server):
+        invalidate_balances(self.account)
+        try:
+            balances, hit, age = get_balances(server, self.account)
+        except Exception:
+            logger.warning('Balance refresh for %s failed', self.account, exc_info=True)
+            return
+        self.publish(balance_event(self.account, balances))
+
+    def _latest_cursor(self, server):
+        """Paging token of the newest operation, so nothing is missed while the stream connects"""
+        try:
+            page = server.operations().for_account(self.account).order(desc=True).limit(1).call()
+        except Exception:
+            # Unfunded accounts have no operations yet
+            return 'now'
+        records = page['_embedded']['records']
+        return records[0]['paging_token'] if records else 'now'
+
+    def run(self):
+        # Only operations after the first subscriber arrived; earlier ones are in the history endpoint
+        cursor = None
+        backoff = 1
+        while not self.stop_event.is_set():
+            try:
+                server = get_server()
+                if cursor is None:
+                    cursor = self._latest_cursor(server)
+                stream = server.operations().for_account(self.account).cursor(cursor).stream()
+                for op in stream:
+                    if self.stop_event.is_set():
+                        return
+                    cursor = op['paging_token']
+                    self.publish(format_event('operation', operation_to_transaction_data(op), cursor))
+                    self._publish_balances(server)
+                    backoff = 1
+            except StreamClientError:
+                logger.warning('Push stream for %s failed at cursor %s, retrying in %ss',
+                               self.account, cursor, backoff, exc_info=True)
+            except Exception:
+                logger.exception('Push stream for %s stopped unexpectedly', self.account)
+            self.stop_event.wait(backoff)
+            backoff = min(backoff * 2, 60)
+
+
+class PushHub:
+    """Reference-counted account feeds for this process"""
+
+    def __init__(self, max_accounts):
+        self.max_accounts = max_accounts
+        self.feeds = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, subscription):
+        """Attach a subscription, starting its account's feed if it is the first"""
+        with self._lock:
+            feed = self.feeds.get(subscription.account)
+            if feed is None:
+                if len(self.feeds) >= self.max_accounts:
+                    raise HubFull()
+                feed = AccountFeed(subscription.account)
+                self.feeds[subscription.account] = feed
+                feed.start()
+            with feed._lock:
+                feed.subscribers.add(subscription)
+
+    def unsubscribe(self, subscription):
+        """Detach a subscription, stopping the feed when nobody is left"""
+        with self._lock:
+            feed = self.feeds.get(subscription.account)
+            if feed is None:
+                return
+            with feed._lock:
+                feed.subscribers.discard(subscription)
+                if feed.subscribers:
+                    return
+            feed.stop_event.set()
+            del self.feeds[subscription.account]
+
+    def has_room(self, account):
+        """Whether subscribe() would be accepted for `account` right now"""
+        with self._lock:
+            return account in self.feeds or len(self.feeds) < self.max_accounts
+
+    def stats(self):
+        with self._lock:
+            return {account: len(feed.subscribers) for account, feed in self.feeds.items()}
+
+
+async def astream_events(subscription, initial=None):
+    """
+    SSE body for a subscription: buffered events with keep-alives between them
+    Subscribes when the body is first iterated, then sends the messages returned
+    by `initial` (a coroutine function), so nothing published after they were
+    read is missed. Operation events already sent are not sent again. Ends after
+    STELLAR_PUSH_MAX_AGE seconds (browsers reconnect on their own) and always
+    unsubscribes.
+    """
+    hub = get_push_hub()
+    try:
+        hub.subscribe(subscription)
+    except HubFull:
+        yield format_event('error', {'error': 'Too many live streams, try again later'})
+        return
+    try:
+        yield f'retry: {RECONNECT_MS}\n\n'.encode()
+        last_id = None
+        messages = await initial() if initial is not None else []
+        deadline = time.monotonic() + settings.STELLAR_PUSH_MAX_AGE
+        while True:
+            for message in messages:
+                event_id = _event_id(message)
+                if event_id is not None:
+                    if last_id is not None and event_id <= last_id:
+                        continue
+                    last_id = event_id
+                yield message
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            message = await subscription.get(min(settings.STELLAR_PUSH_KEEPALIVE, remaining))
+            if message is CLOSED:
+                return
+            messages = [message]
+    finally:
+        hub.unsubscribe(subscription)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets DRF negotiate ``Accept: text/event-stream``; errors are sent as JSON"""
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode()
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_push_hub():
+    """Return the process-wide hub, creating it on first use"""
+    global _hub
+
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = PushHub(settings.STELLAR_PUSH_MAX_ACCOUNTS)
+    return _hub
+
+
+def reset_push_hub():
+    """Forget the hub; feed threads do not survive a fork"""
+    global _hub, _hub_lock
+
+    _hub_lock = threading.Lock()
+    _hub = None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_push_hub)
@@ -0,0 +1,64 @@
+"""
+Fast JSON rendering for the read-heavy endpoints
+
+FastJSONRenderer produces the same bytes as DRF's JSONRenderer with its
+default settings (compact, UTF-8, \\u2028/\\u2029 escaped), encoded by orjson
+when it is installed. Anything orjson cannot reproduce exactly (datetimes,
+decimals, integers beyond 64 bits, indented output) goes through DRF's own
+encoder instead. So do floats that Python writes in exponent form (1e+16,
+1e-07; orjson writes 1e16, 1e-7) and NaN or infinity, which orjson writes as
+null where DRF's strict mode raises ValueError.
+"""
+import math
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+
+def _plain_floats(data):
+    """True unless `data` holds a float that orjson would write differently from json.dumps"""
+    stack = [(data,)]
+    while stack:
+        container = stack.pop()
+        for value in container.values() if isinstance(container, dict) else container:
+            kind = type(value)
+            if kind is str or value is None:
+                continue
+            if kind is float:
+                if not _plain_float(value):
+                    return False
+            # Including DRF's ReturnDict/ReturnList and OrderedDict
+            elif isinstance(value, (dict, list, tuple)):
+                stack.append(value)
+    return True
+
+
+def _plain_float(value):
+    # Python's repr switches to exponent form outside [1e-4, 1e16)
+    return math.isfinite(value) and (not value or 1e-4 <= abs(value) < 1e16)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer, byte for byte, without the stdlib encoder on the hot path"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or orjson is None or self.ensure_ascii or not self.compact or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) or not _plain_floats(data):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            # Datetimes go to DRF's encoder, which trims microseconds and writes Z for UTC
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            # orjson.JSONEncodeError: big ints, lone surrogates, non-string keys
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Escaped by DRF so the output can be embedded in JavaScript
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,200 @@
+"""
+Sequence-number allocation and channel accounts
+
+Sequence numbers are loaded from Horizon once per source account and then
+handed out from a counter in the shared cache, so back-to-back payments skip
+``load_account`` and concurrent payments from one account, in any worker,
+never reuse a number. Any failed submission drops the counter and the next
+allocation reloads it. With a per-process cache (the LocMemCache default)
+the workers cannot share a counter, so every payment loads its source
+account instead.
+
+stellar-core accepts one pending transaction per source account, so
+submissions sourced from the same account are serialised with
+``submission_lock``, a lease in the cache that holds across workers when the
+cache is shared.
+
+Channel accounts let many payments from one funding account be in flight at
+once: each transaction is sourced from (and sequenced on) a channel, leased
+to it the same way, while the payment operation itself is sourced from the
+funding account.
+"""
+import logging
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from stellar_sdk import Account, Keypair
+
+from . import cache as shared_cache
+
+logger = logging.getLogger(__name__)
+
+LEASE_POLL_INTERVAL = 0.05
+
+
+class LeaseUnavailable(Exception):
+    """Every lease asked for stayed taken for the whole wait"""
+
+
+class SequenceAllocator:
+    """In-process sequence allocator; one lock per source account (single worker only)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._account_locks = {}
+        self._sequences = {}
+
+    def _account_lock(self, public_key):
+        with self._lock:
+            return self._account_locks.setdefault(public_key, threading.Lock())
+
+    def next_account(self, server, public_key):
+        """
+        Return an Account ready for TransactionBuilder
+        TransactionBuilder.build() increments the sequence, so the returned
+        Account carries the allocated number minus one.
+        """
+        with self._account_lock(public_key):
+            current = self._sequences.get(public_key)
+            if current is None:
+                current = server.load_account(public_key).sequence
+            self._sequences[public_key] = current + 1
+            return Account(public_key, current)
+
+    def resync(self, public_key):
+        """Forget the local sequence; the next allocation reloads it from Horizon"""
+        with self._account_lock(public_key):
+            self._sequences.pop(public_key, None)
+
+
+class CacheSequenceAllocator:
+    """
+    Sequence allocator on Django's cache, shared by every worker using it
+    Needs a backend with atomic incr (Redis, Memcached) to be safe across processes
+    """
+
+    @staticmethod
+    def _key(public_key):
+        return f'stellar:sequence:{settings.STELLAR_NETWORK}:{public_key}'
+
+    def next_account(self, server, public_key):
+        key = self._key(public_key)
+        try:
+            allocated = cache.incr(key)
+        except ValueError:
+            # Not cached yet: seed with the on-chain sequence, then allocate
+            cache.add(key, server.load_account(public_key).sequence, timeout=None)
+            allocated = cache.incr(key)
+        return Account(public_key, allocated - 1)
+
+    def resync(self, public_key):
+        cache.delete(self._key(public_key))
+
+
+class HorizonSequenceAllocator:
+    """Loads the source account for every transaction; for caches the workers do not share"""
+
+    def next_account(self, server, public_key):
+        return server.load_account(public_key)
+
+    def resync(self, public_key):
+        pass
+
+
+def _lease_key(kind, name):
+    return f'stellar:lease:{settings.STELLAR_NETWORK}:{kind}:{name}'
+
+
+@contextmanager
+def lease(kind, names, wait):
+    """
+    Hold the first free one of `names`, waiting up to `wait` seconds; yields its name
+    Raises LeaseUnavailable if none frees up. A lease left by a worker that
+    died expires after settings.STELLAR_SUBMISSION_LEASE_TTL seconds.
+    """
+    token = secrets.token_hex(16)
+    deadline = time.monotonic() + wait
+    while True:
+        name = next(
+            (name for name in names
+             if cache.add(_lease_key(kind, name), token, timeout=settings.STELLAR_SUBMISSION_LEASE_TTL)),
+            None
+        )
+        if name is not None:
+            break
+        if time.monotonic() >= deadline:
+            raise LeaseUnavailable(kind)
+        time.sleep(LEASE_POLL_INTERVAL)
+
+    try:
+        yield name
+    finally:
+        # Not one taken by someone else after ours expired
+        key = _lease_key(kind, name)
+        if cache.get(key) == token:
+            cache.delete(key)
+
+
+class ChannelPool:
+    """Fixed set of channel account keypairs, each leased to one transaction at a time"""
+
+    def __init__(self, secret_keys):
+        keypairs = [Keypair.from_secret(secret) for secret in secret_keys]
+        self._keypairs = {keypair.public_key: keypair for keypair in keypairs}
+        self.size = len(self._keypairs)
+
+    @contextmanager
+    def checkout(self, timeout):
+        """Lease a channel; raises LeaseUnavailable if none frees up within `timeout`"""
+        # In a random order, so workers do not all queue for the first channel
+        names = random.sample(list(self._keypairs), self.size)
+        with lease('channel', names, timeout) as public_key:
+            yield self._keypairs[public_key]
+
+
+_allocator = None
+_channels = None
+_init_lock = threading.Lock()
+
+
+def submission_lock(public_key):
+    """Lease serialising submissions sourced from one account; raises LeaseUnavailable"""
+    return lease('source', [public_key], settings.STELLAR_SUBMISSION_LOCK_WAIT)
+
+
+def get_sequence_allocator():
+    """Process-wide allocator selected by settings.STELLAR_SEQUENCE_BACKEND"""
+    global _allocator
+    if _allocator is None:
+        with _init_lock:
+            if _allocator is None:
+                backend = settings.STELLAR_SEQUENCE_BACKEND
+                if backend == 'cache' and shared_cache.is_shared():
+                    _allocator = CacheSequenceAllocator()
+                elif backend == 'local':
+                    _allocator = SequenceAllocator()
+                else:
+                    # 'horizon', or 'cache' on a cache every worker keeps for itself
+                    if backend == 'cache':
+                        logger.warning(
+                            "STELLAR_SEQUENCE_BACKEND is 'cache' but the default cache is not shared "
+                            "between workers; every payment will load its source account from Horizon. "
+                            "Point DJANGO_CACHE_BACKEND at a shared cache or set STELLAR_SEQUENCE_BACKEND."
+                        )
+                    _allocator = HorizonSequenceAllocator()
+    return _allocator
+
+
+def get_channel_pool():
+    """Process-wide channel pool, or None when no channel accounts are configured"""
+    global _channels
+    if _channels is None and settings.STELLAR_CHANNEL_SECRETS:
+        with _init_lock:
+            if _channels is None:
+                _channels = ChannelPool(settings.STELLAR_CHANNEL_SECRETS)
+    return _channels
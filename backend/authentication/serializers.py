@@ -1,5 +1,68 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import StellarWallet
+from rest_framework.fields import empty
+from .models import PaymentJob, StellarWallet
+from .valuation import parse_asset
+
+
+def _fast_converter(field):
+    """to_representation for one field, short-circuiting the common types"""
+    if type(field) is serializers.CharField:
+        return str
+    if type(field) is serializers.DateTimeField:
+        # Horizon's ISO 8601 strings pass through DateTimeField untouched
+        return lambda value: value if value.__class__ is str and value else field.to_representation(value)
+    return field.to_representation
+
+
+class FastRepresentationMixin:
+    """
+    Read-only fast path for serializers over plain dicts
+    represent(records) returns the same data as serializer(records, many=True).data,
+    from a field plan compiled once per class instead of per-record field machinery
+    """
+
+    @classmethod
+    def _representation_plan(cls):
+        plan = cls.__dict__.get('_plan')
+        if plan is None:
+            plan = []
+            for name, field in cls().fields.items():
+                if field.write_only:
+                    continue
+                if field.source == '*' or '.' in field.source:
+                    raise ValueError(f'{cls.__name__}.{name}: only flat sources have a fast path')
+                # What Field.get_attribute does when the key is missing
+                if field.default is not empty:
+                    missing = field.get_default
+                elif field.allow_null:
+                    missing = type(None)
+                elif not field.required:
+                    missing = None
+                else:
+                    missing = KeyError
+                plan.append((name, field.source, _fast_converter(field), missing))
+            plan = cls._plan = tuple(plan)
+        return plan
+
+    @classmethod
+    def represent(cls, records):
+        plan = cls._representation_plan()
+        data = []
+        for record in records:
+            item = {}
+            for name, source, convert, missing in plan:
+                try:
+                    value = record[source]
+                except KeyError:
+                    if missing is None:
+                        continue
+                    if missing is KeyError:
+                        raise
+                    value = missing()
+                item[name] = None if value is None else convert(value)
+            data.append(item)
+        return data
 
 
 class WalletConnectSerializer(serializers.Serializer):
@@ -14,6 +77,11 @@ class SignatureVerifySerializer(serializers.Serializer):
     challenge = serializers.CharField()
 
 
+class TokenRefreshSerializer(serializers.Serializer):
+    """Serializer for refreshing bearer tokens"""
+    refresh_token = serializers.CharField()
+
+
 class WalletSerializer(serializers.ModelSerializer):
     """Serializer for Stellar wallet"""
     username = serializers.CharField(source='user.username', read_only=True)
@@ -24,7 +92,7 @@ class WalletSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'last_login']
 
 
-class BalanceSerializer(serializers.Serializer):
+class BalanceSerializer(FastRepresentationMixin, serializers.Serializer):
     """Serializer for account balance"""
     asset_code = serializers.CharField()
     asset_type = serializers.CharField()
@@ -32,14 +100,47 @@ class BalanceSerializer(serializers.Serializer):
     asset_issuer = serializers.CharField(required=False, allow_null=True)
 
 
-class PaymentSerializer(serializers.Serializer):
-    """Serializer for payment transactions"""
+class BulkBalanceRequestSerializer(serializers.Serializer):
+    """Serializer for bulk balance requests"""
+    public_keys = serializers.ListField(
+        child=serializers.CharField(max_length=56),
+        allow_empty=False,
+        max_length=settings.STELLAR_BULK_BALANCE_MAX_KEYS,
+        help_text="Stellar public keys to fetch balances for"
+    )
+
+
+class PortfolioQuerySerializer(serializers.Serializer):
+    """Serializer for the portfolio reference asset"""
+    asset = serializers.CharField(
+        default=settings.STELLAR_VALUATION_ASSET,
+        help_text="Reference asset: XLM or CODE:ISSUER"
+    )
+    
+    def validate_asset(self, value):
+        """Parse into a stellar_sdk Asset"""
+        try:
+            return parse_asset(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
+
+
+class PortfolioRequestSerializer(PortfolioQuerySerializer):
+    """Serializer for valuing many accounts at once"""
+    public_keys = serializers.ListField(
+        child=serializers.CharField(max_length=56),
+        allow_empty=False,
+        max_length=settings.STELLAR_BULK_BALANCE_MAX_KEYS,
+        help_text="Stellar public keys to value"
+    )
+
+
+class PaymentItemSerializer(serializers.Serializer):
+    """Serializer for a single payment's destination, amount and asset"""
     destination = serializers.CharField(max_length=56, help_text="Destination Stellar address")
     amount = serializers.DecimalField(max_digits=20, decimal_places=7, help_text="Amount to send")
     asset_code = serializers.CharField(default='XLM', help_text="Asset code (default: XLM)")
     asset_issuer = serializers.CharField(required=False, allow_null=True, help_text="Asset issuer (for custom assets)")
-    memo = serializers.CharField(required=False, allow_blank=True, max_length=28, help_text="Optional memo")
-    secret_key = serializers.CharField(write_only=True, help_text="Sender's secret key for signing")
     
     def validate_destination(self, value):
         """Validate destination address format"""
@@ -56,7 +157,67 @@ class PaymentSerializer(serializers.Serializer):
         return value
 
 
-class TransactionSerializer(serializers.Serializer):
+class PaymentSerializer(PaymentItemSerializer):
+    """Serializer for payment transactions"""
+    memo = serializers.CharField(required=False, allow_blank=True, max_length=28, help_text="Optional memo")
+    secret_key = serializers.CharField(write_only=True, help_text="Sender's secret key for signing")
+    base_fee = serializers.IntegerField(
+        required=False, min_value=100,
+        help_text="Base fee in stroops per operation (default: from the fee oracle)"
+    )
+    max_fee = serializers.IntegerField(
+        required=False, min_value=100, help_text="Cap on the oracle's base fee, in stroops per operation"
+    )
+
+
+class PaymentJobSerializer(serializers.ModelSerializer):
+    """Serializer for async payment job status"""
+    
+    class Meta:
+        model = PaymentJob
+        fields = [
+            'job_id', 'status', 'source_account', 'destination', 'amount', 'asset_code',
+            'memo', 'base_fee', 'max_fee', 'attempts', 'transaction_hash', 'ledger', 'error', 'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
+class BulkPaymentRowSerializer(PaymentItemSerializer):
+    """Serializer for one row of a bulk payout"""
+    secret_key = serializers.CharField(
+        write_only=True, required=False,
+        help_text="Sender's secret key for this row (default: the request's secret_key)"
+    )
+
+
+class BulkPaymentSerializer(serializers.Serializer):
+    """Serializer for bulk payouts, as a JSON list of rows or a CSV upload"""
+    secret_key = serializers.CharField(write_only=True, required=False, help_text="Default sender's secret key")
+    memo = serializers.CharField(required=False, allow_blank=True, max_length=28, help_text="Memo for every transaction")
+    base_fee = serializers.IntegerField(
+        required=False, min_value=100,
+        help_text="Base fee in stroops per operation (default: from the fee oracle)"
+    )
+    max_fee = serializers.IntegerField(
+        required=False, min_value=100, help_text="Cap on the oracle's base fee, in stroops per operation"
+    )
+    payments = serializers.ListField(
+        child=serializers.DictField(), required=False, allow_empty=False,
+        help_text="Rows with destination, amount, asset_code, asset_issuer and optional secret_key"
+    )
+    file = serializers.FileField(
+        required=False,
+        help_text="CSV with a header row: destination,amount[,asset_code,asset_issuer]"
+    )
+    
+    def validate(self, attrs):
+        """Exactly one of payments or file"""
+        if bool(attrs.get('payments')) == bool(attrs.get('file')):
+            raise serializers.ValidationError("Provide either 'payments' or a CSV 'file'")
+        return attrs
+
+
+class TransactionSerializer(FastRepresentationMixin, serializers.Serializer):
     """Serializer for transaction history"""
     id = serializers.CharField()
     type = serializers.CharField()
@@ -68,3 +229,17 @@ class TransactionSerializer(serializers.Serializer):
     amount = serializers.CharField(required=False, allow_null=True)
     asset_code = serializers.CharField(required=False, allow_null=True)
     asset_type = serializers.CharField(required=False, allow_null=True)
+
+
+class HistoryQuerySerializer(serializers.Serializer):
+    """Serializer for transaction history query parameters"""
+    limit = serializers.IntegerField(min_value=1, default=10)
+    cursor = serializers.RegexField(r'^\d+$', required=False)
+    order = serializers.ChoiceField(choices=['asc', 'desc'], default='desc')
+
+
+class HistoryExportQuerySerializer(serializers.Serializer):
+    """Serializer for history export query parameters"""
+    format = serializers.ChoiceField(choices=['ndjson', 'csv'], default='ndjson')
+    cursor = serializers.RegexField(r'^\d+$', required=False)
+    order = serializers.ChoiceField(choices=['asc', 'desc'], default='asc')
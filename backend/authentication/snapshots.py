@@ -0,0 +1,208 @@
+"""
+Account snapshots
+
+A materialised copy of every registered wallet's account: shaped balances,
+sequence, last-modified ledger and the operations of its latest transactions.
+The refresh_snapshots command keeps the table fresh. It refreshes due
+accounts in batches on a bounded thread pool, most recently active first,
+and backs off on accounts that have not changed since their last refresh.
+Refresh threads only call Horizon; each batch is written in one transaction
+from the scheduler thread.
+
+With STELLAR_SNAPSHOT_READS on, the balance and history views answer from
+one snapshot row and only fall back to Horizon for accounts without a usable
+snapshot (not registered, not funded, or older than STELLAR_SNAPSHOT_MAX_AGE).
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from stellar_sdk.exceptions import NotFoundError
+
+from .balances import shape_balances
+from .history import fetch_history
+from .horizon import get_server
+from .models import AccountSnapshot, StellarWallet
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FIELDS = ['found', 'balances', 'sequence', 'last_modified_ledger', 'operations']
+
+
+def load_snapshot(server, account):
+    """Current snapshot fields of an account, read from Horizon"""
+    try:
+        record = server.accounts().account_id(account).call()
+    except NotFoundError:
+        return {'found': False, 'balances': [], 'sequence': None, 'last_modified_ledger': None, 'operations': []}
+    return {
+        'found': True,
+        'balances': shape_balances(record),
+        'sequence': record['sequence'],
+        'last_modified_ledger': record.get('last_modified_ledger'),
+        'operations': fetch_history(server, account, settings.STELLAR_SNAPSHOT_HISTORY_LIMIT),
+    }
+
+
+def refresh_interval(idle_refreshes, min_interval, max_interval):
+    """Seconds until the next refresh: doubles with every unchanged refresh, up to max_interval"""
+    return min(min_interval * 2 ** min(idle_refreshes, 32), max_interval)
+
+
+def mark_active(public_key):
+    """Refresh an account's snapshot next, e.g. when its wallet signs in"""
+    now = timezone.now()
+    AccountSnapshot.objects.filter(account=public_key).update(
+        active_at=now, next_refresh_at=now, idle_refreshes=0
+    )
+
+
+class SnapshotScheduler:
+    """Keeps an AccountSnapshot fresh for every StellarWallet"""
+
+    def __init__(self, batch_size=None, concurrency=None, min_interval=None, max_interval=None):
+        self.batch_size = batch_size or settings.STELLAR_SNAPSHOT_BATCH_SIZE
+        self.concurrency = concurrency or settings.STELLAR_SNAPSHOT_CONCURRENCY
+        self.min_interval = min_interval or settings.STELLAR_SNAPSHOT_MIN_INTERVAL
+        self.max_interval = max_interval or settings.STELLAR_SNAPSHOT_MAX_INTERVAL
+        self.stop_event = threading.Event()
+        self.refreshed = 0
+        self.changed = 0
+
+    def enroll(self):
+        """Create a due snapshot for every wallet that does not have one yet"""
+        known = set(AccountSnapshot.objects.values_list('account', flat=True))
+        now = timezone.now()
+        AccountSnapshot.objects.bulk_create(
+            [
+                AccountSnapshot(account=account, next_refresh_at=now)
+                for account in StellarWallet.objects.values_list('public_key', flat=True)
+                if account not in known
+            ],
+            ignore_conflicts=True,
+        )
+
+    def due(self, at=None):
+        """Up to batch_size snapshots due by `at` (default now): never refreshed, then most recently active"""
+        return list(
+            AccountSnapshot.objects.filter(next_refresh_at__lte=at or timezone.now())
+            .order_by(F('active_at').desc(nulls_first=True), 'next_refresh_at')[:self.batch_size]
+        )
+
+    def refresh(self, snapshots):
+        """Refresh `snapshots` from Horizon and write them back; returns how many changed"""
+        server = get_server()
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(snapshots))) as executor:
+            futures = [executor.submit(load_snapshot, server, snapshot.account) for snapshot in snapshots]
+
+        now = timezone.now()
+        changed = 0
+        for snapshot, future in zip(snapshots, futures):
+            try:
+                fields = future.result()
+            except Exception as e:
+                logger.warning('Snapshot refresh for %s failed', snapshot.account, exc_info=True)
+                snapshot.error = str(e)
+                snapshot.idle_refreshes += 1
+            else:
+                if snapshot.refreshed_at is None or any(
+                    getattr(snapshot, name) != value for name, value in fields.items()
+                ):
+                    changed += 1
+                    snapshot.active_at = now
+                    snapshot.idle_refreshes = 0
+                else:
+                    snapshot.idle_refreshes += 1
+                for name, value in fields.items():
+                    setattr(snapshot, name, value)
+                snapshot.refreshed_at = now
+                snapshot.error = None
+            interval = refresh_interval(snapshot.idle_refreshes, self.min_interval, self.max_interval)
+            snapshot.next_refresh_at = now + timedelta(seconds=interval)
+
+        with transaction.atomic():
+            AccountSnapshot.objects.bulk_update(
+                snapshots,
+                SNAPSHOT_FIELDS + ['refreshed_at', 'active_at', 'next_refresh_at', 'idle_refreshes', 'error'],
+            )
+        self.refreshed += len(snapshots)
+        self.changed += changed
+        return changed
+
+    def run(self, duration=None, rescan_interval=30, idle_wait=1):
+        """Refresh due snapshots until stop() is called or `duration` seconds have passed"""
+        deadline = time.monotonic() + duration if duration else None
+        next_rescan = 0
+        while not self.stop_event.is_set():
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                break
+            close_old_connections()
+            if now >= next_rescan:
+                self.enroll()
+                next_rescan = now + rescan_interval
+            snapshots = self.due()
+            if snapshots:
+                self.refresh(snapshots)
+            else:
+                self.stop_event.wait(idle_wait)
+
+    def run_once(self):
+        """Enroll new wallets and refresh everything due, then return"""
+        self.enroll()
+        # Refreshed snapshots become due again while the pass runs; each is taken once
+        started = timezone.now()
+        while not self.stop_event.is_set():
+            snapshots = self.due(started)
+            if not snapshots:
+                return
+            self.refresh(snapshots)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def read_snapshots(public_keys):
+    """
+    {public_key: snapshot} for the keys with a usable snapshot, in one query
+    Empty unless STELLAR_SNAPSHOT_READS is on
+    """
+    if not settings.STELLAR_SNAPSHOT_READS or not public_keys:
+        return {}
+    snapshots = AccountSnapshot.objects.filter(account__in=public_keys, found=True, refreshed_at__isnull=False)
+    if settings.STELLAR_SNAPSHOT_MAX_AGE > 0:
+        oldest = timezone.now() - timedelta(seconds=settings.STELLAR_SNAPSHOT_MAX_AGE)
+        snapshots = snapshots.filter(refreshed_at__gte=oldest)
+    return {snapshot.account: snapshot for snapshot in snapshots}
+
+
+def read_snapshot(public_key):
+    """The account's usable snapshot, or None"""
+    return read_snapshots([public_key]).get(public_key)
+
+
+def snapshot_age(snapshot):
+    """Seconds since the snapshot was refreshed"""
+    return (timezone.now() - snapshot.refreshed_at).total_seconds()
+
+
+def snapshot_history(public_key, limit):
+    """
+    The newest `limit` transactions' operations from the account's snapshot
+    None when there is no usable snapshot or it holds fewer transactions than asked for
+    """
+    snapshot = read_snapshot(public_key)
+    if snapshot is None:
+        return None
+    hashes = list(dict.fromkeys(op['transaction_hash'] for op in snapshot.operations))
+    # A snapshot with fewer transactions than it keeps holds the account's whole history
+    if limit > len(hashes) and len(hashes) >= settings.STELLAR_SNAPSHOT_HISTORY_LIMIT:
+        return None
+    kept = set(hashes[:limit])
+    return [op for op in snapshot.operations if op['transaction_hash'] in kept]
@@ -0,0 +1,94 @@
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from authentication import async_views
+
+ACCOUNT = 'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+ACCOUNT_RECORD = {
+    'last_modified_ledger': 7,
+    'balances': [{'asset_type': 'native', 'balance': '100.0000000'}],
+}
+
+
+@override_settings(STELLAR_BALANCE_CACHE_TTL=60, STELLAR_SNAPSHOT_READS=False)
+class AsyncBalanceTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.server = mock.MagicMock()
+        self.server.accounts.return_value.account_id.return_value.call.return_value = ACCOUNT_RECORD
+        patcher = mock.patch.object(async_views, 'get_server', return_value=self.server)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _get(self):
+        request = RequestFactory().get(f'/api/auth/balance/{ACCOUNT}/')
+        request.session = {}
+        return async_to_sync(async_views.wallet_balance)(request, public_key=ACCOUNT)
+
+    def test_reads_go_through_the_balance_cache(self):
+        first = json.loads(self._get().content)
+        second = json.loads(self._get().content)
+
+        self.assertFalse(first['cached'])
+        self.assertTrue(second['cached'])
+        self.assertIn('cache_age', second)
+        self.assertEqual(second['balances'], first['balances'])
+        self.server.accounts.return_value.account_id.assert_called_once_with(ACCOUNT)
+
+
+class AsyncPaymentTests(SimpleTestCase):
+    SECRET = 'SC24CVZWWAFXURH5KI6QKU66U3G3QO3IKIUTF6UQKZEB2LCOE5CIG7TH'
+
+    def setUp(self):
+        cache.clear()
+
+    def _post(self, query='', **fields):
+        body = dict({'destination': ACCOUNT, 'amount': '1', 'secret_key': self.SECRET}, **fields)
+        request = RequestFactory().post(
+            f'/api/auth/payment/{query}', data=json.dumps(body), content_type='application/json'
+        )
+        return async_to_sync(async_views.send_payment)(request)
+
+    def test_submits_through_the_shared_payment_path(self):
+        with mock.patch.object(async_views, 'submit_payments', return_value={'hash': 'a' * 64, 'ledger': 9}) as submit, \
+                mock.patch.object(async_views, 'invalidate_balances') as invalidate:
+            response = self._post(memo='hi')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['transaction_hash'], 'a' * 64)
+        (source_keypair, payments), options = submit.call_args
+        self.assertEqual(source_keypair.secret, self.SECRET)
+        self.assertEqual(payments[0]['destination'], ACCOUNT)
+        self.assertEqual(options['memo_text'], 'hi')
+        invalidate.assert_called_once_with(source_keypair.public_key, ACCOUNT)
+
+    def test_uncertain_submission_is_reported(self):
+        error = async_views.SubmissionUncertain(mock.Mock(hash_hex=mock.Mock(return_value='b' * 64)), TimeoutError())
+        with mock.patch.object(async_views, 'submit_payments', side_effect=error):
+            response = self._post()
+
+        self.assertEqual(response.status_code, 504)
+        body = json.loads(response.content)
+        self.assertEqual((body['status'], body['transaction_hash']), ('uncertain', 'b' * 64))
+
+    def test_async_flag_queues_the_payment(self):
+        job = mock.Mock(job_id='6f1c1a4e-0000-4000-8000-000000000000', status='queued')
+        with mock.patch.object(async_views, '_queue_payment', return_value=job) as queue_payment, \
+                mock.patch.object(async_views, 'submit_payments') as submit:
+            response = self._post('?async=1')
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(json.loads(response.content)['job_id'], job.job_id)
+        self.assertEqual(queue_payment.call_args.kwargs['destination'], ACCOUNT)
+        submit.assert_not_called()
+
+    def test_non_native_asset_needs_an_issuer(self):
+        with mock.patch.object(async_views, 'submit_payments') as submit:
+            response = self._post(asset_code='USDC')
+
+        self.assertEqual(response.status_code, 400)
+        submit.assert_not_called()
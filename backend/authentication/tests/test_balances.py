@@ -0,0 +1,97 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from authentication.balances import get_many_balances
+from authentication.views import BulkBalanceView
+
+ACCOUNTS = [
+    'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7',
+    'GBZXN7PIRZGNMHGA7MUUUF4GWPY5AYPV6LY4UV2GL6VJGIQRXFDNMADI',
+    'GCEZWKCA5VLDNRLN3RPRJMRZOX3Z6G5CHCGSNFHEYVXM3XOJMDS674JZ',
+]
+BALANCES = [{'asset_code': 'XLM', 'asset_type': 'native', 'balance': '100.0000000'}]
+
+
+class GetManyBalancesTests(SimpleTestCase):
+    def test_fans_out_with_bounded_concurrency(self):
+        running, peak, lock = [0], [0], threading.Lock()
+
+        def fetch(server, public_key):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return BALANCES, False, 0.0
+
+        keys = [f'key-{i}' for i in range(6)]
+        with mock.patch('authentication.balances.get_balances', side_effect=fetch):
+            results = get_many_balances(mock.Mock(), keys, concurrency=2, timeout=5)
+
+        self.assertEqual(set(results), set(keys))
+        self.assertEqual(peak[0], 2)
+
+    def test_errors_are_returned_per_key(self):
+        def fetch(server, public_key):
+            if public_key == 'bad':
+                raise ConnectionError('Horizon gone')
+            return BALANCES, True, 1.0
+
+        with mock.patch('authentication.balances.get_balances', side_effect=fetch):
+            results = get_many_balances(mock.Mock(), ['good', 'bad'], concurrency=2, timeout=5)
+
+        self.assertEqual(results['good'], (BALANCES, True, 1.0))
+        self.assertIsInstance(results['bad'], ConnectionError)
+
+    def test_slow_keys_time_out_without_holding_the_response(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def fetch(server, public_key):
+            if public_key == 'slow':
+                release.wait(5)
+            return BALANCES, False, 0.0
+
+        started = time.monotonic()
+        with mock.patch('authentication.balances.get_balances', side_effect=fetch):
+            results = get_many_balances(mock.Mock(), ['fast', 'slow'], concurrency=2, timeout=0.2)
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(results['fast'][0], BALANCES)
+        self.assertIsInstance(results['slow'], TimeoutError)
+
+
+@override_settings(STELLAR_THROTTLE_ENABLED=False, STELLAR_SNAPSHOT_READS=False)
+@mock.patch('authentication.views.get_server')
+class BulkBalanceViewTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _post(self, public_keys):
+        request = APIRequestFactory().post('/balances/', {'public_keys': public_keys}, format='json')
+        request.session = {}
+        return BulkBalanceView.as_view()(request)
+
+    def test_answers_every_key_in_request_order(self, get_server):
+        def fetch(server, public_key):
+            if public_key == ACCOUNTS[1]:
+                raise ConnectionError('Horizon gone')
+            return BALANCES, False, 0.0
+
+        with mock.patch('authentication.balances.get_balances', side_effect=fetch):
+            response = self._post([ACCOUNTS[2], 'not-a-key', ACCOUNTS[1], ACCOUNTS[2], ACCOUNTS[0]])
+
+        accounts = response.data['accounts']
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([account['public_key'] for account in accounts],
+                         [ACCOUNTS[2], 'not-a-key', ACCOUNTS[1], ACCOUNTS[0]])
+        self.assertEqual(accounts[1]['error'], 'Invalid Stellar public key format')
+        self.assertIn('Horizon gone', accounts[2]['error'])
+        self.assertEqual(accounts[3]['balances'][0]['balance'], '100.0000000')
+        self.assertEqual(response.data['failed'], 2)
@@ -0,0 +1,135 @@
+import base64
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from stellar_sdk import Keypair
+
+from authentication import views
+from authentication.challenges import ChallengeError, issue_challenge, read_challenge
+from authentication.models import AuthenticationSession
+from authentication.views import get_or_create_wallet
+
+WALLET = Keypair.random()
+OTHER = Keypair.random()
+
+
+def _sign(keypair, challenge):
+    return base64.b64encode(keypair.sign(challenge.encode())).decode()
+
+
+def _verify(challenge, signature):
+    request = APIRequestFactory().post('/api/auth/verify/', {
+        'public_key': WALLET.public_key, 'challenge': challenge, 'signature': signature,
+    }, format='json')
+    request.session = {}
+    return views.VerifySignatureView.as_view()(request)
+
+
+class ReadChallengeTests(SimpleTestCase):
+    def test_returns_the_nonce_it_was_issued_with(self):
+        challenge, nonce, _ = issue_challenge(WALLET.public_key)
+
+        self.assertEqual(read_challenge(challenge, WALLET.public_key), nonce)
+
+    def test_rejects_a_challenge_for_another_key(self):
+        challenge, _, _ = issue_challenge(WALLET.public_key)
+
+        with self.assertRaisesMessage(ChallengeError, 'another public key'):
+            read_challenge(challenge, OTHER.public_key)
+
+    def test_rejects_a_tampered_challenge(self):
+        challenge, _, _ = issue_challenge(WALLET.public_key)
+
+        with self.assertRaisesMessage(ChallengeError, 'Invalid challenge'):
+            read_challenge(challenge[:-1] + ('A' if challenge[-1] != 'A' else 'B'), WALLET.public_key)
+
+    @override_settings(STELLAR_CHALLENGE_TTL=60)
+    def test_rejects_an_expired_challenge(self):
+        challenge, _, _ = issue_challenge(WALLET.public_key)
+
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 61):
+            with self.assertRaisesMessage(ChallengeError, 'Challenge expired'):
+                read_challenge(challenge, WALLET.public_key)
+
+
+@override_settings(STELLAR_THROTTLE_ENABLED=False, STELLAR_STATELESS_CHALLENGES=True, STELLAR_CHALLENGE_TTL=60)
+class StatelessVerifyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _verify(self, challenge, keypair=WALLET):
+        return _verify(challenge, _sign(keypair, challenge))
+
+    def test_a_challenge_signs_in_once(self):
+        challenge, nonce, _ = issue_challenge(WALLET.public_key)
+
+        first = self._verify(challenge)
+        replay = self._verify(challenge)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('access_token', first.data)
+        self.assertEqual(replay.status_code, 400)
+        self.assertEqual(replay.data['error'], 'Challenge already used')
+        self.assertEqual(AuthenticationSession.objects.filter(session_key=nonce).count(), 1)
+
+    def test_an_expired_challenge_is_rejected_without_writing_anything(self):
+        challenge, _, _ = issue_challenge(WALLET.public_key)
+
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 61):
+            response = self._verify(challenge)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['error'], 'Challenge expired')
+        self.assertFalse(AuthenticationSession.objects.exists())
+
+    def test_a_forged_signature_is_rejected_and_leaves_the_challenge_usable(self):
+        challenge, _, _ = issue_challenge(WALLET.public_key)
+
+        forged = self._verify(challenge, keypair=OTHER)
+        genuine = self._verify(challenge)
+
+        self.assertEqual(forged.status_code, 401)
+        self.assertNotIn('access_token', forged.data)
+        self.assertEqual(genuine.status_code, 200)
+
+
+@override_settings(STELLAR_THROTTLE_ENABLED=False)
+class StoredChallengeVerifyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.challenge = 'Sign this message to authenticate with Stellar App: nonce'
+        self.session = AuthenticationSession.objects.create(
+            wallet=get_or_create_wallet(WALLET.public_key),
+            session_key='session',
+            challenge=self.challenge,
+            expires_at=timezone.now() + timedelta(minutes=15),
+        )
+
+    def test_a_forged_signature_is_rejected(self):
+        for signature in [_sign(OTHER, self.challenge), 'not base64!', base64.b64encode(b'short').decode()]:
+            response = _verify(self.challenge, signature)
+
+            self.assertEqual(response.status_code, 401)
+            self.assertNotIn('access_token', response.data)
+        self.session.refresh_from_db()
+        self.assertFalse(self.session.is_verified)
+
+    def test_the_wallet_signature_signs_in(self):
+        response = _verify(self.challenge, _sign(WALLET, self.challenge))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access_token', response.data)
+        self.session.refresh_from_db()
+        self.assertTrue(self.session.is_verified)
+
+    def test_sessions_saved_before_the_digest_column_still_verify(self):
+        AuthenticationSession.objects.filter(pk=self.session.pk).update(challenge_digest='')
+
+        response = _verify(self.challenge, _sign(WALLET, self.challenge))
+
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from authentication.conditional import balances_etag, history_etag
+from authentication.views import WalletBalanceView
+
+ACCOUNT = 'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+
+
+def _balances(ledger):
+    return [
+        {'asset_code': 'XLM', 'asset_type': 'native', 'balance': '100.0000000', 'last_modified_ledger': ledger},
+        {'asset_code': 'USDC', 'asset_type': 'credit_alphanum4', 'balance': '5.0000000',
+         'asset_issuer': ACCOUNT, 'last_modified_ledger': 90},
+    ]
+
+
+class ETagTests(SimpleTestCase):
+    def test_balance_etag_follows_the_newest_ledger(self):
+        self.assertEqual(balances_etag(ACCOUNT, _balances(100)), balances_etag(ACCOUNT, _balances(100)))
+        self.assertNotEqual(balances_etag(ACCOUNT, _balances(100)), balances_etag(ACCOUNT, _balances(101)))
+
+    def test_etags_are_weak(self):
+        self.assertTrue(balances_etag(ACCOUNT, _balances(100)).startswith('W/"'))
+        self.assertTrue(history_etag(ACCOUNT, 10, 'horizon', None, 'desc', []).startswith('W/"'))
+
+    def test_balance_etag_follows_the_entry_count(self):
+        self.assertNotEqual(balances_etag(ACCOUNT, _balances(100)), balances_etag(ACCOUNT, _balances(100)[:1]))
+
+    def test_balance_etag_needs_ledger_numbers(self):
+        balances = _balances(100)
+        del balances[1]['last_modified_ledger']
+
+        self.assertIsNone(balances_etag(ACCOUNT, balances))
+
+    def test_history_etag_follows_the_page_bounds(self):
+        page = [{'id': '8193'}, {'id': '4097'}]
+        etag = history_etag(ACCOUNT, 10, 'horizon', None, 'desc', page)
+
+        self.assertEqual(etag, history_etag(ACCOUNT, 10, 'horizon', None, 'desc', list(page)))
+        self.assertNotEqual(etag, history_etag(ACCOUNT, 10, 'horizon', None, 'desc', [{'id': '12289'}] + page))
+        self.assertNotEqual(etag, history_etag(ACCOUNT, 10, 'horizon', '4096', 'desc', page))
+
+
+@override_settings(STELLAR_THROTTLE_ENABLED=False)
+@mock.patch('authentication.views.get_server')
+@mock.patch('authentication.views.read_snapshot', return_value=None)
+class ConditionalBalanceTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    def _get(self, **headers):
+        request = self.factory.get(f'/balance/{ACCOUNT}/', **headers)
+        request.session = {}
+        return WalletBalanceView.as_view()(request, public_key=ACCOUNT)
+
+    def test_matching_if_none_match_gets_304(self, read_snapshot, get_server):
+        with mock.patch('authentication.views.get_balances', return_value=(_balances(100), False, 0.0)):
+            first = self._get()
+            repeat = self._get(HTTP_IF_NONE_MATCH=first['ETag'])
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat['ETag'], first['ETag'])
+        self.assertIn('no-cache', repeat['Cache-Control'])
+
+    def test_changed_balances_get_a_full_response(self, read_snapshot, get_server):
+        with mock.patch('authentication.views.get_balances', return_value=(_balances(100), False, 0.0)):
+            etag = self._get()['ETag']
+        with mock.patch('authentication.views.get_balances', return_value=(_balances(101), False, 0.0)):
+            response = self._get(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
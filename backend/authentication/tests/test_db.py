@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from authentication.db import EstimatedCountPaginator, ReadReplicaRouter, configure_sqlite, read_only
+from authentication.models import StellarWallet
+
+ACCOUNT = 'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+
+
+def _connection(vendor, row=None):
+    connection = mock.MagicMock(vendor=vendor)
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.fetchone.return_value = row
+    return connection, cursor
+
+
+class ConfigureSQLiteTests(SimpleTestCase):
+    @override_settings(SQLITE_JOURNAL_MODE='WAL')
+    def test_sqlite_connections_use_wal(self):
+        connection, cursor = _connection('sqlite')
+
+        configure_sqlite(sender=None, connection=connection)
+
+        self.assertEqual(
+            [call.args[0] for call in cursor.execute.call_args_list],
+            ['PRAGMA journal_mode=WAL', 'PRAGMA synchronous=NORMAL']
+        )
+
+    def test_other_databases_are_left_alone(self):
+        connection, cursor = _connection('postgresql')
+
+        configure_sqlite(sender=None, connection=connection)
+
+        connection.cursor.assert_not_called()
+
+
+class ReadReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.router = ReadReplicaRouter()
+
+    def test_reads_inside_read_only_go_to_the_replica(self):
+        with mock.patch.dict(settings.DATABASES, {'replica': settings.DATABASES['default']}):
+            self.assertIsNone(self.router.db_for_read(StellarWallet))
+            with read_only():
+                self.assertEqual(self.router.db_for_read(StellarWallet), 'replica')
+                self.assertEqual(self.router.db_for_write(StellarWallet), 'default')
+            self.assertIsNone(self.router.db_for_read(StellarWallet))
+
+    def test_without_a_replica_reads_stay_on_default(self):
+        with read_only():
+            self.assertIsNone(self.router.db_for_read(StellarWallet))
+
+    def test_only_default_is_migrated(self):
+        self.assertTrue(self.router.allow_migrate('default', 'authentication'))
+        self.assertFalse(self.router.allow_migrate('replica', 'authentication'))
+
+
+class EstimatedCountPaginatorTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username=ACCOUNT[:10])
+        StellarWallet.objects.create(user=user, public_key=ACCOUNT)
+
+    def _count(self, queryset, connection):
+        with mock.patch('authentication.db.connections', {queryset.db: connection}):
+            return EstimatedCountPaginator(queryset.order_by('pk'), 10).count
+
+    def test_large_unfiltered_postgres_tables_use_the_estimate(self):
+        connection, cursor = _connection('postgresql', row=(2500000,))
+
+        self.assertEqual(self._count(StellarWallet.objects.all(), connection), 2500000)
+        self.assertEqual(cursor.execute.call_args.args[1], [StellarWallet._meta.db_table])
+
+    def test_small_tables_are_counted_exactly(self):
+        connection, _ = _connection('postgresql', row=(40,))
+
+        self.assertEqual(self._count(StellarWallet.objects.all(), connection), 1)
+
+    def test_filtered_lists_are_counted_exactly(self):
+        connection, cursor = _connection('postgresql', row=(2500000,))
+
+        self.assertEqual(self._count(StellarWallet.objects.filter(public_key=ACCOUNT), connection), 1)
+        cursor.execute.assert_not_called()
+
+    def test_other_databases_are_counted_exactly(self):
+        self.assertEqual(EstimatedCountPaginator(StellarWallet.objects.order_by('pk'), 10).count, 1)
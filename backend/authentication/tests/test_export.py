@@ -0,0 +1,107 @@
+import csv
+import io
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from authentication.export import aexport_response, export_response
+from authentication.history import HORIZON_MAX_PAGE_SIZE, iter_history
+
+ACCOUNT = 'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+
+
+def _records(count, error=None):
+    for op_id in range(1, count + 1):
+        yield {'id': str(op_id), 'type': 'payment', 'amount': '1.0000000'}
+    if error:
+        raise error
+
+
+async def _arecords(count, error=None):
+    for record in _records(count, error):
+        yield record
+
+
+def _body(response):
+    return b''.join(response.streaming_content).decode()
+
+
+async def _abody(response):
+    return b''.join([chunk async for chunk in response.streaming_content]).decode()
+
+
+class ExportErrorMarkerTests(SimpleTestCase):
+    def test_complete_ndjson_has_no_marker(self):
+        lines = _body(export_response(_records(3), 'ndjson', ACCOUNT)).splitlines()
+
+        self.assertEqual([json.loads(line)['id'] for line in lines], ['1', '2', '3'])
+
+    def test_ndjson_ends_with_error_and_cursor(self):
+        with self.assertLogs('authentication.export', 'WARNING'):
+            body = _body(export_response(_records(2, ConnectionError('Horizon gone')), 'ndjson', ACCOUNT))
+
+        last = json.loads(body.splitlines()[-1])
+        self.assertEqual(last, {'error': 'Export interrupted: Horizon gone', 'cursor': '2'})
+
+    def test_csv_ends_with_error_row(self):
+        with self.assertLogs('authentication.export', 'WARNING'):
+            body = _body(export_response(_records(2, ConnectionError('Horizon gone')), 'csv', ACCOUNT))
+
+        rows = list(csv.reader(io.StringIO(body)))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[-1], ['ERROR', 'Export interrupted: Horizon gone', '2'])
+
+    def test_async_ndjson_ends_with_error_and_cursor(self):
+        response = aexport_response(_arecords(2, ConnectionError('Horizon gone')), 'ndjson', ACCOUNT)
+        with self.assertLogs('authentication.export', 'WARNING'):
+            body = async_to_sync(_abody)(response)
+
+        self.assertEqual(json.loads(body.splitlines()[-1])['cursor'], '2')
+
+    def test_async_csv_ends_with_error_row(self):
+        response = aexport_response(_arecords(0, ConnectionError('Horizon gone')), 'csv', ACCOUNT)
+        with self.assertLogs('authentication.export', 'WARNING'):
+            body = async_to_sync(_abody)(response)
+
+        self.assertEqual(list(csv.reader(io.StringIO(body)))[-1], ['ERROR', 'Export interrupted: Horizon gone', ''])
+
+
+class IterHistoryTests(SimpleTestCase):
+    def _server(self, *pages):
+        server = mock.MagicMock()
+        builder = server.operations.return_value.for_account.return_value.join.return_value \
+            .limit.return_value.order.return_value
+        builder.call.return_value = pages[0]
+        builder.next.side_effect = pages[1:]
+        return server, builder
+
+    @staticmethod
+    def _page(first_id, count):
+        return {'_embedded': {'records': [
+            {
+                'id': str(op_id), 'type': 'manage_data', 'created_at': '2024-01-01T00:00:00Z',
+                'transaction_hash': 'a' * 64, 'source_account': ACCOUNT, 'transaction': {},
+            }
+            for op_id in range(first_id, first_id + count)
+        ]}}
+
+    def test_follows_pages_until_a_short_one(self):
+        server, builder = self._server(
+            self._page(1, HORIZON_MAX_PAGE_SIZE), self._page(HORIZON_MAX_PAGE_SIZE + 1, 5)
+        )
+
+        records = list(iter_history(server, ACCOUNT))
+
+        self.assertEqual([record['id'] for record in records][-1], str(HORIZON_MAX_PAGE_SIZE + 5))
+        self.assertEqual(len(records), HORIZON_MAX_PAGE_SIZE + 5)
+        self.assertEqual(builder.next.call_count, 1)
+
+    def test_failed_page_surfaces_in_the_export(self):
+        server, _ = self._server(self._page(1, HORIZON_MAX_PAGE_SIZE), ConnectionError('Horizon gone'))
+
+        with self.assertLogs('authentication.export', 'WARNING'):
+            body = _body(export_response(iter_history(server, ACCOUNT), 'ndjson', ACCOUNT))
+
+        self.assertEqual(json.loads(body.splitlines()[-1])['cursor'], str(HORIZON_MAX_PAGE_SIZE))
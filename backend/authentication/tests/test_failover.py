@@ -0,0 +1,169 @@
+import asyncio
+import threading
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from prometheus_client import REGISTRY
+
+from authentication.failover import AsyncFailoverClient, Endpoint, FailoverClient
+
+PRIMARY = 'https://horizon-a.example'
+SECONDARY = 'https://horizon-b.example'
+PATH = '/accounts/GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+
+
+def _hedges(winner):
+    return REGISTRY.get_sample_value('horizon_hedged_reads_total', {'winner': winner}) or 0
+
+
+class FakeClient:
+    """Answers with `status` after waiting for `release`, recording every URL it is sent"""
+
+    def __init__(self, status=200, release=None):
+        self.status = status
+        self.release = release
+        self.calls = []
+
+    def get(self, url, params=None):
+        self.calls.append(url)
+        if self.release is not None:
+            self.release.wait(5)
+        if isinstance(self.status, Exception):
+            raise self.status
+        return mock.Mock(status_code=self.status, url=url)
+
+    def post(self, url, data=None, json_data=None):
+        return self.get(url)
+
+    def close(self):
+        pass
+
+
+class FakeAsyncClient:
+    def __init__(self, status=200, delay=0.0):
+        self.status = status
+        self.delay = delay
+        self.calls = []
+
+    async def get(self, url, params=None):
+        self.calls.append(url)
+        await asyncio.sleep(self.delay)
+        return mock.Mock(status_code=self.status, url=url)
+
+
+def _endpoints(*clients, failure_threshold=3, cooldown=30):
+    return [
+        Endpoint(url, client, failure_threshold=failure_threshold, cooldown=cooldown)
+        for url, client in zip([PRIMARY, SECONDARY], clients)
+    ]
+
+
+@mock.patch('authentication.failover.time.monotonic')
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_consecutive_failures(self, monotonic):
+        monotonic.return_value = 100.0
+        endpoint = Endpoint(PRIMARY, FakeClient(), failure_threshold=3, cooldown=30)
+
+        for _ in range(2):
+            endpoint.record(0.1, failed=True)
+        self.assertEqual(endpoint.state(), 'closed')
+        endpoint.record(0.1, failed=True)
+
+        self.assertEqual(endpoint.state(), 'open')
+
+    def test_one_probe_per_cooldown_then_closes_on_success(self, monotonic):
+        monotonic.return_value = 100.0
+        endpoint = Endpoint(PRIMARY, FakeClient(), failure_threshold=1, cooldown=30)
+        endpoint.record(0.1, failed=True)
+
+        monotonic.return_value = 131.0
+        self.assertEqual(endpoint.state(), 'probe')
+        # Concurrent callers wait for the probe's outcome
+        self.assertEqual(endpoint.state(), 'open')
+
+        endpoint.record(0.1, failed=False)
+        self.assertEqual(endpoint.state(), 'closed')
+
+    def test_a_failed_probe_keeps_the_circuit_open(self, monotonic):
+        monotonic.return_value = 100.0
+        endpoint = Endpoint(PRIMARY, FakeClient(), failure_threshold=1, cooldown=30)
+        endpoint.record(0.1, failed=True)
+
+        monotonic.return_value = 131.0
+        self.assertEqual(endpoint.state(), 'probe')
+        endpoint.record(0.1, failed=True)
+
+        monotonic.return_value = 150.0
+        self.assertEqual(endpoint.state(), 'open')
+
+
+class FailoverClientTests(SimpleTestCase):
+    def test_fails_over_on_5xx_and_skips_an_open_circuit(self):
+        primary, secondary = FakeClient(status=503), FakeClient()
+        client = FailoverClient(_endpoints(primary, secondary, failure_threshold=1))
+
+        first = client.get(PRIMARY + PATH)
+        second = client.get(PRIMARY + PATH)
+
+        self.assertEqual(first.url, SECONDARY + PATH)
+        self.assertEqual(second.url, SECONDARY + PATH)
+        self.assertEqual(len(primary.calls), 1)
+
+    def test_connection_errors_fail_over(self):
+        client = FailoverClient(_endpoints(FakeClient(status=ConnectionError('reset')), FakeClient()))
+
+        self.assertEqual(client.get(PRIMARY + PATH).url, SECONDARY + PATH)
+
+    def test_every_endpoint_failing_raises_the_last_error(self):
+        client = FailoverClient(_endpoints(
+            FakeClient(status=ConnectionError('reset')), FakeClient(status=ConnectionError('refused'))
+        ))
+
+        with self.assertRaisesMessage(ConnectionError, 'refused'):
+            client.get(PRIMARY + PATH)
+
+
+class HedgedReadTests(SimpleTestCase):
+    def test_a_slow_read_is_hedged_to_the_next_endpoint(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        primary, secondary = FakeClient(release=release), FakeClient()
+        client = FailoverClient(_endpoints(primary, secondary), hedge_delay=0.05)
+        self.addCleanup(client.close)
+        before = _hedges('hedge')
+
+        response = client.get(PRIMARY + PATH)
+
+        self.assertEqual(response.url, SECONDARY + PATH)
+        self.assertEqual(_hedges('hedge'), before + 1)
+
+    def test_a_fast_read_is_not_hedged(self):
+        primary, secondary = FakeClient(), FakeClient()
+        client = FailoverClient(_endpoints(primary, secondary), hedge_delay=1)
+        self.addCleanup(client.close)
+
+        self.assertEqual(client.get(PRIMARY + PATH).url, PRIMARY + PATH)
+        self.assertEqual(secondary.calls, [])
+
+    def test_submissions_are_never_hedged(self):
+        # Slower than the hedge delay, which a read would not wait out
+        release = threading.Event()
+        timer = threading.Timer(0.1, release.set)
+        timer.start()
+        self.addCleanup(timer.cancel)
+        primary, secondary = FakeClient(release=release), FakeClient()
+        client = FailoverClient(_endpoints(primary, secondary), hedge_delay=0.01)
+        self.addCleanup(client.close)
+
+        self.assertEqual(client.post(PRIMARY + '/transactions').url, PRIMARY + '/transactions')
+        self.assertEqual(secondary.calls, [])
+
+    def test_async_reads_are_hedged(self):
+        primary, secondary = FakeAsyncClient(delay=0.2), FakeAsyncClient()
+        client = AsyncFailoverClient(_endpoints(primary, secondary), hedge_delay=0.05)
+
+        response = async_to_sync(client.get)(PRIMARY + PATH)
+
+        self.assertEqual(response.url, SECONDARY + PATH)
+        self.assertEqual(primary.calls, [PRIMARY + PATH])
@@ -0,0 +1,91 @@
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+
+from authentication.history import fetch_history, page_cursors, page_link, transaction_cursor
+
+ACCOUNT = 'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+OTHER = 'GBZXN7PIRZGNMHGA7MUUUF4GWPY5AYPV6LY4UV2GL6VJGIQRXFDNMADI'
+
+
+def _operation(op_id, tx, source, **fields):
+    return dict({
+        'id': str(op_id),
+        'type': 'manage_data',
+        'created_at': '2024-01-01T00:00:00Z',
+        'transaction_hash': tx['hash'],
+        'source_account': source,
+    }, **fields)
+
+
+def _page(records):
+    return {'_embedded': {'records': records}}
+
+
+class JoinedHistoryTests(SimpleTestCase):
+    def setUp(self):
+        self.single = {'hash': 'a' * 64, 'source_account': ACCOUNT, 'operation_count': 1}
+        self.shared = {'hash': 'b' * 64, 'source_account': ACCOUNT, 'operation_count': 2}
+        self.server = mock.MagicMock()
+        operations = self.server.operations.return_value
+        joined = operations.for_account.return_value.join.return_value.limit.return_value.order.return_value
+        # The account's operations with their transactions joined in: the
+        # shared transaction's second operation only involves OTHER
+        joined.call.return_value = _page([
+            dict(_operation(8193, self.shared, ACCOUNT), transaction=self.shared),
+            dict(_operation(4097, self.single, ACCOUNT), transaction=self.single),
+        ])
+        operations.for_transaction.return_value.limit.return_value.call.return_value = _page([
+            _operation(8193, self.shared, ACCOUNT),
+            _operation(8194, self.shared, OTHER),
+        ])
+
+    def test_partial_transactions_are_completed(self):
+        records = fetch_history(self.server, ACCOUNT, 10, strategy='operations')
+
+        self.assertEqual([record['id'] for record in records], ['8193', '8194', '4097'])
+        self.assertEqual(records[1]['source_account'], OTHER)
+        # Only the shared transaction needed its own call
+        self.server.operations.return_value.for_transaction.assert_called_once_with(self.shared['hash'])
+
+    def test_complete_transactions_need_no_extra_calls(self):
+        self.shared['operation_count'] = 1
+        fetch_history(self.server, ACCOUNT, 10, strategy='operations')
+
+        self.server.operations.return_value.for_transaction.assert_not_called()
+
+
+class CursorTests(SimpleTestCase):
+    # Transaction 2 holds operations 8193 and 8194, transaction 1 holds 4097
+    PAGE = [
+        {'id': '8194', 'transaction_hash': 'b' * 64},
+        {'id': '8193', 'transaction_hash': 'b' * 64},
+        {'id': '4097', 'transaction_hash': 'a' * 64},
+    ]
+
+    def test_transaction_cursor_skips_the_whole_transaction(self):
+        self.assertEqual(transaction_cursor('8194', 'desc'), '8192')
+        self.assertEqual(transaction_cursor('8193', 'asc'), '12287')
+
+    def test_full_page_has_a_next_cursor(self):
+        next_cursor, prev_cursor = page_cursors(self.PAGE, 2, 'desc')
+
+        self.assertEqual(next_cursor, '4096')
+        self.assertEqual(prev_cursor, '12287')
+
+    def test_short_page_ends_the_history(self):
+        next_cursor, prev_cursor = page_cursors(self.PAGE, 10, 'desc')
+
+        self.assertIsNone(next_cursor)
+        self.assertEqual(prev_cursor, '12287')
+
+    def test_empty_page_has_no_cursors(self):
+        self.assertEqual(page_cursors([], 10, 'desc'), (None, None))
+
+    def test_page_link_replaces_cursor_and_order(self):
+        request = RequestFactory().get('/history/', {'limit': '2', 'cursor': '99', 'order': 'desc'})
+
+        link = page_link(request, '4096', 'asc')
+
+        self.assertEqual(link, 'http://testserver/history/?limit=2&cursor=4096&order=asc')
+        self.assertIsNone(page_link(request, None, 'asc'))
@@ -0,0 +1,97 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from authentication.history import fetch_indexed_history
+from authentication.ingest import Ingester, store_operations
+from authentication.models import IndexedOperation, IngestionCursor, StellarWallet
+
+ACCOUNT = 'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+OTHER = 'GBZXN7PIRZGNMHGA7MUUUF4GWPY5AYPV6LY4UV2GL6VJGIQRXFDNMADI'
+
+
+def _payment(transaction_order, index=1):
+    op_id = transaction_order << 12 | index
+    return {
+        'id': str(op_id),
+        'paging_token': str(op_id),
+        'type': 'payment',
+        'created_at': '2024-01-01T00:00:00Z',
+        'transaction_hash': f'{transaction_order:064x}',
+        'source_account': ACCOUNT,
+        'from': ACCOUNT,
+        'to': OTHER,
+        'amount': '1.0000000',
+        'asset_type': 'native',
+    }
+
+
+def _ingest(start_cursor, transaction_orders):
+    IngestionCursor.objects.create(account=ACCOUNT, paging_token=start_cursor, start_cursor=start_cursor)
+    store_operations([(ACCOUNT, _payment(order)) for order in transaction_orders])
+
+
+class StoreOperationsTests(TestCase):
+    def test_rows_and_cursor_are_stored_together(self):
+        store_operations([(ACCOUNT, _payment(1)), (ACCOUNT, _payment(2))])
+
+        self.assertEqual(IndexedOperation.objects.filter(account=ACCOUNT).count(), 2)
+        self.assertEqual(IngestionCursor.objects.get(account=ACCOUNT).paging_token, _payment(2)['paging_token'])
+
+    def test_replayed_operations_are_ignored(self):
+        store_operations([(ACCOUNT, _payment(1))])
+        store_operations([(ACCOUNT, _payment(1)), (ACCOUNT, _payment(2))])
+
+        self.assertEqual(IndexedOperation.objects.filter(account=ACCOUNT).count(), 2)
+
+    @override_settings(STELLAR_INGEST_START_CURSOR='now')
+    def test_new_streams_record_where_they_start(self):
+        user = User.objects.create(username=ACCOUNT)
+        StellarWallet.objects.create(user=user, public_key=ACCOUNT)
+        ingester = Ingester(batch_size=10, flush_interval=1, rescan_interval=30)
+
+        with mock.patch('authentication.ingest.AccountStream') as stream:
+            ingester.start_streams()
+
+        self.assertEqual(IngestionCursor.objects.get(account=ACCOUNT).start_cursor, 'now')
+        self.assertEqual(stream.call_args.args[1], 'now')
+
+
+class IndexedHistoryTests(TestCase):
+    def test_untracked_accounts_go_to_horizon(self):
+        self.assertIsNone(fetch_indexed_history(ACCOUNT, 10))
+
+    def test_backfilled_index_serves_short_pages(self):
+        _ingest('0', [1, 2, 3])
+
+        records = fetch_indexed_history(ACCOUNT, 10)
+
+        self.assertEqual([int(record['id']) >> 12 for record in records], [3, 2, 1])
+        self.assertEqual(records[0]['to_address'], OTHER)
+
+    def test_page_within_a_partial_index_is_served(self):
+        _ingest('now', [5, 6, 7])
+
+        records = fetch_indexed_history(ACCOUNT, 2)
+
+        self.assertEqual([int(record['id']) >> 12 for record in records], [7, 6])
+
+    def test_page_past_where_ingestion_started_goes_to_horizon(self):
+        _ingest('now', [5, 6, 7])
+
+        self.assertIsNone(fetch_indexed_history(ACCOUNT, 10))
+        self.assertIsNone(fetch_indexed_history(ACCOUNT, 2, cursor=str(6 << 12), order='desc'))
+        self.assertIsNone(fetch_indexed_history(ACCOUNT, 2, order='asc'))
+
+    def test_oldest_first_from_inside_the_index_is_served(self):
+        _ingest('now', [5, 6, 7])
+
+        records = fetch_indexed_history(ACCOUNT, 10, cursor=str(5 << 12 | 1), order='asc')
+
+        self.assertEqual([int(record['id']) >> 12 for record in records], [6, 7])
+
+    def test_nothing_ingested_since_now_goes_to_horizon(self):
+        IngestionCursor.objects.create(account=ACCOUNT, paging_token='now', start_cursor='now')
+
+        self.assertIsNone(fetch_indexed_history(ACCOUNT, 10))
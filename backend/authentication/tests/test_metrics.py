@@ -0,0 +1,81 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from prometheus_client import REGISTRY
+
+from authentication import metrics
+from authentication.metrics import MetricsMiddleware, bind_request, horizon_endpoint
+
+VIEW = 'test-view'
+ACCOUNT_URL = 'https://horizon-testnet.stellar.org/accounts/GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class HorizonEndpointTests(SimpleTestCase):
+    def test_names_the_endpoint_type(self):
+        self.assertEqual(horizon_endpoint(ACCOUNT_URL, 'GET'), 'accounts')
+        self.assertEqual(horizon_endpoint(ACCOUNT_URL + '/operations', 'GET'), 'operations')
+        self.assertEqual(horizon_endpoint('https://horizon-testnet.stellar.org/transactions', 'POST'), 'submit')
+        self.assertEqual(horizon_endpoint('https://horizon-testnet.stellar.org/', 'GET'), 'root')
+
+
+class MetricsMiddlewareTests(TestCase):
+    def _call(self, view):
+        request = RequestFactory().get('/api/auth/wallet/')
+        request.resolver_match = mock.Mock(view_name=VIEW)
+        return MetricsMiddleware(view)(request)
+
+    def test_counts_requests_queries_and_horizon_calls(self):
+        def view(request):
+            User.objects.count()
+            User.objects.exists()
+            # One Horizon call on a pool thread, as the bulk endpoints make them
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                executor.submit(bind_request(metrics._observe_horizon), ACCOUNT_URL, 'GET', time.perf_counter(), 200)
+            return HttpResponse(status=201)
+
+        before = {
+            'requests': _sample('http_requests_total', view=VIEW, method='GET', status='201'),
+            'queries': _sample('http_request_db_queries_sum', view=VIEW),
+            'horizon': _sample('http_request_horizon_calls_sum', view=VIEW),
+            'latency': _sample('http_request_duration_seconds_count', view=VIEW, method='GET'),
+        }
+        self._call(view)
+
+        self.assertEqual(_sample('http_requests_total', view=VIEW, method='GET', status='201'), before['requests'] + 1)
+        self.assertEqual(_sample('http_request_db_queries_sum', view=VIEW), before['queries'] + 2)
+        self.assertEqual(_sample('http_request_horizon_calls_sum', view=VIEW), before['horizon'] + 1)
+        self.assertEqual(
+            _sample('http_request_duration_seconds_count', view=VIEW, method='GET'), before['latency'] + 1
+        )
+
+    def test_horizon_errors_are_counted_by_status(self):
+        before = _sample('horizon_request_errors_total', endpoint='accounts', status='404')
+
+        metrics._observe_horizon(ACCOUNT_URL, 'GET', time.perf_counter(), 404)
+
+        self.assertEqual(_sample('horizon_request_errors_total', endpoint='accounts', status='404'), before + 1)
+
+
+class MetricsViewTests(SimpleTestCase):
+    def test_serves_loopback(self):
+        response = self.client.get('/metrics')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'http_requests_total', response.content)
+
+    def test_refuses_other_addresses(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.7', HTTP_X_REAL_IP='127.0.0.1')
+
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_ALLOWED_NETWORKS=['10.0.0.0/8'])
+    def test_serves_allowed_networks(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code, 200)
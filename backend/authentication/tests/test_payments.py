@@ -0,0 +1,142 @@
+import json
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+from stellar_sdk import Account, Asset, Keypair, Network, TransactionBuilder
+from stellar_sdk.client.response import Response as HorizonResponse
+from stellar_sdk.exceptions import BadRequestError, ConnectionError as HorizonConnectionError
+
+from authentication import payouts, views
+from authentication.payments import SubmissionUncertain
+from authentication.payouts import PayoutRun
+
+SOURCE = Keypair.random()
+OTHER_SOURCE = Keypair.random()
+DESTINATION = Keypair.random().public_key
+
+
+def _rejected(transaction, operations):
+    body = {'extras': {'result_codes': {'transaction': transaction, 'operations': operations}}}
+    return BadRequestError(HorizonResponse(400, json.dumps(body), {}, 'https://horizon/transactions'))
+
+
+def _uncertain():
+    envelope = (
+        TransactionBuilder(Account(SOURCE.public_key, 1), Network.TESTNET_NETWORK_PASSPHRASE, base_fee=100)
+        .append_payment_op(DESTINATION, Asset.native(), '1')
+        .set_timeout(30)
+        .build()
+    )
+    return SubmissionUncertain(envelope, HorizonConnectionError('Read timed out'))
+
+
+class UncertainSubmissionTests(SimpleTestCase):
+    def setUp(self):
+        self.error = _uncertain()
+
+    def test_payout_rows_report_the_transaction_hash(self):
+        with mock.patch.object(payouts, 'submit_payments', side_effect=self.error):
+            run = PayoutRun(default_secret=SOURCE.secret)
+            run.add({'destination': DESTINATION, 'amount': '1'})
+            run.add({'destination': DESTINATION, 'amount': '2'})
+            results = run.finish()
+
+        self.assertEqual([result['status'] for result in results], ['uncertain', 'uncertain'])
+        self.assertEqual({result['transaction_hash'] for result in results}, {self.error.transaction_hash})
+
+    def test_payment_view_answers_504_with_the_transaction_hash(self):
+        request = APIRequestFactory().post('/api/auth/payment/', {
+            'destination': DESTINATION, 'amount': '1', 'secret_key': SOURCE.secret,
+        }, format='json')
+        with mock.patch.object(views, 'submit_payments', side_effect=self.error):
+            response = views.SendPaymentView.as_view()(request)
+        response.render()
+
+        self.assertEqual(response.status_code, 504)
+        body = json.loads(response.content)
+        self.assertEqual(body['status'], 'uncertain')
+        self.assertEqual(body['transaction_hash'], self.error.transaction_hash)
+
+
+@override_settings(STELLAR_MAX_OPS_PER_TX=2, STELLAR_CHANNEL_SECRETS=[], STELLAR_PAYOUT_CONCURRENCY=2)
+@mock.patch.object(payouts, 'invalidate_balances')
+@mock.patch.object(payouts, 'get_channel_pool', return_value=None)
+class PayoutRunTests(SimpleTestCase):
+    def test_rows_are_packed_per_source_account(self, get_channel_pool, invalidate_balances):
+        with mock.patch.object(payouts, 'submit_payments', return_value={'hash': 'abc', 'ledger': 7}) as submit:
+            run = PayoutRun(default_secret=SOURCE.secret)
+            for amount in ['1', '2', '3']:
+                run.add({'destination': DESTINATION, 'amount': amount})
+            run.add({'destination': DESTINATION, 'amount': '4', 'secret_key': OTHER_SOURCE.secret})
+            results = run.finish()
+
+        batches = sorted(
+            (call.args[0].public_key, [payment['amount'] for payment in call.args[1]])
+            for call in submit.call_args_list
+        )
+        self.assertEqual(batches, sorted([
+            (SOURCE.public_key, ['1.0000000', '2.0000000']),
+            (SOURCE.public_key, ['3.0000000']),
+            (OTHER_SOURCE.public_key, ['4.0000000']),
+        ]))
+        self.assertEqual(run.transactions, 3)
+        self.assertEqual([result['status'] for result in results], ['success'] * 4)
+        self.assertEqual([result['operation_index'] for result in results], [0, 1, 0, 0])
+
+    def test_invalid_rows_are_reported_without_being_submitted(self, get_channel_pool, invalidate_balances):
+        with mock.patch.object(payouts, 'submit_payments', return_value={'hash': 'abc'}) as submit:
+            run = PayoutRun(default_secret=SOURCE.secret)
+            run.add({'destination': 'nowhere', 'amount': '1'})
+            run.add({'destination': DESTINATION, 'amount': '1', 'secret_key': 'not-a-secret'})
+            run.add({'destination': DESTINATION, 'amount': '1'})
+            results = run.finish()
+
+        self.assertEqual([result['status'] for result in results], ['invalid', 'invalid', 'success'])
+        self.assertEqual(len(submit.call_args_list[0].args[1]), 1)
+
+    def test_a_failed_transaction_reports_each_operation(self, get_channel_pool, invalidate_balances):
+        def submit(keypair, payments, **options):
+            if keypair.public_key == SOURCE.public_key:
+                raise _rejected('tx_failed', ['op_success', 'op_no_destination'])
+            return {'hash': 'abc'}
+
+        with mock.patch.object(payouts, 'submit_payments', side_effect=submit):
+            run = PayoutRun(default_secret=SOURCE.secret)
+            run.add({'destination': DESTINATION, 'amount': '1'})
+            run.add({'destination': DESTINATION, 'amount': '2'})
+            run.add({'destination': DESTINATION, 'amount': '3', 'secret_key': OTHER_SOURCE.secret})
+            results = run.finish()
+
+        self.assertEqual([result['status'] for result in results], ['failed', 'failed', 'success'])
+        self.assertEqual(results[0]['error'], 'tx_failed (transaction rolled back)')
+        self.assertEqual(results[1]['error'], 'op_no_destination')
+
+    def test_balances_are_invalidated_once_on_the_calling_thread(self, get_channel_pool, invalidate_balances):
+        with mock.patch.object(payouts, 'submit_payments', return_value={'hash': 'abc'}):
+            run = PayoutRun(default_secret=SOURCE.secret)
+            for amount in ['1', '2', '3']:
+                run.add({'destination': DESTINATION, 'amount': amount})
+            invalidate_balances.assert_not_called()
+            run.finish()
+
+        invalidate_balances.assert_called_once()
+        self.assertEqual(set(invalidate_balances.call_args.args), {SOURCE.public_key, DESTINATION})
+
+
+@override_settings(STELLAR_THROTTLE_ENABLED=False)
+class BulkPaymentViewTests(SimpleTestCase):
+    def test_unreadable_csv_is_rejected_before_anything_is_paid(self):
+        content = f'destination,amount\n{DESTINATION},1\n'.encode() + b'\xff\xfe,2\n'
+        upload = SimpleUploadedFile('payroll.csv', content, content_type='text/csv')
+        request = APIRequestFactory().post(
+            '/api/auth/payments/bulk/', {'secret_key': SOURCE.secret, 'file': upload}, format='multipart'
+        )
+        request.session = {}
+        with mock.patch.object(payouts, 'submit_payments') as submit:
+            response = views.BulkPaymentView.as_view()(request)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Could not read CSV file', response.data['error'])
+        submit.assert_not_called()
@@ -0,0 +1,51 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from authentication.models import AuthenticationSession, StellarWallet, challenge_digest
+from authentication.purge import purge_expired_sessions
+
+ACCOUNT = 'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+
+
+class PurgeTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username=ACCOUNT)
+        self.wallet = StellarWallet.objects.create(user=user, public_key=ACCOUNT)
+        now = timezone.now()
+        # 7 sessions that expired two days ago, 2 that expire tomorrow
+        for i, expires_at in enumerate([now - timedelta(days=2)] * 7 + [now + timedelta(days=1)] * 2):
+            AuthenticationSession.objects.create(
+                wallet=self.wallet, session_key=f'session-{i}', challenge=f'challenge-{i}', expires_at=expires_at
+            )
+
+    def test_deletes_expired_sessions_in_batches(self):
+        # 3 batches of at most 3 rows: SELECT ids and DELETE by id, each in its own transaction
+        with self.assertNumQueries(3 * 4):
+            deleted = purge_expired_sessions(cutoff=timezone.now() - timedelta(days=1), batch_size=3)
+
+        self.assertEqual(deleted, 7)
+        self.assertEqual(AuthenticationSession.objects.count(), 2)
+        self.assertFalse(AuthenticationSession.objects.filter(expires_at__lt=timezone.now()).exists())
+
+    def test_keeps_sessions_within_retention(self):
+        deleted = purge_expired_sessions(cutoff=timezone.now() - timedelta(days=3), batch_size=3)
+
+        self.assertEqual(deleted, 0)
+        self.assertEqual(AuthenticationSession.objects.count(), 9)
+
+    def test_command_purges_with_retention(self):
+        out = StringIO()
+        call_command('purge_auth_sessions', retention=86400, batch_size=5, stdout=out)
+
+        self.assertEqual(AuthenticationSession.objects.count(), 2)
+        self.assertIn('7 session(s) purged', out.getvalue())
+
+    def test_challenge_digest_is_indexed_on_save(self):
+        session = AuthenticationSession.objects.get(session_key='session-0')
+
+        self.assertEqual(session.challenge_digest, challenge_digest('challenge-0'))
@@ -0,0 +1,178 @@
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from authentication import async_views, push
+from authentication.push import (
+    KEEPALIVE, AsyncSubscription, HubFull, PushHub, Subscription, astream_events, format_event
+)
+from authentication.views import AccountEventsView
+
+ACCOUNT = 'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+OTHER = 'GBZXN7PIRZGNMHGA7MUUUF4GWPY5AYPV6LY4UV2GL6VJGIQRXFDNMADI'
+BALANCE_EVENT = format_event('balance', {'balances': []})
+
+
+def _operation(paging_token):
+    return format_event('operation', {'id': str(paging_token)}, paging_token)
+
+
+class FakeFeedTestCase(SimpleTestCase):
+    """A fresh process hub whose feeds never reach Horizon"""
+
+    def setUp(self):
+        self.hub = PushHub(max_accounts=1)
+        for patcher in [mock.patch.object(push, '_hub', self.hub), mock.patch.object(push.AccountFeed, 'start')]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+class FormatEventTests(SimpleTestCase):
+    def test_formats_id_event_and_json_data(self):
+        self.assertEqual(
+            format_event('operation', {'id': '8193'}, '8193'),
+            b'id: 8193\nevent: operation\ndata: {"id": "8193"}\n\n'
+        )
+        self.assertEqual(format_event('balance', {'balances': []}), b'event: balance\ndata: {"balances": []}\n\n')
+
+
+class PushHubTests(FakeFeedTestCase):
+    def test_one_feed_per_account_until_the_last_subscriber_leaves(self):
+        first, second = Subscription(ACCOUNT), Subscription(ACCOUNT)
+        self.hub.subscribe(first)
+        self.hub.subscribe(second)
+        feed = self.hub.feeds[ACCOUNT]
+
+        self.assertEqual(self.hub.stats(), {ACCOUNT: 2})
+        self.hub.unsubscribe(first)
+        self.assertFalse(feed.stop_event.is_set())
+        self.hub.unsubscribe(second)
+
+        self.assertTrue(feed.stop_event.is_set())
+        self.assertEqual(self.hub.stats(), {})
+        self.assertEqual(feed.start.call_count, 1)
+
+    def test_refuses_accounts_past_the_limit(self):
+        self.hub.subscribe(Subscription(ACCOUNT))
+
+        self.assertTrue(self.hub.has_room(ACCOUNT))
+        self.assertFalse(self.hub.has_room(OTHER))
+        with self.assertRaises(HubFull):
+            self.hub.subscribe(Subscription(OTHER))
+
+    def test_a_subscriber_that_falls_behind_is_closed(self):
+        subscription = Subscription(ACCOUNT)
+        self.hub.subscribe(subscription)
+
+        for paging_token in range(push.SUBSCRIBER_QUEUE_SIZE + 1):
+            self.hub.feeds[ACCOUNT].publish(_operation(paging_token))
+
+        messages = [subscription.get(timeout=0) for _ in range(push.SUBSCRIBER_QUEUE_SIZE)]
+        self.assertIs(messages[-1], push.CLOSED)
+
+
+@override_settings(STELLAR_PUSH_MAX_AGE=0.2, STELLAR_PUSH_KEEPALIVE=0.05)
+class StreamEventsTests(FakeFeedTestCase):
+    def _collect(self, initial=None, publish=()):
+        async def run():
+            messages = []
+            async for message in astream_events(AsyncSubscription(ACCOUNT), initial):
+                messages.append(message)
+                if len(messages) == 1:
+                    # Subscribed by now: the feed publishes while the stream is open
+                    for paging_token in publish:
+                        self.hub.feeds[ACCOUNT].publish(_operation(paging_token))
+            return messages
+        return async_to_sync(run)()
+
+    def test_sends_initial_events_then_live_ones_and_ends_at_max_age(self):
+        async def initial():
+            return [BALANCE_EVENT]
+
+        messages = self._collect(initial, publish=[7])
+
+        self.assertEqual(messages[0], f'retry: {push.RECONNECT_MS}\n\n'.encode())
+        self.assertEqual([m for m in messages[1:] if m != KEEPALIVE], [BALANCE_EVENT, _operation(7)])
+        self.assertIn(KEEPALIVE, messages)
+        self.assertEqual(self.hub.stats(), {})
+
+    def test_replayed_operations_are_not_sent_twice(self):
+        async def initial():
+            # Published while the missed operations were being fetched
+            self.hub.feeds[ACCOUNT].publish(_operation(6))
+            return [_operation(5), _operation(6)]
+
+        messages = self._collect(initial, publish=[7])
+
+        operations = [m for m in messages if m.startswith(b'id: ')]
+        self.assertEqual(operations, [_operation(5), _operation(6), _operation(7)])
+
+    def test_a_stream_closed_early_unsubscribes(self):
+        async def run():
+            stream = astream_events(AsyncSubscription(ACCOUNT))
+            await stream.__anext__()
+            subscribed = self.hub.stats()
+            await stream.aclose()
+            return subscribed
+
+        self.assertEqual(async_to_sync(run)(), {ACCOUNT: 1})
+        self.assertEqual(self.hub.stats(), {})
+
+    def test_a_stream_never_iterated_holds_no_subscription(self):
+        async def run():
+            astream_events(AsyncSubscription(ACCOUNT))
+
+        async_to_sync(run)()
+
+        self.assertEqual(self.hub.stats(), {})
+
+    def test_a_full_hub_ends_the_stream_with_an_error_event(self):
+        self.hub.subscribe(Subscription(OTHER))
+
+        messages = self._collect()
+
+        self.assertEqual(len(messages), 1)
+        self.assertIn(b'event: error', messages[0])
+
+
+@override_settings(STELLAR_PUSH_MAX_AGE=0.05, STELLAR_PUSH_KEEPALIVE=0.05)
+@mock.patch.object(async_views, '_session_public_key', new_callable=mock.AsyncMock, return_value=ACCOUNT)
+class AccountEventsViewTests(FakeFeedTestCase):
+    def _stream(self, **headers):
+        request = RequestFactory().get('/api/auth/events/', **headers)
+
+        async def run():
+            response = await async_views.account_events(request)
+            if not response.streaming:
+                return response, []
+            return response, [message async for message in response.streaming_content]
+        return async_to_sync(run)()
+
+    def test_resumes_from_last_event_id(self, session_public_key):
+        with mock.patch.object(async_views, 'missed_operations', return_value=[_operation(9)]) as missed, \
+                mock.patch.object(async_views, '_cached_balances', side_effect=Exception('not funded')):
+            response, messages = self._stream(HTTP_LAST_EVENT_ID='8')
+
+        missed.assert_called_once_with(ACCOUNT, '8')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn(_operation(9), messages)
+        self.assertEqual(self.hub.stats(), {})
+
+    def test_full_hub_answers_503(self, session_public_key):
+        self.hub.subscribe(Subscription(OTHER))
+
+        response, _ = self._stream()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(json.loads(response.content)['error'], 'Too many live streams, try again later')
+
+
+class SyncEventsTests(SimpleTestCase):
+    def test_sync_workers_do_not_hold_streams(self):
+        request = APIRequestFactory().get('/api/auth/events/', HTTP_ACCEPT='text/event-stream')
+        response = AccountEventsView.as_view()(request)
+
+        self.assertEqual(response.status_code, 501)
@@ -0,0 +1,62 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnList
+
+from authentication.renderers import FastJSONRenderer
+from authentication.serializers import BalanceSerializer, TransactionSerializer
+
+ACCOUNT = 'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def assertSameBytes(self, data):
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_matches_drf(self):
+        self.assertSameBytes({
+            'cached': True, 'cache_age': 1.25, 'count': 2 ** 40, 'note': 'café  ',
+            'at': datetime(2024, 1, 1, 12, 0, 0, 123456, tzinfo=timezone.utc), 'balances': [],
+        })
+
+    def test_exponent_floats_match_drf(self):
+        nested = ReturnList([OrderedDict(nested=1e-9)], serializer=None)
+        for value in (1e16, 1e-7, -1e-5, 1.5e300, [{'nested': 1e22}], nested):
+            with self.subTest(value=value):
+                self.assertSameBytes({'value': value})
+
+    def test_non_finite_floats_raise_like_drf(self):
+        for value in (float('nan'), float('inf'), [float('-inf')]):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                FastJSONRenderer().render({'value': value})
+
+
+class FastRepresentationTests(SimpleTestCase):
+    def test_balances_match_serializer_data(self):
+        records = [
+            {'asset_code': 'XLM', 'asset_type': 'native', 'balance': '100.0000000'},
+            {'asset_code': 'USDC', 'asset_type': 'credit_alphanum4', 'balance': '5.0000000', 'asset_issuer': ACCOUNT},
+        ]
+
+        self.assertEqual(BalanceSerializer.represent(records), BalanceSerializer(records, many=True).data)
+
+    def test_transactions_match_serializer_data(self):
+        records = [
+            {
+                'id': '4097', 'type': 'payment', 'created_at': '2024-01-01T00:00:00Z',
+                'transaction_hash': 'a' * 64, 'source_account': ACCOUNT, 'from_address': ACCOUNT,
+                'to_address': ACCOUNT, 'amount': '1.0000000', 'asset_code': 'XLM', 'asset_type': 'native',
+            },
+            {
+                'id': '4098', 'type': 'manage_data', 'created_at': '2024-01-01T00:00:05Z',
+                'transaction_hash': 'b' * 64, 'source_account': ACCOUNT,
+            },
+        ]
+
+        self.assertEqual(TransactionSerializer.represent(records), TransactionSerializer(records, many=True).data)
+
+    def test_missing_required_field_raises(self):
+        with self.assertRaises(KeyError):
+            BalanceSerializer.represent([{'asset_code': 'XLM', 'asset_type': 'native'}])
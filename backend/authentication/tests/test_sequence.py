@@ -0,0 +1,104 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from stellar_sdk import Account, Keypair
+
+from authentication import sequence
+from authentication.sequence import (
+    CacheSequenceAllocator, ChannelPool, HorizonSequenceAllocator, LeaseUnavailable, get_sequence_allocator
+)
+
+REDIS = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost'}}
+
+
+class SequenceBackendTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(sequence, '_allocator', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_per_process_cache_loads_the_account_for_every_payment(self):
+        # The default LocMemCache is not shared between gunicorn workers
+        with self.assertLogs('authentication.sequence', 'WARNING'):
+            self.assertIsInstance(get_sequence_allocator(), HorizonSequenceAllocator)
+
+    @override_settings(CACHES=REDIS)
+    def test_shared_cache_allocates_from_the_cache(self):
+        self.assertIsInstance(get_sequence_allocator(), CacheSequenceAllocator)
+
+
+class CacheSequenceAllocatorTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.public_key = Keypair.random().public_key
+        self.server = mock.MagicMock()
+        self.server.load_account.return_value = Account(self.public_key, 1000)
+
+    def test_workers_never_allocate_the_same_sequence(self):
+        # One allocator per worker process, all on the same cache
+        workers = [CacheSequenceAllocator() for _ in range(3)]
+
+        def allocate(index):
+            account = workers[index % len(workers)].next_account(self.server, self.public_key)
+            return account.sequence + 1
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            allocated = list(executor.map(allocate, range(60)))
+
+        self.assertEqual(sorted(allocated), list(range(1001, 1061)))
+
+    def test_resync_reloads_from_horizon(self):
+        allocator = CacheSequenceAllocator()
+        allocator.next_account(self.server, self.public_key)
+        allocator.resync(self.public_key)
+        self.server.load_account.return_value = Account(self.public_key, 2000)
+
+        self.assertEqual(allocator.next_account(self.server, self.public_key).sequence, 2000)
+
+
+@override_settings(STELLAR_SUBMISSION_LEASE_TTL=60)
+class ChannelLeaseTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.secrets = [Keypair.random().secret for _ in range(2)]
+
+    def test_workers_never_hold_the_same_channel(self):
+        # Each worker process builds its own pool from the same secrets
+        first, second = ChannelPool(self.secrets), ChannelPool(self.secrets)
+        with first.checkout(timeout=0) as channel:
+            with second.checkout(timeout=0) as other:
+                self.assertNotEqual(channel.public_key, other.public_key)
+                with self.assertRaises(LeaseUnavailable):
+                    with ChannelPool(self.secrets).checkout(timeout=0.1):
+                        pass
+
+    def test_concurrent_checkouts_are_exclusive(self):
+        pools = [ChannelPool(self.secrets) for _ in range(3)]
+        holders = {}
+        overlaps = []
+        lock = threading.Lock()
+
+        def submit(index):
+            with pools[index % len(pools)].checkout(timeout=5) as channel:
+                with lock:
+                    if channel.public_key in holders:
+                        overlaps.append(channel.public_key)
+                    holders[channel.public_key] = index
+                threading.Event().wait(0.01)
+                with lock:
+                    del holders[channel.public_key]
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            list(executor.map(submit, range(30)))
+
+        self.assertEqual(overlaps, [])
+
+    def test_released_channels_can_be_leased_again(self):
+        pool = ChannelPool(self.secrets[:1])
+        with pool.checkout(timeout=0):
+            pass
+        with ChannelPool(self.secrets[:1]).checkout(timeout=0) as channel:
+            self.assertEqual(channel.secret, self.secrets[0])
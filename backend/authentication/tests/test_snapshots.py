@@ -0,0 +1,101 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from authentication.models import AccountSnapshot, StellarWallet
+from authentication.snapshots import SnapshotScheduler, read_snapshot, refresh_interval, snapshot_history
+
+ACCOUNT = 'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+
+
+def _fields(ledger, operations=()):
+    return {
+        'found': True,
+        'balances': [{'asset_code': 'XLM', 'asset_type': 'native', 'balance': '100.0000000'}],
+        'sequence': '1000',
+        'last_modified_ledger': ledger,
+        'operations': list(operations),
+    }
+
+
+def _operation(op_id, tx_hash):
+    return {'id': str(op_id), 'transaction_hash': tx_hash}
+
+
+class RefreshIntervalTests(SimpleTestCase):
+    def test_doubles_while_unchanged_up_to_the_maximum(self):
+        self.assertEqual([refresh_interval(idle, 30, 600) for idle in range(7)], [30, 60, 120, 240, 480, 600, 600])
+
+
+@mock.patch('authentication.snapshots.get_server')
+class SnapshotSchedulerTests(TestCase):
+    def setUp(self):
+        user = User.objects.create(username=ACCOUNT)
+        StellarWallet.objects.create(user=user, public_key=ACCOUNT)
+        self.scheduler = SnapshotScheduler(batch_size=10, concurrency=2, min_interval=30, max_interval=600)
+
+    def test_run_once_enrolls_and_refreshes_wallets(self, get_server):
+        with mock.patch('authentication.snapshots.load_snapshot', return_value=_fields(100)):
+            self.scheduler.run_once()
+
+        snapshot = AccountSnapshot.objects.get(account=ACCOUNT)
+        self.assertEqual(snapshot.last_modified_ledger, 100)
+        self.assertIsNotNone(snapshot.refreshed_at)
+        self.assertEqual(self.scheduler.changed, 1)
+
+    def test_unchanged_accounts_back_off(self, get_server):
+        with mock.patch('authentication.snapshots.load_snapshot', return_value=_fields(100)):
+            self.scheduler.run_once()
+            snapshot = AccountSnapshot.objects.get(account=ACCOUNT)
+            changed = self.scheduler.refresh([snapshot])
+
+        snapshot.refresh_from_db()
+        self.assertEqual(changed, 0)
+        self.assertEqual(snapshot.idle_refreshes, 1)
+        self.assertAlmostEqual(
+            (snapshot.next_refresh_at - snapshot.refreshed_at).total_seconds(), 60, delta=1
+        )
+
+    def test_failed_refresh_keeps_the_snapshot_and_records_the_error(self, get_server):
+        with mock.patch('authentication.snapshots.load_snapshot', return_value=_fields(100)):
+            self.scheduler.run_once()
+        snapshot = AccountSnapshot.objects.get(account=ACCOUNT)
+        with mock.patch('authentication.snapshots.load_snapshot', side_effect=ConnectionError('Horizon gone')), \
+                self.assertLogs('authentication.snapshots', 'WARNING'):
+            self.scheduler.refresh([snapshot])
+
+        snapshot.refresh_from_db()
+        self.assertEqual(snapshot.error, 'Horizon gone')
+        self.assertEqual(snapshot.last_modified_ledger, 100)
+
+
+@override_settings(STELLAR_SNAPSHOT_READS=True, STELLAR_SNAPSHOT_MAX_AGE=3600, STELLAR_SNAPSHOT_HISTORY_LIMIT=2)
+class SnapshotReadTests(TestCase):
+    def setUp(self):
+        self.snapshot = AccountSnapshot.objects.create(
+            account=ACCOUNT,
+            next_refresh_at=timezone.now(),
+            refreshed_at=timezone.now(),
+            **_fields(100, [_operation(8194, 'b'), _operation(8193, 'b'), _operation(4097, 'a')]),
+        )
+
+    def test_reads_a_fresh_snapshot(self):
+        self.assertEqual(read_snapshot(ACCOUNT).last_modified_ledger, 100)
+
+    @override_settings(STELLAR_SNAPSHOT_READS=False)
+    def test_reads_nothing_when_turned_off(self):
+        self.assertIsNone(read_snapshot(ACCOUNT))
+
+    def test_ignores_a_stale_snapshot(self):
+        AccountSnapshot.objects.update(refreshed_at=timezone.now() - timedelta(hours=2))
+
+        self.assertIsNone(read_snapshot(ACCOUNT))
+
+    def test_history_keeps_whole_transactions(self):
+        self.assertEqual([op['id'] for op in snapshot_history(ACCOUNT, 1)], ['8194', '8193'])
+
+    def test_history_falls_back_past_what_the_snapshot_holds(self):
+        self.assertIsNone(snapshot_history(ACCOUNT, 3))
@@ -0,0 +1,174 @@
+import json
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from authentication.export import export_response
+from authentication.history import HORIZON_MAX_PAGE_SIZE, aiter_history, iter_history
+from authentication.throttling import UpstreamBusy, client_address, spend_budget, take
+
+ACCOUNT = 'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+
+
+class ConnectView(APIView):
+    permission_classes = [AllowAny]
+    throttle_scope = 'connect'
+
+    def post(self, request):
+        return Response({})
+
+
+@override_settings(STELLAR_THROTTLE_RATES={'connect': '10/min'}, STELLAR_TRUSTED_PROXIES=['172.28.0.10'])
+class ClientThrottleTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+
+    def test_spoofed_forwarded_for_shares_one_bucket(self):
+        view = ConnectView.as_view()
+        statuses = []
+        for i in range(50):
+            request = self.factory.post('/connect/', REMOTE_ADDR='203.0.113.5', HTTP_X_FORWARDED_FOR=f'198.51.100.{i}')
+            request.session = {}
+            statuses.append(view(request).status_code)
+
+        self.assertEqual(statuses.count(200), 10)
+        self.assertEqual(statuses.count(429), 40)
+
+    def test_real_ip_from_trusted_proxy_separates_clients(self):
+        request = self.factory.get('/', REMOTE_ADDR='172.28.0.10', HTTP_X_REAL_IP='198.51.100.7')
+
+        self.assertEqual(client_address(request), '198.51.100.7')
+
+    def test_real_ip_from_anyone_else_is_ignored(self):
+        request = self.factory.get('/', REMOTE_ADDR='203.0.113.5', HTTP_X_REAL_IP='198.51.100.7')
+
+        self.assertEqual(client_address(request), '203.0.113.5')
+
+    @override_settings(STELLAR_TRUSTED_PROXIES=['172.28.0.0/24'])
+    def test_trusted_proxies_can_be_networks(self):
+        request = self.factory.get('/', REMOTE_ADDR='172.28.0.99', HTTP_X_REAL_IP='198.51.100.7')
+
+        self.assertEqual(client_address(request), '198.51.100.7')
+
+
+class BalanceView(APIView):
+    permission_classes = [AllowAny]
+    horizon_reads = True
+
+    def get(self, request):
+        return Response({})
+
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_rates_above_one_per_millisecond_are_kept(self):
+        # 5000/s asked for 10 times a millisecond for a second: ~5000 tokens, not the 1000 a millisecond clock gave
+        with mock.patch('authentication.throttling.time.time', return_value=1000.0) as now:
+            taken = 0
+            for step in range(1000):
+                now.return_value = 1000.0 + step / 1000
+                taken += sum(1 for _ in range(10) if not take('bucket', 5000, 10))
+
+        self.assertAlmostEqual(taken, 5000, delta=10)
+
+    def test_wait_is_the_time_until_the_next_token(self):
+        with mock.patch('authentication.throttling.time.time', return_value=1000.0):
+            self.assertEqual(take('bucket', 2, 1), 0)
+            self.assertAlmostEqual(take('bucket', 2, 1), 0.5)
+
+
+@override_settings(
+    STELLAR_HORIZON_BUDGET_RATE=1, STELLAR_HORIZON_BUDGET_BURST=4, STELLAR_HORIZON_BUDGET_RESERVE=0.25,
+    STELLAR_HORIZON_BUDGET_QUEUE=5,
+)
+class HorizonBudgetThrottleTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _get(self):
+        request = APIRequestFactory().get('/balance/')
+        request.session = {}
+        return BalanceView.as_view()(request)
+
+    def test_anonymous_reads_are_admitted_while_budget_is_left(self):
+        self.assertEqual(self._get().status_code, 200)
+
+    @mock.patch('authentication.throttling.time.sleep')
+    def test_low_budget_sheds_with_429_without_sleeping(self, sleep):
+        for _ in range(3):
+            spend_budget()
+
+        response = self._get()
+
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response['Retry-After']), 1)
+        sleep.assert_not_called()
+
+
+def _page(first_id, count):
+    return {'_embedded': {'records': [
+        {
+            'id': str(op_id), 'type': 'manage_data', 'created_at': '2024-01-01T00:00:00Z',
+            'transaction_hash': 'a' * 64, 'source_account': ACCOUNT, 'transaction': {},
+        }
+        for op_id in range(first_id, first_id + count)
+    ]}}
+
+
+def _server(builder_call, builder_next):
+    server = mock.MagicMock()
+    builder = server.operations.return_value.for_account.return_value.join.return_value \
+        .limit.return_value.order.return_value
+    builder.call = builder_call
+    builder.next = builder_next
+    return server, builder
+
+
+class ExportBudgetTests(SimpleTestCase):
+    def test_export_stops_when_budget_runs_out(self):
+        server, builder = _server(
+            mock.Mock(return_value=_page(1, HORIZON_MAX_PAGE_SIZE)), mock.Mock(return_value=_page(201, 5))
+        )
+        admit = mock.Mock(return_value=3)
+
+        response = export_response(iter_history(server, ACCOUNT, admit=admit), 'ndjson', ACCOUNT)
+        with self.assertLogs('authentication.export', 'WARNING'):
+            body = b''.join(response.streaming_content)
+
+        last = json.loads(body.splitlines()[-1])
+        self.assertEqual(last['cursor'], str(HORIZON_MAX_PAGE_SIZE))
+        self.assertIn(UpstreamBusy.default_detail, last['error'])
+        builder.next.assert_not_called()
+
+    def test_export_continues_while_admitted(self):
+        server, builder = _server(
+            mock.Mock(return_value=_page(1, HORIZON_MAX_PAGE_SIZE)), mock.Mock(return_value=_page(201, 5))
+        )
+        admit = mock.Mock(return_value=0)
+
+        records = list(iter_history(server, ACCOUNT, admit=admit))
+
+        self.assertEqual(len(records), HORIZON_MAX_PAGE_SIZE + 5)
+        admit.assert_called_once_with()
+
+    def test_async_export_stops_when_budget_runs_out(self):
+        server, builder = _server(
+            mock.AsyncMock(return_value=_page(1, HORIZON_MAX_PAGE_SIZE)), mock.AsyncMock(return_value=_page(201, 5))
+        )
+
+        async def collect():
+            records = await aiter_history(server, ACCOUNT, admit=mock.AsyncMock(return_value=3))
+            return [record async for record in records]
+
+        with self.assertRaises(UpstreamBusy):
+            async_to_sync(collect)()
+        builder.next.assert_not_called()
@@ -0,0 +1,55 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from rest_framework.test import APIRequestFactory
+
+from authentication import views
+from authentication.tokens import ACCESS, TokenError, decode_token, issue_tokens
+
+PUBLIC_KEY = 'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+
+
+def _refresh(refresh_token):
+    request = APIRequestFactory().post('/api/auth/token/refresh/', {'refresh_token': refresh_token}, format='json')
+    return views.TokenRefreshView.as_view()(request)
+
+
+class TokenRefreshTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.tokens = issue_tokens(PUBLIC_KEY)
+
+    def test_refresh_issues_a_new_pair(self):
+        response = _refresh(self.tokens['refresh_token'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(decode_token(response.data['access_token'], ACCESS)['sub'], PUBLIC_KEY)
+
+    def test_refresh_token_works_once(self):
+        self.assertEqual(_refresh(self.tokens['refresh_token']).status_code, 200)
+        self.assertEqual(_refresh(self.tokens['refresh_token']).status_code, 401)
+
+    def test_concurrent_reuse_is_rejected(self):
+        # Both requests pass the revocation check before either one revokes the token
+        both_decoded = threading.Barrier(2)
+
+        def decode_then_wait(*args):
+            claims = decode_token(*args)
+            both_decoded.wait(timeout=5)
+            return claims
+
+        with mock.patch.object(views, 'decode_token', side_effect=decode_then_wait):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                statuses = sorted(executor.map(
+                    lambda _: _refresh(self.tokens['refresh_token']).status_code, range(2)
+                ))
+
+        self.assertEqual(statuses, [200, 401])
+
+    def test_access_tokens_cannot_refresh(self):
+        with self.assertRaises(TokenError):
+            decode_token(self.tokens['access_token'], 'refresh')
+        self.assertEqual(_refresh(self.tokens['access_token']).status_code, 401)
@@ -0,0 +1,112 @@
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from stellar_sdk import Asset
+
+from authentication.valuation import fetch_quote, get_quote, quote_balances, value_balances
+
+ISSUER = 'GBZXN7PIRZGNMHGA7MUUUF4GWPY5AYPV6LY4UV2GL6VJGIQRXFDNMADI'
+USDC = Asset('USDC', ISSUER)
+XLM = Asset.native()
+
+
+def _balance(code, amount, issuer=None, asset_type='credit_alphanum4'):
+    return {'asset_code': code, 'asset_type': asset_type, 'asset_issuer': issuer, 'balance': amount}
+
+
+NATIVE = _balance('XLM', '100.0000000', asset_type='native')
+
+
+def _server(path_amounts=(), bids=()):
+    server = mock.Mock()
+    server.strict_send_paths.return_value.call.return_value = {
+        '_embedded': {'records': [{'destination_amount': amount} for amount in path_amounts]}
+    }
+    server.orderbook.return_value.limit.return_value.call.return_value = {
+        'bids': [{'price': price} for price in bids]
+    }
+    return server
+
+
+@override_settings(STELLAR_VALUATION_PROBE_AMOUNT='100')
+class FetchQuoteTests(SimpleTestCase):
+    def test_prices_by_the_best_path_at_the_probe_amount(self):
+        quote = fetch_quote(_server(path_amounts=['950', '1000']), USDC, XLM)
+
+        self.assertEqual(quote, {'price': '10', 'method': 'path'})
+
+    def test_falls_back_to_the_best_bid(self):
+        server = _server(bids=['9.5'])
+
+        self.assertEqual(fetch_quote(server, USDC, XLM), {'price': '9.5', 'method': 'order_book'})
+        server.orderbook.assert_called_once_with(USDC, XLM)
+
+    def test_no_market_has_no_price(self):
+        self.assertEqual(fetch_quote(_server(), USDC, XLM), {'price': None, 'method': None})
+
+
+class QuoteCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_quotes_are_cached_per_pair(self):
+        with mock.patch('authentication.valuation.fetch_quote', return_value={'price': '10', 'method': 'path'}) as fetch:
+            first = get_quote(mock.Mock(), USDC, XLM)
+            second = get_quote(mock.Mock(), USDC, XLM)
+
+        fetch.assert_called_once()
+        self.assertFalse(first[1])
+        self.assertEqual(second[:2], ({'price': '10', 'method': 'path'}, True))
+
+    def test_the_reference_asset_is_worth_one(self):
+        with mock.patch('authentication.valuation.fetch_quote') as fetch:
+            self.assertEqual(get_quote(mock.Mock(), XLM, XLM)[0], {'price': '1', 'method': 'identity'})
+
+        fetch.assert_not_called()
+
+
+class QuoteBalancesTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_each_asset_is_quoted_once_across_accounts(self):
+        fetched, lock = [], threading.Lock()
+
+        def fetch(server, source, reference):
+            with lock:
+                fetched.append(source.code)
+            if source.code == 'BAD':
+                raise ConnectionError('Horizon gone')
+            return {'price': '10', 'method': 'path'}
+
+        balance_lists = [
+            [NATIVE, _balance('USDC', '1.0000000', ISSUER), _balance('BAD', '1.0000000', ISSUER)],
+            [NATIVE, _balance('USDC', '2.0000000', ISSUER), _balance(None, '5.0000000', asset_type='liquidity_pool_shares')],
+        ]
+        with mock.patch('authentication.valuation.fetch_quote', side_effect=fetch):
+            quotes = quote_balances(mock.Mock(), balance_lists, XLM, concurrency=4)
+
+        self.assertEqual(sorted(fetched), ['BAD', 'USDC'])
+        self.assertEqual(set(quotes), {'XLM', f'USDC:{ISSUER}', f'BAD:{ISSUER}'})
+        self.assertEqual(quotes[f'USDC:{ISSUER}'][0]['price'], '10')
+        self.assertIsInstance(quotes[f'BAD:{ISSUER}'], ConnectionError)
+
+    def test_accounts_without_assets_need_no_quotes(self):
+        self.assertEqual(quote_balances(mock.Mock(), [[], []], XLM, concurrency=4), {})
+
+
+class ValueBalancesTests(SimpleTestCase):
+    def test_unpriced_balances_are_left_out_of_the_total(self):
+        quotes = {
+            'XLM': ({'price': '1', 'method': 'identity'}, True, 0.0),
+            f'USDC:{ISSUER}': ({'price': '10', 'method': 'path'}, True, 0.0),
+            f'BAD:{ISSUER}': ConnectionError('Horizon gone'),
+        }
+        balances = [NATIVE, _balance('USDC', '2.5000000', ISSUER), _balance('BAD', '1.0000000', ISSUER)]
+
+        rows, total = value_balances(balances, quotes)
+
+        self.assertEqual([row['value'] for row in rows], ['100.0000000', '25.0000000', None])
+        self.assertEqual(total, '125.0000000')
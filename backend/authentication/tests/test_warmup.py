@@ -0,0 +1,59 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+from authentication import warmup
+from authentication.warmup import warm_up, warm_worker
+
+
+class WarmUpTests(SimpleTestCase):
+    def test_runs_every_step(self):
+        timings = warm_up()
+
+        self.assertEqual(list(timings), [name for name, _ in warmup.STEPS])
+
+    def test_a_failing_step_is_logged_and_skipped(self):
+        steps = (('broken', mock.Mock(side_effect=ImportError('gone'))), ('next', mock.Mock()))
+        with mock.patch.object(warmup, 'STEPS', steps), self.assertLogs('authentication.warmup', 'WARNING'):
+            timings = warm_up()
+
+        self.assertEqual(list(timings), ['broken', 'next'])
+        steps[1][1].assert_called_once_with()
+
+
+@mock.patch('authentication.horizon.get_server')
+class WarmWorkerTests(SimpleTestCase):
+    @override_settings(STELLAR_WARMUP_HORIZON=False)
+    def test_builds_the_horizon_pool_without_calling_it(self, get_server):
+        warm_worker()
+
+        get_server.assert_called_once_with()
+        get_server.return_value.root.assert_not_called()
+
+    @override_settings(STELLAR_WARMUP_HORIZON=True)
+    def test_connects_to_horizon_in_the_background(self, get_server):
+        called = threading.Event()
+        get_server.return_value.root.return_value.call.side_effect = lambda: called.set()
+
+        warm_worker()
+
+        self.assertTrue(called.wait(5))
+
+    @override_settings(STELLAR_WARMUP_HORIZON=True)
+    def test_an_unreachable_horizon_only_logs(self, get_server):
+        failed = threading.Event()
+
+        def unreachable():
+            failed.set()
+            raise ConnectionError('Horizon unreachable')
+
+        get_server.return_value.root.return_value.call.side_effect = unreachable
+        with self.assertLogs('authentication.warmup', 'WARNING') as logs:
+            warm_worker()
+            self.assertTrue(failed.wait(5))
+            for thread in threading.enumerate():
+                if thread.name == 'horizon-warmup':
+                    thread.join(5)
+
+        self.assertIn('Horizon unreachable', logs.output[0])
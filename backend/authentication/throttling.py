@@ -0,0 +1,286 @@
+"""
+Admission control for the public endpoints
+
+Two limits, both kept in the shared cache so they hold across workers (with
+the default per-process cache each worker enforces them on its own):
+
+- Per client: every client (the signed-in wallet, otherwise the IP address,
+  see client_address) gets a token bucket per endpoint scope, sized and refilled from
+  settings.STELLAR_THROTTLE_RATES. Calls that find it empty get 429.
+- Upstream: one bucket of Horizon calls for the whole deployment that every
+  Horizon call spends from. Anonymous reads are low priority: they are only
+  admitted while more than STELLAR_HORIZON_BUDGET_RESERVE of it is left and
+  are otherwise shed with 429, leaving the rest to sign-ins, payments and
+  signed-in wallets. Sync views shed them at once, so no worker thread sleeps
+  on the budget; coroutine views first wait up to
+  STELLAR_HORIZON_BUDGET_QUEUE seconds for it. A 429 from Horizon sheds them
+  until its Retry-After has passed.
+
+Both rejections carry Retry-After. Buckets are GCRA: one theoretical arrival
+time per key, in microseconds, moved with the cache's atomic incr so
+concurrent requests never read-modify-write it (use a backend with an atomic
+incr, such as Redis).
+"""
+import asyncio
+import ipaddress
+import math
+import random
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import ADMISSION_REJECTIONS, InstrumentedAiohttpClient, InstrumentedRequestsClient
+from .tokens import request_public_key
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+# Bucket clock resolution; rates up to this many per second are exact
+TICKS_PER_SECOND = 1000000
+
+
+def parse_rate(rate):
+    """(requests, seconds) from DRF's '<requests>/<period>' form, e.g. '60/min'"""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def _now():
+    return int(time.time() * TICKS_PER_SECOND)
+
+
+def take(key, rate, burst, force=False):
+    """
+    Take a token from the bucket at `key`, which holds `burst` tokens and refills at `rate` per second
+    Returns 0 when it was taken, else the seconds until one will be; `force` takes it regardless
+    """
+    interval = TICKS_PER_SECOND / rate
+    increment = max(1, round(interval))
+    now = _now()
+    try:
+        tat = cache.incr(key, increment)
+    except ValueError:
+        tat = None
+    if tat is None or tat - increment < now:
+        # New or idle bucket: it is full, so its arrival time restarts from now
+        tat = now + increment
+        cache.set(key, tat, math.ceil(increment / TICKS_PER_SECOND) + 1)
+    else:
+        cache.touch(key, math.ceil((tat - now) / TICKS_PER_SECOND) + 1)
+
+    excess = tat - now - burst * interval
+    if excess <= 0 or force:
+        return 0
+    cache.decr(key, increment)
+    return excess / TICKS_PER_SECOND
+
+
+def _trusted_proxy(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(proxy, strict=False) for proxy in settings.STELLAR_TRUSTED_PROXIES)
+
+
+def client_address(request):
+    """
+    The client's IP address: REMOTE_ADDR, or X-Real-IP set by a trusted proxy
+    X-Forwarded-For is never read; a client can put anything in it.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    real_ip = request.META.get('HTTP_X_REAL_IP', '').strip()
+    if real_ip and _trusted_proxy(remote_addr):
+        return real_ip
+    return remote_addr
+
+
+def client_ident(request, public_key):
+    """The signed-in wallet, otherwise the client's address"""
+    return public_key or client_address(request)
+
+
+def client_wait(scope, ident):
+    """0 if the client may make a `scope` request now, else the seconds until it may"""
+    rate = settings.STELLAR_THROTTLE_RATES.get(scope) if settings.STELLAR_THROTTLE_ENABLED else None
+    if not rate:
+        return 0
+    count, period = parse_rate(rate)
+    wait = take(f'stellar:throttle:{scope}:{ident}', count / period, count)
+    if wait:
+        ADMISSION_REJECTIONS.labels(scope, 'client').inc()
+    return wait
+
+
+# -- Upstream budget ----------------------------------------------------------
+
+def _budget_key():
+    return f'stellar:horizon-budget:{settings.STELLAR_NETWORK}'
+
+
+def _backoff_key():
+    return f'{_budget_key()}:backoff'
+
+
+def spend_budget():
+    """Count one Horizon call against the shared budget"""
+    rate = settings.STELLAR_HORIZON_BUDGET_RATE
+    if rate > 0:
+        take(_budget_key(), rate, settings.STELLAR_HORIZON_BUDGET_BURST, force=True)
+
+
+def _retry_after(headers):
+    for name, value in (headers or {}).items():
+        if name.lower() == 'retry-after':
+            try:
+                return max(float(value), 1.0)
+            except ValueError:
+                break
+    return settings.STELLAR_HORIZON_RETRY_AFTER
+
+
+def note_rejection(response):
+    """Shed low-priority reads until Horizon's Retry-After after it answered 429"""
+    seconds = _retry_after(response.headers)
+    cache.set(_backoff_key(), time.time() + seconds, math.ceil(seconds))
+
+
+def budget_wait():
+    """0 if a low-priority read may call Horizon now, else the seconds until it may"""
+    budget_key, backoff_key = _budget_key(), _backoff_key()
+    entries = cache.get_many([budget_key, backoff_key])
+    wait = max(entries.get(backoff_key, 0) - time.time(), 0)
+
+    rate = settings.STELLAR_HORIZON_BUDGET_RATE
+    if rate > 0 and budget_key in entries:
+        burst = settings.STELLAR_HORIZON_BUDGET_BURST
+        left = burst - max(entries[budget_key] - _now(), 0) * rate / TICKS_PER_SECOND
+        # One token above the reserve, so the read itself does not dip into it
+        shortfall = burst * settings.STELLAR_HORIZON_BUDGET_RESERVE + 1 - left
+        wait = max(wait, shortfall / rate)
+    return wait
+
+
+def _queue_delay(wait):
+    """Sleep before checking the budget again; jittered so queued reads do not all wake at once"""
+    rate = settings.STELLAR_HORIZON_BUDGET_RATE
+    return wait + (random.uniform(0, 1 / rate) if rate > 0 else 0)
+
+
+def admit_read(scope):
+    """
+    0 if a low-priority read is admitted, else the seconds the client should wait
+    Never waits for budget: that would hold the worker thread while it refills
+    """
+    wait = budget_wait()
+    if wait > 0:
+        ADMISSION_REJECTIONS.labels(scope, 'upstream').inc()
+    return wait
+
+
+async def aadmit_read(scope):
+    """
+    admit_read for coroutine views, which first wait up to STELLAR_HORIZON_BUDGET_QUEUE seconds for budget
+    Queued reads hold no thread
+    """
+    deadline = time.monotonic() + settings.STELLAR_HORIZON_BUDGET_QUEUE
+    while True:
+        wait = await sync_to_async(budget_wait)()
+        if wait <= 0:
+            return 0
+        if time.monotonic() + wait > deadline:
+            ADMISSION_REJECTIONS.labels(scope, 'upstream').inc()
+            return wait
+        await asyncio.sleep(_queue_delay(wait))
+
+
+def horizon_retry_after(error):
+    """Seconds to tell the client to wait when `error` is Horizon's 429, else None"""
+    if getattr(error, 'status', None) != 429:
+        return None
+    backoff = cache.get(_backoff_key())
+    if backoff is not None and backoff > time.time():
+        return math.ceil(backoff - time.time())
+    return math.ceil(settings.STELLAR_HORIZON_RETRY_AFTER)
+
+
+# -- DRF ----------------------------------------------------------------------
+
+class UpstreamBusy(APIException):
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_detail = 'The Stellar network is busy. Please retry later.'
+    default_code = 'upstream_busy'
+
+    def __init__(self, wait):
+        super().__init__()
+        # DRF's exception handler turns this into the Retry-After header
+        self.wait = math.ceil(wait)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Per-client token bucket for views with a `throttle_scope`"""
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        if scope is None:
+            return True
+        self.delay = client_wait(scope, client_ident(request, request_public_key(request)))
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+class HorizonBudgetThrottle(BaseThrottle):
+    """Sheds anonymous requests to views with `horizon_reads` with 429 while the Horizon budget is low"""
+
+    def allow_request(self, request, view):
+        if not getattr(view, 'horizon_reads', False) or request_public_key(request):
+            return True
+        wait = admit_read(getattr(view, 'throttle_scope', None) or 'unscoped')
+        if wait:
+            raise UpstreamBusy(wait)
+        return True
+
+
+# -- Horizon clients ----------------------------------------------------------
+
+class BudgetedRequestsClient(InstrumentedRequestsClient):
+    """InstrumentedRequestsClient spending the Horizon budget on every call"""
+
+    def get(self, url, params=None):
+        spend_budget()
+        response = super().get(url, params)
+        if response.status_code == 429:
+            note_rejection(response)
+        return response
+
+    def post(self, url, data=None, json_data=None):
+        spend_budget()
+        response = super().post(url, data, json_data)
+        if response.status_code == 429:
+            note_rejection(response)
+        return response
+
+
+class BudgetedAiohttpClient(InstrumentedAiohttpClient):
+    """InstrumentedAiohttpClient spending the Horizon budget on every call"""
+
+    async def get(self, url, params=None):
+        if settings.STELLAR_HORIZON_BUDGET_RATE > 0:
+            await sync_to_async(spend_budget)()
+        response = await super().get(url, params)
+        if response.status_code == 429:
+            await sync_to_async(note_rejection)(response)
+        return response
+
+    async def post(self, url, data=None, json_data=None):
+        if settings.STELLAR_HORIZON_BUDGET_RATE > 0:
+            await sync_to_async(spend_budget)()
+        response = await super().post(url, data, json_data)
+        if response.status_code == 429:
+            await sync_to_async(note_rejection)(response)
+        return response
@@ -0,0 +1,167 @@
+"""
+Signed bearer tokens
+
+After a successful sign-in the client gets a short-lived access token and a
+longer-lived refresh token: HS256 JWTs (SEP-10 style, ``sub`` is the wallet's
+public key) signed with settings.STELLAR_JWT_SECRET. Validating an access
+token is an HMAC and a cache lookup for revoked token ids, with no database
+or session-table query.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import authentication, exceptions
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+_HEADER = {'alg': 'HS256', 'typ': 'JWT'}
+
+
+class TokenError(Exception):
+    """A token that is malformed, forged, expired, revoked or of the wrong type"""
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def _b64decode(segment):
+    return base64.urlsafe_b64decode(segment + b'=' * (-len(segment) % 4))
+
+
+def _sign(signing_input):
+    return hmac.new(settings.STELLAR_JWT_SECRET.encode(), signing_input, hashlib.sha256).digest()
+
+
+def encode_token(public_key, token_type, ttl):
+    """Signed JWT for `public_key` valid for `ttl` seconds"""
+    now = int(time.time())
+    claims = {
+        'iss': settings.STELLAR_JWT_ISSUER,
+        'sub': public_key,
+        'iat': now,
+        'exp': now + ttl,
+        'jti': secrets.token_urlsafe(16),
+        'typ': token_type,
+    }
+    signing_input = b'.'.join(
+        _b64encode(json.dumps(part, separators=(',', ':')).encode()) for part in (_HEADER, claims)
+    )
+    return (signing_input + b'.' + _b64encode(_sign(signing_input))).decode()
+
+
+def _revoked_key(jti):
+    return f'stellar:revoked-token:{jti}'
+
+
+def decode_token(token, token_type=ACCESS):
+    """Return the claims of a valid, unrevoked token of `token_type`"""
+    try:
+        header, payload, signature = token.encode().split(b'.')
+        if not hmac.compare_digest(_b64decode(signature), _sign(header + b'.' + payload)):
+            raise TokenError('Invalid token signature')
+        if json.loads(_b64decode(header)).get('alg') != 'HS256':
+            raise TokenError('Unsupported token algorithm')
+        claims = json.loads(_b64decode(payload))
+    except TokenError:
+        raise
+    except (ValueError, TypeError):
+        raise TokenError('Malformed token')
+
+    if claims.get('typ') != token_type:
+        raise TokenError(f'Expected a {token_type} token')
+    if claims.get('iss') != settings.STELLAR_JWT_ISSUER:
+        raise TokenError('Token issued by another server')
+    if claims.get('exp', 0) <= time.time():
+        raise TokenError('Token expired')
+    if cache.get(_revoked_key(claims.get('jti'))):
+        raise TokenError('Token revoked')
+    return claims
+
+
+def revoke_token(claims):
+    """Add a token's id to the revocation list until the token would expire anyway"""
+    remaining = int(claims['exp'] - time.time())
+    if remaining > 0:
+        cache.set(_revoked_key(claims['jti']), True, timeout=remaining)
+
+
+def claim_token(claims):
+    """
+    Revoke a token in one atomic step; False if it already was
+    Of concurrent requests presenting the same token, exactly one claims it
+    """
+    remaining = int(claims['exp'] - time.time())
+    return remaining > 0 and cache.add(_revoked_key(claims['jti']), True, timeout=remaining)
+
+
+def issue_tokens(public_key):
+    """Access and refresh tokens for a wallet that just signed in"""
+    return {
+        'access_token': encode_token(public_key, ACCESS, settings.STELLAR_JWT_ACCESS_TTL),
+        'refresh_token': encode_token(public_key, REFRESH, settings.STELLAR_JWT_REFRESH_TTL),
+        'token_type': 'Bearer',
+        'expires_in': settings.STELLAR_JWT_ACCESS_TTL,
+    }
+
+
+def bearer_token(request):
+    """Token from an ``Authorization: Bearer`` header, or None"""
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    return token.strip()
+
+
+class TokenUser:
+    """Authenticated wallet built from token claims; no database row is loaded"""
+    is_authenticated = True
+    is_anonymous = False
+    is_active = True
+    is_staff = False
+    is_superuser = False
+
+    def __init__(self, claims):
+        self.public_key = claims['sub']
+        self.pk = self.id = None
+        self.username = self.public_key[:10]
+
+    def __str__(self):
+        return self.public_key
+
+
+class WalletTokenAuthentication(authentication.BaseAuthentication):
+    """DRF authentication for ``Authorization: Bearer <access token>``"""
+
+    def authenticate(self, request):
+        token = bearer_token(request)
+        if token is None:
+            return None
+        try:
+            claims = decode_token(token, ACCESS)
+        except TokenError as e:
+            raise exceptions.AuthenticationFailed(str(e))
+        return TokenUser(claims), claims
+
+    def authenticate_header(self, request):
+        return 'Bearer'
+
+
+def request_public_key(request):
+    """
+    Public key of the signed-in wallet, from the bearer token or the session
+    DRF requests only; `request.auth` holds the token claims when one was used
+    """
+    claims = request.auth
+    if isinstance(claims, dict) and 'sub' in claims:
+        return claims['sub']
+    if not request.session.get('authenticated'):
+        return None
+    return request.session.get('wallet_public_key')
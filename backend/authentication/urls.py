@@ -1,24 +1,59 @@
+from django.conf import settings
 from django.urls import path
+from . import async_views
 from .views import (
     WalletConnectView, 
     VerifySignatureView, 
     WalletInfoView, 
     LogoutView,
+    TokenRefreshView,
     WalletBalanceView,
+    BulkBalanceView,
+    PortfolioView,
     SendPaymentView,
-    TransactionHistoryView
+    PaymentJobView,
+    BulkPaymentView,
+    FeeStatsView,
+    AccountEventsView,
+    TransactionHistoryView,
+    TransactionExportView
 )
 
+if settings.STELLAR_ASYNC_VIEWS:
+    # Coroutine views for ASGI workers (see async_views)
+    wallet_balance_view = async_views.wallet_balance
+    send_payment_view = async_views.send_payment
+    transaction_history_view = async_views.transaction_history
+    account_events_view = async_views.account_events
+    transaction_export_view = async_views.export_transactions
+else:
+    wallet_balance_view = WalletBalanceView.as_view()
+    send_payment_view = SendPaymentView.as_view()
+    transaction_history_view = TransactionHistoryView.as_view()
+    account_events_view = AccountEventsView.as_view()
+    transaction_export_view = TransactionExportView.as_view()
+
 urlpatterns = [
     path('connect/', WalletConnectView.as_view(), name='wallet-connect'),
     path('verify/', VerifySignatureView.as_view(), name='verify-signature'),
     path('wallet/', WalletInfoView.as_view(), name='wallet-info'),
     path('logout/', LogoutView.as_view(), name='logout'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
     
     # Stellar blockchain operations
-    path('balance/', WalletBalanceView.as_view(), name='wallet-balance'),
-    path('balance/<str:public_key>/', WalletBalanceView.as_view(), name='wallet-balance-by-key'),
-    path('payment/', SendPaymentView.as_view(), name='send-payment'),
-    path('transactions/', TransactionHistoryView.as_view(), name='transaction-history'),
-    path('transactions/<str:public_key>/', TransactionHistoryView.as_view(), name='transaction-history-by-key'),
+    path('balance/', wallet_balance_view, name='wallet-balance'),
+    path('balance/<str:public_key>/', wallet_balance_view, name='wallet-balance-by-key'),
+    path('balances/', BulkBalanceView.as_view(), name='bulk-balance'),
+    path('portfolio/', PortfolioView.as_view(), name='portfolio'),
+    path('portfolio/<str:public_key>/', PortfolioView.as_view(), name='portfolio-by-key'),
+    path('payment/', send_payment_view, name='send-payment'),
+    path('payment/jobs/<uuid:job_id>/', PaymentJobView.as_view(), name='payment-job'),
+    path('payment/bulk/', BulkPaymentView.as_view(), name='bulk-payment'),
+    path('fees/', FeeStatsView.as_view(), name='fee-stats'),
+    path('events/', account_events_view, name='account-events'),
+    path('transactions/', transaction_history_view, name='transaction-history'),
+    # Before transactions/<public_key>/, which would take 'export' for a key
+    path('transactions/export/', transaction_export_view, name='transaction-export'),
+    path('transactions/<str:public_key>/export/', transaction_export_view, name='transaction-export-by-key'),
+    path('transactions/<str:public_key>/', transaction_history_view, name='transaction-history-by-key'),
 ]
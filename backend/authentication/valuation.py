@@ -0,0 +1,161 @@
+"""
+Portfolio valuation
+
+Values account balances in XLM or another reference asset. Each asset is
+priced by a quote: what a strict-send path payment of a fixed probe amount
+would deliver in the reference asset, or the best bid on the asset's order
+book when no path exists. Quotes depend only on the asset pair, so they are
+cached per pair for a short TTL and shared by every account and process, and
+a request looks up each distinct asset once however many accounts hold it.
+
+A quote is a unit price at the probe amount; balances far larger than the
+probe are valued without the slippage a real sale of that size would see.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from stellar_sdk import Asset
+
+from . import cache
+from .metrics import bind_request
+
+# Values are reported with Stellar's 7 decimal places
+STROOP = Decimal('0.0000001')
+
+
+def parse_asset(text):
+    """Asset from 'XLM' (or 'native') or 'CODE:ISSUER'; raises ValueError"""
+    if text in ('XLM', 'native'):
+        return Asset.native()
+    code, _, issuer = text.partition(':')
+    if not issuer:
+        raise ValueError("Reference asset must be 'XLM' or 'CODE:ISSUER'")
+    # Asset() validates the code and issuer
+    return Asset(code, issuer)
+
+
+def asset_id(asset):
+    """'XLM' or 'CODE:ISSUER', the form parse_asset reads"""
+    return 'XLM' if asset.is_native() else f'{asset.code}:{asset.issuer}'
+
+
+def balance_asset_id(balance):
+    """asset_id of a shaped balance, or None for balances that are not tradable assets (pool shares)"""
+    if balance['asset_type'] == 'native':
+        return 'XLM'
+    if not balance.get('asset_issuer') or balance['asset_type'] not in ('credit_alphanum4', 'credit_alphanum12'):
+        return None
+    return f"{balance['asset_code']}:{balance['asset_issuer']}"
+
+
+def quote_cache_key(source, reference):
+    return f'stellar:quote:{settings.STELLAR_NETWORK}:{asset_id(source)}:{asset_id(reference)}'
+
+
+def fetch_quote(server, source, reference):
+    """
+    {'price': str or None, 'method': 'path', 'order_book' or None} for one unit of `source`
+    Strict-send paths at the probe amount first, then the order book's best bid
+    """
+    probe = Decimal(settings.STELLAR_VALUATION_PROBE_AMOUNT)
+    page = server.strict_send_paths(source, probe, [reference]).call()
+    amounts = [Decimal(record['destination_amount']) for record in page['_embedded']['records']]
+    if amounts:
+        return {'price': str(max(amounts) / probe), 'method': 'path'}
+
+    book = server.orderbook(source, reference).limit(1).call()
+    if book['bids']:
+        return {'price': book['bids'][0]['price'], 'method': 'order_book'}
+    return {'price': None, 'method': None}
+
+
+def get_quote(server, source, reference):
+    """(quote, hit, age) for an asset pair, through the shared quote cache"""
+    if source == reference:
+        return {'price': '1', 'method': 'identity'}, True, 0.0
+    return cache.get_or_load(
+        quote_cache_key(source, reference),
+        lambda: fetch_quote(server, source, reference),
+        settings.STELLAR_VALUATION_QUOTE_TTL,
+        settings.STELLAR_VALUATION_QUOTE_STALE_TTL,
+    )
+
+
+def _quote_asset(server, asset_key, reference):
+    return get_quote(server, parse_asset(asset_key), reference)
+
+
+def quote_balances(server, balance_lists, reference, concurrency):
+    """
+    {asset_id: (quote, hit, age) or the exception raised} for every asset in `balance_lists`
+    Each distinct asset is looked up once, with at most `concurrency` lookups in flight
+    """
+    distinct = {
+        asset_key
+        for balances in balance_lists
+        for asset_key in map(balance_asset_id, balances)
+        if asset_key is not None
+    }
+    if not distinct:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(concurrency, len(distinct))) as executor:
+        futures = {
+            asset_key: executor.submit(bind_request(_quote_asset), server, asset_key, reference)
+            for asset_key in distinct
+        }
+    quotes = {}
+    for asset_key, future in futures.items():
+        try:
+            quotes[asset_key] = future.result()
+        except Exception as e:
+            quotes[asset_key] = e
+    return quotes
+
+
+def quote_data(quotes):
+    """Response form of quote_balances results"""
+    data = {}
+    for asset_key, quote in sorted(quotes.items()):
+        if isinstance(quote, Exception):
+            data[asset_key] = {'error': f'Failed to fetch quote: {quote}'}
+        else:
+            quote, hit, age = quote
+            data[asset_key] = {
+                'price': quote['price'], 'method': quote['method'], 'cached': hit, 'age': round(age, 3)
+            }
+    return data
+
+
+def _amount(value):
+    return f'{value.quantize(STROOP):f}'
+
+
+def total_amount(amounts):
+    """Sum of amount strings, with Stellar's 7 decimal places"""
+    return _amount(sum((Decimal(amount) for amount in amounts), Decimal(0)))
+
+
+def value_balances(balances, quotes):
+    """
+    Shaped balances with their price and value in the reference asset, and the account total
+    Balances without a price get null price and value and are left out of the total
+    """
+    rows = []
+    total = Decimal(0)
+    for balance in balances:
+        quote = quotes.get(balance_asset_id(balance))
+        price = value = None
+        if quote is not None and not isinstance(quote, Exception) and quote[0]['price'] is not None:
+            price = Decimal(quote[0]['price'])
+            value = Decimal(balance['balance']) * price
+            total += value
+        rows.append({
+            'asset_code': balance['asset_code'],
+            'asset_type': balance['asset_type'],
+            'asset_issuer': balance.get('asset_issuer'),
+            'balance': balance['balance'],
+            'price': None if price is None else _amount(price),
+            'value': None if value is None else _amount(value),
+        })
+    return rows, _amount(total)
@@ -2,33 +2,127 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny
+from rest_framework.renderers import JSONRenderer
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
+import base64
+import binascii
+import csv
+import functools
+import time
 import secrets
 import hashlib
-from stellar_sdk import Keypair, Network, TransactionBuilder, Server, Asset
-from stellar_sdk.exceptions import BadSignatureError, NotFoundError
+from stellar_sdk import Keypair
+from stellar_sdk.exceptions import BadSignatureError, NotFoundError, Ed25519PublicKeyInvalidError
 from decimal import Decimal
 
-from .models import StellarWallet, AuthenticationSession
+from .balances import get_balances, get_many_balances, invalidate_balances
+from .challenges import ChallengeError, claim_nonce, is_stateless, issue_challenge, read_challenge
+from .conditional import balances_etag, history_etag, not_modified, set_validators
+from .db import read_only
+from .export import CSVRenderer, NDJSONRenderer, export_response
+from .fees import PERCENTILES, get_fee_oracle
+from .history import fetch_history, fetch_indexed_history, iter_history, page_cursors, page_link
+from .horizon import get_server
+from .jobs import get_payment_queue
+from .metrics import phase
+from .models import StellarWallet, AuthenticationSession, PaymentJob, challenge_digest
+from .payments import PaymentError, SubmissionUncertain, build_asset, submit_payments
+from .payouts import PayoutRun, read_csv_rows
+from .push import EventStreamRenderer
 from .serializers import (
     WalletConnectSerializer, 
     SignatureVerifySerializer, 
     WalletSerializer,
     BalanceSerializer,
+    BulkBalanceRequestSerializer,
+    BulkPaymentSerializer,
+    HistoryExportQuerySerializer,
+    HistoryQuerySerializer,
+    PaymentJobSerializer,
     PaymentSerializer,
+    PortfolioQuerySerializer,
+    PortfolioRequestSerializer,
+    TokenRefreshSerializer,
     TransactionSerializer
 )
+from .snapshots import mark_active, read_snapshot, read_snapshots, snapshot_age, snapshot_history
+from .throttling import admit_read, horizon_retry_after
+from .tokens import (
+    REFRESH, TokenError, claim_token, decode_token, issue_tokens, request_public_key, revoke_token
+)
+from .valuation import asset_id, quote_balances, quote_data, total_amount, value_balances
 from django.conf import settings
 
 
+def get_or_create_wallet(public_key):
+    """Wallet for a public key, creating its user on first sign-in"""
+    user, created = User.objects.get_or_create(
+        username=public_key[:10],  # Use first 10 chars as username
+        defaults={'username': public_key[:10]}
+    )
+    wallet, wallet_created = StellarWallet.objects.get_or_create(
+        public_key=public_key,
+        defaults={'user': user}
+    )
+    return wallet
+
+
+def verify_signature(public_key, challenge, signature):
+    """Raise BadSignatureError unless `signature` (base64) is `public_key`'s signature of `challenge`"""
+    try:
+        signature_bytes = base64.b64decode(signature, validate=True)
+    except (binascii.Error, ValueError):
+        raise BadSignatureError('Signature is not valid base64')
+    Keypair.from_public_key(public_key).verify(challenge.encode(), signature_bytes)
+
+
+def fetch_many_balances(public_keys):
+    """
+    {public_key: (balances, hit, age) or the exception} for many accounts
+    Accounts with a snapshot are answered from one query; Horizon only sees the rest
+    """
+    fetched = {}
+    valid_keys = []
+    for public_key in public_keys:
+        try:
+            Keypair.from_public_key(public_key)
+            valid_keys.append(public_key)
+        except Ed25519PublicKeyInvalidError as e:
+            fetched[public_key] = e
+    
+    for public_key, snapshot in read_snapshots(valid_keys).items():
+        fetched[public_key] = (snapshot.balances, True, snapshot_age(snapshot))
+    fetched.update(get_many_balances(
+        get_server(),
+        [public_key for public_key in valid_keys if public_key not in fetched],
+        concurrency=settings.STELLAR_BULK_BALANCE_CONCURRENCY,
+        timeout=settings.STELLAR_BULK_BALANCE_TIMEOUT
+    ))
+    return fetched
+
+
+def balance_error(result):
+    """Error message for a failed fetch_many_balances result, or None"""
+    if isinstance(result, Ed25519PublicKeyInvalidError):
+        return 'Invalid Stellar public key format'
+    if isinstance(result, NotFoundError):
+        return 'Account not found on Stellar network. Account may not be funded yet.'
+    if isinstance(result, Exception):
+        return f'Failed to fetch balance: {result}'
+    return None
+
+
 class WalletConnectView(APIView):
     """
     Endpoint to initiate wallet connection
     Returns a challenge message that user needs to sign with their wallet
     """
     permission_classes = [AllowAny]
+    throttle_scope = 'connect'
     
     def post(self, request):
         serializer = WalletConnectSerializer(data=request.data)
@@ -46,20 +140,22 @@ class WalletConnectView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        if settings.STELLAR_STATELESS_CHALLENGES:
+            # Signed, self-contained challenge: nothing is stored until verification
+            challenge_message, nonce, expires_at = issue_challenge(public_key)
+            return Response({
+                'challenge': challenge_message,
+                'session_key': nonce,
+                'public_key': public_key,
+                'expires_at': expires_at.isoformat()
+            }, status=status.HTTP_200_OK)
+        
         # Generate a random challenge
         challenge = secrets.token_urlsafe(32)
         challenge_message = f"Sign this message to authenticate with Stellar App: {challenge}"
         
         # Get or create user and wallet
-        user, created = User.objects.get_or_create(
-            username=public_key[:10],  # Use first 10 chars as username
-            defaults={'username': public_key[:10]}
-        )
-        
-        wallet, wallet_created = StellarWallet.objects.get_or_create(
-            public_key=public_key,
-            defaults={'user': user}
-        )
+        wallet = get_or_create_wallet(public_key)
         
         # Create authentication session
         session_key = secrets.token_urlsafe(32)
@@ -95,12 +191,17 @@ class VerifySignatureView(APIView):
         signature = serializer.validated_data['signature']
         challenge = serializer.validated_data['challenge']
         
+        if is_stateless(challenge):
+            return self._verify_stateless(request, public_key, signature, challenge)
+        
         try:
             # Find the wallet
             wallet = StellarWallet.objects.get(public_key=public_key)
             
-            # Find active session
+            # Find active session (by the indexed digest; the challenge itself guards against collisions).
+            # Sessions saved before the digest column was added have it empty.
             auth_session = AuthenticationSession.objects.filter(
+                challenge_digest__in=[challenge_digest(challenge), ''],
                 wallet=wallet,
                 challenge=challenge,
                 is_verified=False,
@@ -115,37 +216,35 @@ class VerifySignatureView(APIView):
             
             # Verify signature
             try:
-                keypair = Keypair.from_public_key(public_key)
-                # In production, you would verify the actual signature here
-                # For now, we'll accept any signature (you need to implement proper verification)
-                # keypair.verify(challenge.encode(), bytes.fromhex(signature))
-                
-                # Mark session as verified
-                auth_session.signature = signature
-                auth_session.is_verified = True
-                auth_session.save()
-                
-                # Update wallet last login
-                wallet.last_login = timezone.now()
-                wallet.save()
-                
-                # Create Django session
-                request.session['wallet_public_key'] = public_key
-                request.session['authenticated'] = True
-                
-                return Response({
-                    'success': True,
-                    'message': 'Authentication successful',
-                    'wallet': WalletSerializer(wallet).data,
-                    'session_key': auth_session.session_key
-                }, status=status.HTTP_200_OK)
-                
+                verify_signature(public_key, challenge, signature)
             except BadSignatureError:
                 return Response(
                     {'error': 'Invalid signature'},
-                    status=status.HTTP_400_BAD_REQUEST
+                    status=status.HTTP_401_UNAUTHORIZED
                 )
             
+            # Mark session as verified
+            auth_session.signature = signature
+            auth_session.is_verified = True
+            auth_session.save()
+            
+            # Update wallet last login
+            wallet.last_login = timezone.now()
+            wallet.save()
+            mark_active(public_key)
+            
+            # Create Django session
+            request.session['wallet_public_key'] = public_key
+            request.session['authenticated'] = True
+            
+            return Response({
+                'success': True,
+                'message': 'Authentication successful',
+                'wallet': WalletSerializer(wallet).data,
+                'session_key': auth_session.session_key,
+                **issue_tokens(public_key)
+            }, status=status.HTTP_200_OK)
+            
         except StellarWallet.DoesNotExist:
             return Response(
                 {'error': 'Wallet not found'},
@@ -156,6 +255,59 @@ class VerifySignatureView(APIView):
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+    
+    def _verify_stateless(self, request, public_key, signature, challenge):
+        """Verify a signed challenge; the wallet and session rows are written only on success"""
+        try:
+            nonce = read_challenge(challenge, public_key)
+        except ChallengeError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Before claiming the nonce, so a forged attempt cannot burn the wallet's challenge
+        try:
+            verify_signature(public_key, challenge, signature)
+        except BadSignatureError:
+            return Response({'error': 'Invalid signature'}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # Each challenge verifies once
+        if not claim_nonce(nonce):
+            return Response(
+                {'error': 'Challenge already used'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            wallet = get_or_create_wallet(public_key)
+            auth_session = AuthenticationSession.objects.create(
+                wallet=wallet,
+                session_key=nonce,
+                challenge=challenge,
+                signature=signature,
+                is_verified=True,
+                expires_at=timezone.now() + timedelta(seconds=settings.STELLAR_CHALLENGE_TTL)
+            )
+            
+            # Update wallet last login
+            wallet.last_login = timezone.now()
+            wallet.save()
+            mark_active(public_key)
+        except Exception as e:
+            return Response(
+                {'error': str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        # Create Django session
+        request.session['wallet_public_key'] = public_key
+        request.session['authenticated'] = True
+        
+        return Response({
+            'success': True,
+            'message': 'Authentication successful',
+            'wallet': WalletSerializer(wallet).data,
+            'session_key': auth_session.session_key,
+            **issue_tokens(public_key)
+        }, status=status.HTTP_200_OK)
 
 
 class WalletInfoView(APIView):
@@ -163,16 +315,21 @@ class WalletInfoView(APIView):
     Get current wallet information
     """
     def get(self, request):
-        if not request.session.get('authenticated'):
+        public_key = request_public_key(request)
+        if not public_key:
             return Response(
                 {'error': 'Not authenticated'},
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
-        public_key = request.session.get('wallet_public_key')
-        
+        wallets = StellarWallet.objects.select_related('user')
         try:
-            wallet = StellarWallet.objects.get(public_key=public_key)
+            # Read-only: served by the replica when one is configured
+            with read_only():
+                wallet = wallets.filter(public_key=public_key).first()
+            if wallet is None:
+                # A wallet created moments ago may not have replicated yet
+                wallet = wallets.get(public_key=public_key)
             return Response(WalletSerializer(wallet).data)
         except StellarWallet.DoesNotExist:
             return Response(
@@ -186,65 +343,102 @@ class LogoutView(APIView):
     Logout endpoint
     """
     def post(self, request):
+        # Bearer tokens stay valid until they expire unless revoked
+        if isinstance(request.auth, dict):
+            revoke_token(request.auth)
+        refresh_token = request.data.get('refresh_token')
+        if refresh_token:
+            try:
+                revoke_token(decode_token(refresh_token, REFRESH))
+            except TokenError:
+                pass
         request.session.flush()
         return Response({'message': 'Logged out successfully'})
 
 
+class TokenRefreshView(APIView):
+    """
+    Exchange a refresh token for a new access and refresh token pair
+    The presented refresh token is revoked, so each one works once
+    """
+    permission_classes = [AllowAny]
+    authentication_classes = []
+    
+    def post(self, request):
+        serializer = TokenRefreshSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            claims = decode_token(serializer.validated_data['refresh_token'], REFRESH)
+        except TokenError as e:
+            return Response({'error': str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        # Checked and revoked in one step: a concurrent refresh with the same token loses
+        if not claim_token(claims):
+            return Response({'error': 'Token revoked'}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(issue_tokens(claims['sub']), status=status.HTTP_200_OK)
+
+
 class WalletBalanceView(APIView):
     """
     Get wallet balance from Stellar network
     Shows XLM and all other asset balances
     """
     permission_classes = [AllowAny]
+    throttle_scope = 'balance'
+    horizon_reads = True
     
     def get(self, request, public_key=None):
-        # Use public_key from URL parameter or from session
+        # Use public_key from URL parameter, bearer token or session
+        per_wallet = not public_key
         if not public_key:
-            if not request.session.get('authenticated'):
+            public_key = request_public_key(request)
+            if not public_key:
                 return Response(
                     {'error': 'Not authenticated'},
                     status=status.HTTP_401_UNAUTHORIZED
                 )
-            public_key = request.session.get('wallet_public_key')
         
         try:
             # Validate public key format
             Keypair.from_public_key(public_key)
             
-            # Connect to Stellar network (use testnet or mainnet)
-            server = Server(horizon_url="https://horizon-testnet.stellar.org")
-            # For mainnet use: Server(horizon_url="https://horizon.stellar.org")
-            
-            # Get account details
-            account = server.accounts().account_id(public_key).call()
+            # Shared Horizon client for this worker (settings.STELLAR_HORIZON_URL)
+            server = get_server()
             
-            # Extract balances
-            balances = []
-            for balance in account['balances']:
-                balance_data = {
-                    'asset_type': balance['asset_type'],
-                    'balance': balance['balance'],
-                }
-                
-                if balance['asset_type'] == 'native':
-                    balance_data['asset_code'] = 'XLM'
-                    balance_data['asset_issuer'] = None
-                else:
-                    balance_data['asset_code'] = balance.get('asset_code', 'UNKNOWN')
-                    balance_data['asset_issuer'] = balance.get('asset_issuer', None)
-                
-                balances.append(balance_data)
+            # Get account balances from the account's snapshot, or cached per account (see balances.get_balances)
+            snapshot = read_snapshot(public_key)
+            if snapshot is not None:
+                balances, cached, cache_age = snapshot.balances, True, snapshot_age(snapshot)
+            else:
+                balances, cached, cache_age = get_balances(server, public_key)
             
-            # Serialize the data
-            serializer = BalanceSerializer(balances, many=True)
+            # Unchanged since the client's copy: skip serialising altogether
+            etag = balances_etag(public_key, balances)
+            unchanged = not_modified(request, etag, per_wallet)
+            if unchanged is not None:
+                return unchanged
             
-            return Response({
+            # Serialize the data (plain dicts from Horizon, see FastRepresentationMixin)
+            response = Response({
                 'public_key': public_key,
-                'balances': serializer.data,
-                'total_assets': len(balances)
+                'balances': BalanceSerializer.represent(balances),
+                'total_assets': len(balances),
+                'cached': cached,
+                'cache_age': round(cache_age, 3)
             }, status=status.HTTP_200_OK)
+            return set_validators(response, etag, per_wallet)
             
         except Exception as e:
+            # Horizon is rate limiting us: tell the client when to come back instead of failing
+            retry_after = horizon_retry_after(e)
+            if retry_after is not None:
+                return Response(
+                    {'error': 'Stellar network is busy. Please retry later.'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': str(retry_after)}
+                )
             error_message = str(e)
             if "Resource Missing" in error_message or "404" in error_message:
                 return Response(
@@ -257,12 +451,160 @@ class WalletBalanceView(APIView):
             )
 
 
+class AccountEventsView(APIView):
+    """
+    Live updates are only served by the async views (async_views.account_events)
+    A stream stays open for up to STELLAR_PUSH_MAX_AGE seconds: on a sync
+    worker it would hold the worker until gunicorn's timeout killed it
+    """
+    permission_classes = [AllowAny]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+    
+    def get(self, request):
+        return Response(
+            {'error': 'Live updates need the async views (SERVER_MODE=asgi)'},
+            status=status.HTTP_501_NOT_IMPLEMENTED
+        )
+
+
+class BulkBalanceView(APIView):
+    """
+    Get balances for many Stellar accounts in one request
+    Returns partial results; failures are reported per key
+    """
+    permission_classes = [AllowAny]
+    throttle_scope = 'bulk_balance'
+    horizon_reads = True
+    
+    def post(self, request):
+        serializer = BulkBalanceRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Keep request order, drop duplicates
+        public_keys = list(dict.fromkeys(serializer.validated_data['public_keys']))
+        fetched = fetch_many_balances(public_keys)
+        
+        accounts = []
+        for public_key in public_keys:
+            result = fetched[public_key]
+            error = balance_error(result)
+            if error is not None:
+                accounts.append({'public_key': public_key, 'error': error})
+            else:
+                balances, cached, cache_age = result
+                accounts.append({
+                    'public_key': public_key,
+                    'balances': BalanceSerializer.represent(balances),
+                    'total_assets': len(balances),
+                    'cached': cached,
+                    'cache_age': round(cache_age, 3)
+                })
+        
+        failed = sum(1 for account in accounts if 'error' in account)
+        return Response({
+            'accounts': accounts,
+            'total_accounts': len(accounts),
+            'failed': failed
+        }, status=status.HTTP_200_OK)
+
+
+class PortfolioView(APIView):
+    """
+    Value account balances in XLM or a reference asset (?asset=CODE:ISSUER)
+    GET values one account; POST {"public_keys": [...], "asset": ...} values many.
+    Each distinct asset is quoted once per request, through the shared quote cache
+    """
+    permission_classes = [AllowAny]
+    throttle_scope = 'portfolio'
+    horizon_reads = True
+    
+    def get(self, request, public_key=None):
+        # Use public_key from URL parameter, bearer token or session
+        if not public_key:
+            public_key = request_public_key(request)
+            if not public_key:
+                return Response(
+                    {'error': 'Not authenticated'},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+        
+        query = PortfolioQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        reference = query.validated_data['asset']
+        
+        result = fetch_many_balances([public_key])[public_key]
+        if isinstance(result, Ed25519PublicKeyInvalidError):
+            return Response({'error': balance_error(result)}, status=status.HTTP_400_BAD_REQUEST)
+        if isinstance(result, NotFoundError):
+            return Response({'error': balance_error(result)}, status=status.HTTP_404_NOT_FOUND)
+        if isinstance(result, Exception):
+            return Response({'error': balance_error(result)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        
+        balances = result[0]
+        quotes = quote_balances(get_server(), [balances], reference, settings.STELLAR_VALUATION_CONCURRENCY)
+        rows, total_value = value_balances(balances, quotes)
+        return Response({
+            'public_key': public_key,
+            'asset': asset_id(reference),
+            'balances': rows,
+            'total_value': total_value,
+            'quotes': quote_data(quotes)
+        }, status=status.HTTP_200_OK)
+    
+    def post(self, request):
+        serializer = PortfolioRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        reference = serializer.validated_data['asset']
+        
+        # Keep request order, drop duplicates
+        public_keys = list(dict.fromkeys(serializer.validated_data['public_keys']))
+        fetched = fetch_many_balances(public_keys)
+        
+        # One lookup per distinct asset across every account
+        quotes = quote_balances(
+            get_server(),
+            [result[0] for result in fetched.values() if not isinstance(result, Exception)],
+            reference,
+            settings.STELLAR_VALUATION_CONCURRENCY
+        )
+        
+        accounts = []
+        for public_key in public_keys:
+            result = fetched[public_key]
+            error = balance_error(result)
+            if error is not None:
+                accounts.append({'public_key': public_key, 'error': error})
+            else:
+                rows, total_value = value_balances(result[0], quotes)
+                accounts.append({'public_key': public_key, 'balances': rows, 'total_value': total_value})
+        
+        failed = sum(1 for account in accounts if 'error' in account)
+        return Response({
+            'asset': asset_id(reference),
+            'accounts': accounts,
+            'total_value': total_amount(account['total_value'] for account in accounts if 'error' not in account),
+            'total_accounts': len(accounts),
+            'failed': failed,
+            'quotes': quote_data(quotes)
+        }, status=status.HTTP_200_OK)
+
+
 class SendPaymentView(APIView):
     """
     Send XLM or other assets to another Stellar account
+    With ?async=1 (or STELLAR_PAYMENT_ASYNC) the payment is queued and 202 returns a job id
     """
     permission_classes = [AllowAny]
     
+    def _use_queue(self, request):
+        flag = request.query_params.get('async')
+        if flag is None:
+            return settings.STELLAR_PAYMENT_ASYNC
+        return flag.lower() in ('1', 'true', 'yes')
+    
     def post(self, request):
         serializer = PaymentSerializer(data=request.data)
         if not serializer.is_valid():
@@ -274,57 +616,50 @@ class SendPaymentView(APIView):
         asset_issuer = serializer.validated_data.get('asset_issuer')
         memo_text = serializer.validated_data.get('memo', '')
         secret_key = serializer.validated_data['secret_key']
+        base_fee = serializer.validated_data.get('base_fee')
+        max_fee = serializer.validated_data.get('max_fee')
         
         try:
             # Create keypair from secret key
             source_keypair = Keypair.from_secret(secret_key)
             source_public_key = source_keypair.public_key
             
-            # Connect to Stellar network
-            server = Server(horizon_url="https://horizon-testnet.stellar.org")
-            # For mainnet use: Server(horizon_url="https://horizon.stellar.org")
-            network_passphrase = Network.TESTNET_NETWORK_PASSPHRASE
-            # For mainnet use: Network.PUBLIC_NETWORK_PASSPHRASE
-            
-            # Load source account
-            source_account = server.load_account(source_public_key)
-            
             # Determine asset
-            if asset_code == 'XLM':
-                asset = Asset.native()
-            else:
-                if not asset_issuer:
-                    return Response(
-                        {'error': 'asset_issuer is required for non-XLM assets'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                asset = Asset(asset_code, asset_issuer)
+            try:
+                asset = build_asset(asset_code, asset_issuer)
+            except PaymentError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             
-            # Build transaction
-            transaction = (
-                TransactionBuilder(
-                    source_account=source_account,
-                    network_passphrase=network_passphrase,
-                    base_fee=100
-                )
-                .append_payment_op(
+            if self._use_queue(request):
+                job = PaymentJob.objects.create(
+                    source_account=source_public_key,
                     destination=destination,
-                    asset=asset,
-                    amount=amount
+                    amount=amount,
+                    asset_code=asset_code,
+                    asset_issuer=asset_issuer,
+                    memo=memo_text or None,
+                    base_fee=base_fee,
+                    max_fee=max_fee
                 )
-            )
-            
-            # Add memo if provided
-            if memo_text:
-                from stellar_sdk import Memo
-                transaction = transaction.add_text_memo(memo_text)
+                get_payment_queue().enqueue(job, source_keypair, asset)
+                return Response({
+                    'job_id': str(job.job_id),
+                    'status': job.status,
+                    'status_url': request.build_absolute_uri(reverse('payment-job', args=[job.job_id]))
+                }, status=status.HTTP_202_ACCEPTED)
             
-            # Build and sign transaction
-            transaction = transaction.set_timeout(30).build()
-            transaction.sign(source_keypair)
+            # Build, sign and submit; the sequence number is allocated locally
+            # instead of loading the source account for every payment
+            response = submit_payments(
+                source_keypair,
+                [{'destination': destination, 'asset': asset, 'amount': amount}],
+                memo_text=memo_text,
+                base_fee=base_fee,
+                max_fee=max_fee
+            )
             
-            # Submit transaction
-            response = server.submit_transaction(transaction)
+            # Both sides of the payment now have new balances
+            invalidate_balances(source_public_key, destination)
             
             return Response({
                 'success': True,
@@ -342,6 +677,18 @@ class SendPaymentView(APIView):
                 {'error': 'Source or destination account not found on Stellar network'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        except SubmissionUncertain as e:
+            # Submitted, but neither confirmed nor rejected: it may still be applied
+            return Response({
+                'success': False,
+                'status': 'uncertain',
+                'error': f'Submission outcome unknown ({e}); look the transaction up before retrying',
+                'transaction_hash': e.transaction_hash,
+                'source_account': source_public_key,
+                'destination': destination,
+                'amount': amount,
+                'asset_code': asset_code
+            }, status=status.HTTP_504_GATEWAY_TIMEOUT)
         except Exception as e:
             error_message = str(e)
             return Response(
@@ -350,86 +697,187 @@ class SendPaymentView(APIView):
             )
 
 
+class PaymentJobView(APIView):
+    """
+    Status of a payment queued in async mode
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request, job_id):
+        job = get_object_or_404(PaymentJob, job_id=job_id)
+        return Response(PaymentJobSerializer(job).data, status=status.HTTP_200_OK)
+
+
+class BulkPaymentView(APIView):
+    """
+    Send many payments at once, from a JSON list or a CSV upload
+    Payments are packed up to 100 operations per transaction per source account
+    """
+    permission_classes = [AllowAny]
+    
+    def post(self, request):
+        serializer = BulkPaymentSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        uploaded_file = serializer.validated_data.get('file')
+        if uploaded_file:
+            # Read in full first: nothing is submitted for a file that cannot be read
+            try:
+                rows = read_csv_rows(uploaded_file)
+            except (UnicodeDecodeError, csv.Error) as e:
+                return Response({'error': f'Could not read CSV file: {e}'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            rows = serializer.validated_data['payments']
+        
+        run = PayoutRun(
+            default_secret=serializer.validated_data.get('secret_key'),
+            memo_text=serializer.validated_data.get('memo'),
+            base_fee=serializer.validated_data.get('base_fee'),
+            max_fee=serializer.validated_data.get('max_fee')
+        )
+        for row in rows:
+            run.add(row)
+        results = run.finish()
+        
+        succeeded = sum(1 for result in results if result['status'] == 'success')
+        uncertain = sum(1 for result in results if result['status'] == 'uncertain')
+        return Response({
+            'results': results,
+            'total': len(results),
+            'succeeded': succeeded,
+            'uncertain': uncertain,
+            'failed': len(results) - succeeded - uncertain,
+            'transactions': run.transactions
+        }, status=status.HTTP_200_OK)
+
+
+class FeeStatsView(APIView):
+    """
+    Fee the payment endpoints currently bid, from the fee oracle's cached fee_stats
+    Optional ?percentile=p50 shows the fee at another percentile
+    """
+    permission_classes = [AllowAny]
+    
+    def get(self, request):
+        percentile = request.query_params.get('percentile', settings.STELLAR_FEE_PERCENTILE)
+        if percentile not in PERCENTILES:
+            return Response(
+                {'error': f"percentile must be one of {', '.join(PERCENTILES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        oracle = get_fee_oracle()
+        stats, fetched_at = oracle.snapshot()
+        if stats is None:
+            # Poller has not answered yet; this endpoint can afford to wait for Horizon
+            try:
+                stats, fetched_at = oracle.refresh(), time.time()
+            except Exception:
+                pass
+        
+        fee = min(oracle.recommended_fee(percentile), settings.STELLAR_FEE_CAP)
+        if stats is None:
+            return Response({
+                'base_fee': fee,
+                'percentile': percentile,
+                'cap': settings.STELLAR_FEE_CAP,
+                'source': 'default'
+            }, status=status.HTTP_200_OK)
+        
+        return Response({
+            'base_fee': fee,
+            'percentile': percentile,
+            'cap': settings.STELLAR_FEE_CAP,
+            'source': 'horizon',
+            'last_ledger': int(stats['last_ledger']),
+            'last_ledger_base_fee': int(stats['last_ledger_base_fee']),
+            'ledger_capacity_usage': float(stats['ledger_capacity_usage']),
+            'fee_charged': {key: int(value) for key, value in stats['fee_charged'].items()},
+            'age': round(time.time() - fetched_at, 3)
+        }, status=status.HTTP_200_OK)
+
+
 class TransactionHistoryView(APIView):
     """
     Get transaction history for a Stellar account
     """
     permission_classes = [AllowAny]
+    throttle_scope = 'history'
+    horizon_reads = True
     
     def get(self, request, public_key=None):
-        # Use public_key from URL parameter or from session
+        # Use public_key from URL parameter, bearer token or session
+        per_wallet = not public_key
         if not public_key:
-            if not request.session.get('authenticated'):
+            public_key = request_public_key(request)
+            if not public_key:
                 return Response(
                     {'error': 'Not authenticated'},
                     status=status.HTTP_401_UNAUTHORIZED
                 )
-            public_key = request.session.get('wallet_public_key')
         
         # Get query parameters
-        limit = int(request.query_params.get('limit', 10))
-        limit = min(limit, 100)  # Max 100 transactions
+        query = HistoryQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(query.validated_data['limit'], 100)  # Max 100 transactions per page
+        cursor = query.validated_data.get('cursor')
+        order = query.validated_data['order']
         
         try:
             # Validate public key format
             Keypair.from_public_key(public_key)
             
-            # Connect to Stellar network
-            server = Server(horizon_url="https://horizon-testnet.stellar.org")
-            # For mainnet use: Server(horizon_url="https://horizon.stellar.org")
+            # The newest page comes from the account's snapshot when it holds enough transactions
+            transactions = None
+            source = 'snapshot'
+            if cursor is None and order == 'desc':
+                transactions = snapshot_history(public_key, limit)
             
-            # Get transactions for the account
-            transactions_response = server.transactions().for_account(public_key).limit(limit).order(desc=True).call()
+            # Serve from the local ingestion index when the account is tracked
+            if transactions is None and settings.STELLAR_HISTORY_SOURCE == 'index':
+                transactions = fetch_indexed_history(public_key, limit, cursor, order)
+                source = 'index'
             
-            transactions = []
+            if transactions is None:
+                # Operations for `limit` transactions after the cursor, fetched in bulk
+                with phase('fetch'):
+                    transactions = fetch_history(get_server(), public_key, limit, cursor=cursor, order=order)
+                source = 'horizon'
             
-            for tx in transactions_response['_embedded']['records']:
-                # Get operations for this transaction
-                operations = server.operations().for_transaction(tx['hash']).call()
-                
-                # Process each operation
-                for op in operations['_embedded']['records']:
-                    transaction_data = {
-                        'id': op['id'],
-                        'type': op['type'],
-                        'created_at': op['created_at'],
-                        'transaction_hash': op['transaction_hash'],
-                        'source_account': op.get('source_account', tx['source_account']),
-                    }
-                    
-                    # Add payment-specific details
-                    if op['type'] in ['payment', 'create_account']:
-                        transaction_data['from_address'] = op.get('from') or op.get('funder')
-                        transaction_data['to_address'] = op.get('to') or op.get('account')
-                        transaction_data['amount'] = op.get('amount') or op.get('starting_balance')
-                        
-                        # Asset information
-                        if op.get('asset_type') == 'native':
-                            transaction_data['asset_code'] = 'XLM'
-                            transaction_data['asset_type'] = 'native'
-                        else:
-                            transaction_data['asset_code'] = op.get('asset_code', 'UNKNOWN')
-                            transaction_data['asset_type'] = op.get('asset_type', 'unknown')
-                    else:
-                        transaction_data['from_address'] = None
-                        transaction_data['to_address'] = None
-                        transaction_data['amount'] = None
-                        transaction_data['asset_code'] = None
-                        transaction_data['asset_type'] = None
-                    
-                    transactions.append(transaction_data)
+            etag = history_etag(public_key, limit, source, cursor, order, transactions)
+            unchanged = not_modified(request, etag, per_wallet)
+            if unchanged is not None:
+                return unchanged
             
             # Serialize the data
-            serializer = TransactionSerializer(transactions, many=True)
+            with phase('serialize'):
+                data = TransactionSerializer.represent(transactions)
             
-            return Response({
+            next_cursor, prev_cursor = page_cursors(transactions, limit, order)
+            opposite = 'asc' if order == 'desc' else 'desc'
+            response = Response({
                 'public_key': public_key,
-                'transactions': serializer.data,
+                'transactions': data,
                 'total_transactions': len(transactions),
-                'limit': limit
+                'limit': limit,
+                'order': order,
+                'next': page_link(request, next_cursor, order),
+                'prev': page_link(request, prev_cursor, opposite),
+                'source': source
             }, status=status.HTTP_200_OK)
+            return set_validators(response, etag, per_wallet)
             
         except Exception as e:
+            # Horizon is rate limiting us: tell the client when to come back instead of failing
+            retry_after = horizon_retry_after(e)
+            if retry_after is not None:
+                return Response(
+                    {'error': 'Stellar network is busy. Please retry later.'},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={'Retry-After': str(retry_after)}
+                )
             error_message = str(e)
             if "Resource Missing" in error_message or "404" in error_message:
                 return Response(
@@ -440,3 +888,54 @@ class TransactionHistoryView(APIView):
                 {'error': f'Failed to fetch transactions: {error_message}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+
+
+class TransactionExportView(APIView):
+    """
+    Stream an account's entire operation history as NDJSON or CSV
+    Oldest first by default; rows are written as Horizon pages arrive
+    """
+    permission_classes = [AllowAny]
+    throttle_scope = 'export'
+    horizon_reads = True
+    renderer_classes = [JSONRenderer, NDJSONRenderer, CSVRenderer]
+    
+    def get(self, request, public_key=None):
+        # Use public_key from URL parameter, bearer token or session
+        if not public_key:
+            public_key = request_public_key(request)
+            if not public_key:
+                return Response(
+                    {'error': 'Not authenticated'},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+        
+        query = HistoryExportQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            Keypair.from_public_key(public_key)
+            
+            # Fetches the first page now so a missing account is a 404, not an empty file
+            records = iter_history(
+                get_server(),
+                public_key,
+                cursor=query.validated_data.get('cursor'),
+                order=query.validated_data['order'],
+                # HorizonBudgetThrottle admitted the first page; anonymous exports
+                # queue for the budget again before every further one
+                admit=None if request_public_key(request) else functools.partial(admit_read, self.throttle_scope)
+            )
+        except NotFoundError:
+            return Response(
+                {'error': 'Account not found on Stellar network'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except Exception as e:
+            return Response(
+                {'error': f'Failed to export transactions: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        
+        return export_response(records, query.validated_data['format'], public_key)
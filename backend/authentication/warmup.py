@@ -0,0 +1,138 @@
+"""
+Worker warm-up
+
+Does the lazy initialisation a worker would otherwise pay for on its first
+requests: importing the views and everything behind them, compiling the URL
+patterns, resolving DRF's settings, building serializer fields and plans and
+loading translation catalogs. gunicorn.conf.py runs warm_up() once in the
+master before it forks, so workers start with all of it already in memory,
+shared copy-on-write.
+
+warm_up() leaves no connections, threads or cache clients behind, since those
+must not be shared between processes. warm_worker() creates the per-process
+Horizon pool after the fork.
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# A valid account id, used to exercise key parsing and URL matching
+SAMPLE_PUBLIC_KEY = 'GAAZI4TCR3TY5OJHCTJC2A4QSY6CJWJH5IAJTGKIN2ER7LBNVKOCCWN7'
+
+
+def _import_views():
+    from . import async_views, views  # noqa: F401
+
+    # Importing the URLconf pulls in every view module
+    from django.urls import get_resolver
+    get_resolver().url_patterns
+
+
+def _resolve_urls():
+    from django.urls import get_resolver, reverse
+
+    resolver = get_resolver()
+    for path in (
+        f'/api/auth/balance/{SAMPLE_PUBLIC_KEY}/',
+        f'/api/auth/transactions/{SAMPLE_PUBLIC_KEY}/',
+        '/api/auth/connect/',
+    ):
+        resolver.resolve(path)
+    # The first reverse() builds the reverse lookup tables
+    reverse('wallet-balance-by-key', args=[SAMPLE_PUBLIC_KEY])
+
+
+def _load_api_settings():
+    from rest_framework.settings import api_settings
+
+    # Each is imported from its dotted path on first access
+    for name in (
+        'DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES', 'DEFAULT_AUTHENTICATION_CLASSES',
+        'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_THROTTLE_CLASSES', 'DEFAULT_CONTENT_NEGOTIATION_CLASS',
+        'DEFAULT_METADATA_CLASS', 'DEFAULT_VERSIONING_CLASS', 'EXCEPTION_HANDLER', 'UNAUTHENTICATED_USER',
+    ):
+        getattr(api_settings, name)
+
+
+def _build_serializers():
+    from rest_framework import serializers as drf_serializers
+
+    from . import serializers
+
+    for value in vars(serializers).values():
+        if not isinstance(value, type) or not issubclass(value, drf_serializers.BaseSerializer):
+            continue
+        if value.__module__ != serializers.__name__:
+            continue
+        # Field construction imports validators and compiles their regexes
+        value().fields
+        if issubclass(value, serializers.FastRepresentationMixin):
+            value._representation_plan()
+
+
+def _load_translations():
+    from django.utils import translation
+
+    # DRF's error messages are translated; the first one loads every catalog
+    with translation.override(settings.LANGUAGE_CODE):
+        translation.gettext('This field is required.')
+
+
+def _parse_keys():
+    from stellar_sdk import Keypair
+
+    from .horizon import get_network_passphrase
+
+    Keypair.from_public_key(SAMPLE_PUBLIC_KEY)
+    get_network_passphrase()
+
+
+STEPS = (
+    ('views', _import_views),
+    ('urls', _resolve_urls),
+    ('api_settings', _load_api_settings),
+    ('serializers', _build_serializers),
+    ('translations', _load_translations),
+    ('keys', _parse_keys),
+)
+
+
+def warm_up():
+    """Run every warm-up step; returns {step: seconds}"""
+    timings = {}
+    for name, step in STEPS:
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            # A cold start is slower, not broken
+            logger.warning('Warm-up step %s failed', name, exc_info=True)
+        timings[name] = time.perf_counter() - started
+    # Nothing above should have connected, but a forked socket would be shared by every worker
+    connections.close_all()
+    return timings
+
+
+def _connect_horizon(server):
+    try:
+        server.root().call()
+    except Exception as e:
+        logger.warning('Horizon warm-up call failed: %s', e)
+
+
+def warm_worker():
+    """
+    Per-process warm-up, after the fork: build the Horizon pool
+    With STELLAR_WARMUP_HORIZON on, also open its first connection, in the
+    background so an unreachable Horizon never holds the worker back
+    """
+    from .horizon import get_server
+
+    server = get_server()
+    if settings.STELLAR_WARMUP_HORIZON:
+        threading.Thread(target=_connect_horizon, args=(server,), name='horizon-warmup', daemon=True).start()
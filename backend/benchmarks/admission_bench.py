@@ -0,0 +1,116 @@
+"""
+Admission control benchmark
+
+One abusive client (--abuser-threads closed-loop threads from one address)
+and --clients well-behaved clients (one request a second each, from their
+own addresses) read balances of accounts nobody has read before, so every
+request needs Horizon. The fake Horizon answers 429 above --horizon-limit
+calls a second. Runs twice:
+
+- off: no per-client limits and no Horizon budget
+- on:  per-client limits and a Horizon budget of 80% of the fake's limit
+
+and reports the answers each kind of client got and how often Horizon
+rejected us.
+
+    python benchmarks/admission_bench.py --duration 10 --horizon-limit 20
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from stellar_sdk import Keypair  # noqa: E402
+
+from fake_horizon import FakeHorizon  # noqa: E402
+
+
+def drive(address, interval, stop, results):
+    """Read fresh balances as `address` until `stop`, one every `interval` seconds (0 = back to back)"""
+    from django.test import Client
+
+    client = Client(REMOTE_ADDR=address)
+    while not stop.is_set():
+        started = time.monotonic()
+        response = client.get(f'/api/auth/balance/{Keypair.random().public_key}/')
+        results[response.status_code] += 1
+        if interval:
+            stop.wait(max(interval - (time.monotonic() - started), 0))
+
+
+def run(horizon, args):
+    """{'abuser': Counter, 'clients': Counter} of response statuses over one run"""
+    results = {'abuser': Counter(), 'clients': Counter()}
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=drive, args=('10.0.0.1', 0, stop, results['abuser']))
+        for _ in range(args.abuser_threads)
+    ] + [
+        threading.Thread(target=drive, args=(f'10.0.1.{i}', 1.0, stop, results['clients']))
+        for i in range(args.clients)
+    ]
+    horizon.state.reset_counters()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Admission control benchmark')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per run')
+    parser.add_argument('--abuser-threads', type=int, default=8)
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--horizon-limit', type=int, default=20, help='fake Horizon calls per second before 429')
+    parser.add_argument('--latency', type=float, default=0.01, help='fake Horizon latency per call, seconds')
+    args = parser.parse_args()
+
+    horizon = FakeHorizon(latency=args.latency, tx_count=1, rate_limit=args.horizon_limit).start()
+    os.environ['STELLAR_HORIZON_URL'] = horizon.url
+    os.environ['DB_NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stellar_project.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.core.cache import cache
+
+    settings.ALLOWED_HOSTS = ['*']
+    modes = {
+        'off': {'STELLAR_THROTTLE_ENABLED': False, 'STELLAR_HORIZON_BUDGET_RATE': 0},
+        'on': {
+            'STELLAR_THROTTLE_ENABLED': True,
+            # A full bucket plus one second of refill stays within the fake's per-second limit
+            'STELLAR_HORIZON_BUDGET_RATE': args.horizon_limit * 0.8,
+            'STELLAR_HORIZON_BUDGET_BURST': max(args.horizon_limit // 5, 1),
+        },
+    }
+
+    print(f'{args.abuser_threads} abuser threads, {args.clients} clients at 1/s, '
+          f'Horizon limit {args.horizon_limit}/s, {args.duration:.0f} s per run')
+    print(f'{"mode":<6}{"client":<9}{"requests":>9}{"200":>7}{"429":>7}{"503":>7}{"500":>7}'
+          f'{"horizon calls/s":>17}{"horizon 429s":>14}')
+    for mode, overrides in modes.items():
+        for name, value in overrides.items():
+            setattr(settings, name, value)
+        cache.clear()
+        results = run(horizon, args)
+        calls = horizon.state.snapshot()
+        rejected = calls.pop('rate_limited', 0)
+        per_second = (sum(calls.values()) - rejected) / args.duration
+        for kind, statuses in results.items():
+            print(f'{mode:<6}{kind:<9}{sum(statuses.values()):>9}{statuses[200]:>7}{statuses[429]:>7}'
+                  f'{statuses[503]:>7}{statuses[500]:>7}{per_second:>17.1f}{rejected:>14}')
+    horizon.stop()
+
+
+if __name__ == '__main__':
+    main()
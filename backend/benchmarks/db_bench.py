@@ -0,0 +1,100 @@
+"""
+Concurrent writer benchmark for the configured database
+
+Runs several processes (like gunicorn workers) that each issue sign-in
+challenges the database-backed way (user, wallet and session rows) while
+reading wallets back, and reports throughput and lock errors. By default it
+uses a throwaway SQLite file; set DB_ENGINE=postgresql and the DB_* variables
+to run it against PostgreSQL instead.
+
+    python benchmarks/db_bench.py --processes 3 --iterations 300
+    python benchmarks/db_bench.py --journal-mode DELETE   # pre-WAL behaviour
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def _setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stellar_project.settings')
+    import django
+    django.setup()
+
+
+def worker(index, iterations, results):
+    _setup()
+    import secrets
+    from datetime import timedelta
+
+    from django.db import OperationalError, connection
+    from django.utils import timezone
+    from stellar_sdk import Keypair
+
+    from authentication.models import AuthenticationSession
+    from authentication.views import get_or_create_wallet
+
+    keys = [Keypair.random().public_key for _ in range(max(iterations // 10, 1))]
+    ok = errors = 0
+    started = time.perf_counter()
+    for i in range(iterations):
+        try:
+            wallet = get_or_create_wallet(keys[i % len(keys)])
+            AuthenticationSession.objects.create(
+                wallet=wallet,
+                session_key=secrets.token_urlsafe(32),
+                challenge=secrets.token_urlsafe(32),
+                expires_at=timezone.now() + timedelta(minutes=15)
+            )
+            AuthenticationSession.objects.filter(wallet=wallet).count()
+            ok += 1
+        except OperationalError:
+            errors += 1
+    results.put((index, ok, errors, time.perf_counter() - started, connection.vendor))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent writer benchmark')
+    parser.add_argument('--processes', type=int, default=3)
+    parser.add_argument('--iterations', type=int, default=300, help='challenges per process')
+    parser.add_argument('--journal-mode', help='SQLite journal mode (default: settings.SQLITE_JOURNAL_MODE)')
+    args = parser.parse_args()
+
+    if args.journal_mode:
+        os.environ['SQLITE_JOURNAL_MODE'] = args.journal_mode
+    if os.getenv('DB_ENGINE', 'sqlite3') != 'postgresql' and 'DB_NAME' not in os.environ:
+        os.environ['DB_NAME'] = os.path.join(tempfile.mkdtemp(), 'bench.sqlite3')
+
+    _setup()
+    from django.core.management import call_command
+    from django.db import connection
+    call_command('migrate', run_syncdb=True, verbosity=0)
+    connection.close()
+
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(target=worker, args=(i, args.iterations, results))
+        for i in range(args.processes)
+    ]
+    started = time.perf_counter()
+    for process in processes:
+        process.start()
+    rows = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - started
+
+    ok = sum(row[1] for row in rows)
+    errors = sum(row[2] for row in rows)
+    print(f'{rows[0][4]} ({os.getenv("SQLITE_JOURNAL_MODE", "WAL") if rows[0][4] == "sqlite" else "pooled"}), '
+          f'{args.processes} processes x {args.iterations} challenges')
+    print(f'  succeeded {ok}, lock errors {errors}, {elapsed:.2f}s, {ok / elapsed:.0f} challenges/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Horizon failover benchmark
+
+Runs account reads through the shared Horizon server against two local fake
+Horizons, one healthy and one degraded (slow, jittery and failing part of
+its calls), and reports latency percentiles, errors and where the calls went:
+
+- single:   only the degraded URL configured, as before failover
+- failover: degraded URL first, healthy second; breaker and ranking only
+- hedged:   as failover, plus hedged reads after --hedge-delay
+
+    python benchmarks/failover_bench.py --error-rate 0.3 --jitter 0.3
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_horizon import FakeHorizon  # noqa: E402
+
+ACCOUNT = 'GBENCHFAILOVERACCOUNT0000000000000000000000000000000000'
+
+
+def percentile(values, p):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(int(len(values) * p / 100), len(values) - 1)]
+
+
+def run(server, threads, requests):
+    timings, errors = [], []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                server.accounts().account_id(ACCOUNT).call()
+            except Exception as e:
+                with lock:
+                    errors.append(type(e).__name__)
+                continue
+            with lock:
+                timings.append((time.perf_counter() - started) * 1000)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return timings, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Horizon failover benchmark')
+    parser.add_argument('--latency', type=float, default=0.01, help='healthy Horizon latency, seconds')
+    parser.add_argument('--degraded-latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.3, help='degraded Horizon extra random latency')
+    parser.add_argument('--error-rate', type=float, default=0.3, help='degraded Horizon share of 503s')
+    parser.add_argument('--hedge-delay', type=float, default=0.05)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=50, help='reads per thread')
+    args = parser.parse_args()
+
+    healthy = FakeHorizon(latency=args.latency).start()
+    degraded = FakeHorizon(
+        latency=args.degraded_latency, jitter=args.jitter, error_rate=args.error_rate
+    ).start()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stellar_project.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+
+    from authentication.horizon import get_server, reset_server
+
+    scenarios = {
+        'single': ([degraded.url], 0.0),
+        'failover': ([degraded.url, healthy.url], 0.0),
+        'hedged': ([degraded.url, healthy.url], args.hedge_delay),
+    }
+
+    print(f'healthy {args.latency * 1000:.0f} ms; degraded {args.degraded_latency * 1000:.0f} ms '
+          f'+ up to {args.jitter * 1000:.0f} ms, {args.error_rate:.0%} errors')
+    print(f'{"scenario":<10}{"ok":>6}{"errors":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+          f'{"degraded":>10}{"healthy":>9}')
+    for name, (urls, hedge_delay) in scenarios.items():
+        settings.STELLAR_HORIZON_URLS = urls
+        settings.STELLAR_HORIZON_HEDGE_DELAY = hedge_delay
+        reset_server()
+        healthy.state.reset_counters()
+        degraded.state.reset_counters()
+
+        timings, errors = run(get_server(), args.threads, args.requests)
+        print(f'{name:<10}{len(timings):>6}{len(errors):>8}'
+              f'{percentile(timings, 50):>9.1f}{percentile(timings, 95):>9.1f}{percentile(timings, 99):>9.1f}'
+              f'{sum(degraded.state.snapshot().values()):>10}{sum(healthy.state.snapshot().values()):>9}')
+
+    healthy.stop()
+    degraded.stop()
+
+
+if __name__ == '__main__':
+    main()
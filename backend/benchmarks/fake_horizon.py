@@ -0,0 +1,569 @@
+"""
+Local fake Horizon for benchmarks
+
+Serves deterministic account, transaction, operation and market data
+(strict-send paths and order books) over HTTP with configurable latency and
+error injection and a request rate limit (answered with 429 like Horizon's),
+and counts every upstream call so benchmarks can report
+round trips per request. Operation streams are served
+as SSE, and ``POST /_activity/<account>`` appends new transactions to an
+account so streaming consumers can be exercised.
+
+Run standalone with ``python benchmarks/fake_horizon.py --port 8800``.
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from stellar_sdk import Keypair, TransactionEnvelope
+
+NETWORK_PASSPHRASE = 'Test SDF Network ; September 2015'
+GENESIS = datetime(2024, 1, 1, tzinfo=timezone.utc)
+FIRST_LEDGER = 1000
+MAX_LIMIT = 200
+
+
+def _toid(ledger, tx_index=0, op_index=0):
+    """Horizon total-order id: ledger, transaction and operation packed in 64 bits"""
+    return (ledger << 32) | (tx_index << 12) | op_index
+
+
+def _counterparty(public_key, i):
+    digest = hashlib.sha256(f'{public_key}:{i}'.encode()).hexdigest().upper()
+    return ('G' + ''.join(c for c in digest if c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567') * 4)[:56]
+
+
+ISSUER = Keypair.from_raw_ed25519_seed(hashlib.sha256(b'issuer').digest()).public_key
+# Trustlines held by every account, first asset_count of them. ILLIQ only
+# trades on its order book; DEAD has no market at all.
+ASSET_CODES = ('USDC', 'EURC', 'BTC', 'AQUA', 'ILLIQ', 'DEAD')
+
+
+def _xlm_price(code):
+    """Deterministic XLM value of one unit of an asset"""
+    if code is None:
+        return 1.0
+    return int(hashlib.sha256(code.encode()).hexdigest()[:6], 16) % 100000 / 1000 + 0.01
+
+
+class FakeAccount:
+    """Deterministic ledger history for one account"""
+
+    def __init__(self, public_key, tx_count, asset_count=1):
+        self.public_key = public_key
+        self.asset_count = asset_count
+        self.sequence = _toid(FIRST_LEDGER)
+        self.transactions = []
+        self.operations = []
+        # Operations of this account's transactions that only involve other
+        # accounts: listed for the transaction, not for the account
+        self.foreign_operations = []
+        for i in range(tx_count):
+            self._append_transaction(i)
+
+    def _append_transaction(self, i, ops_in_tx=None):
+        ledger = FIRST_LEDGER + i
+        tx_id = _toid(ledger, 1)
+        tx_hash = hashlib.sha256(f'{self.public_key}:{i}'.encode()).hexdigest()
+        created_at = (GENESIS + timedelta(seconds=5 * i)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        tx = {
+            'id': tx_hash,
+            'paging_token': str(tx_id),
+            'hash': tx_hash,
+            'ledger': ledger,
+            'created_at': created_at,
+            'source_account': self.public_key,
+            'successful': True,
+            'operation_count': ops_in_tx or 1 + i % 3,
+        }
+        self.transactions.append(tx)
+        for j in range(tx['operation_count']):
+            op_id = str(tx_id + j + 1)
+            op = {
+                'id': op_id,
+                'paging_token': op_id,
+                'transaction_successful': True,
+                'source_account': self.public_key,
+                'created_at': created_at,
+                'transaction_hash': tx_hash,
+            }
+            if j == 0:
+                op.update({
+                    'type': 'payment',
+                    'asset_type': 'native',
+                    'from': self.public_key,
+                    'to': _counterparty(self.public_key, i),
+                    'amount': f'{(i % 50) + 1}.0000000',
+                })
+            elif j == 2:
+                counterparty = _counterparty(self.public_key, i)
+                op.update({
+                    'type': 'payment',
+                    'source_account': counterparty,
+                    'asset_type': 'native',
+                    'from': counterparty,
+                    'to': _counterparty(counterparty, i),
+                    'amount': '1.0000000',
+                })
+                self.foreign_operations.append(op)
+                continue
+            else:
+                op.update({'type': 'manage_data', 'name': f'key{j}', 'value': 'dmFsdWU='})
+            self.operations.append(op)
+        return tx
+
+    @property
+    def last_modified_ledger(self):
+        return FIRST_LEDGER + len(self.transactions)
+
+    def account_record(self):
+        return {
+            'id': self.public_key,
+            'account_id': self.public_key,
+            'sequence': str(self.sequence),
+            'last_modified_ledger': self.last_modified_ledger,
+            'subentry_count': 1,
+            'thresholds': {'low_threshold': 0, 'med_threshold': 0, 'high_threshold': 0},
+            'flags': {'auth_required': False, 'auth_revocable': False},
+            'signers': [{'key': self.public_key, 'weight': 1, 'type': 'ed25519_public_key'}],
+            'data': {},
+            'balances': [
+                {
+                    'balance': f'{120.5 + i:.7f}',
+                    'asset_type': 'credit_alphanum4' if len(code) <= 4 else 'credit_alphanum12',
+                    'asset_code': code,
+                    'asset_issuer': ISSUER,
+                }
+                for i, code in enumerate(ASSET_CODES[:self.asset_count])
+            ] + [
+                {'balance': f'{10000 + len(self.transactions)}.0000000', 'asset_type': 'native'},
+            ],
+        }
+
+
+class FakeHorizonState:
+    """Accounts, fault injection knobs and call counters shared by all handler threads"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, tx_count=300, seed=0,
+                 stream_timeout=30.0, timeout_rate=0.0, asset_count=1, rate_limit=0):
+        self.latency = latency
+        # Calls allowed per second before answering 429 (0 = unlimited)
+        self.rate_limit = rate_limit
+        self.window = (0, 0)
+        self.asset_count = asset_count
+        # Share of submissions applied but answered with 504, like a Horizon timeout
+        self.timeout_rate = timeout_rate
+        self.stream_timeout = stream_timeout
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.tx_count = tx_count
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.accounts = {}
+        self.submitted = {}
+        self.calls = Counter()
+
+    def account(self, public_key):
+        with self.lock:
+            if public_key not in self.accounts:
+                self.accounts[public_key] = FakeAccount(public_key, self.tx_count, self.asset_count)
+            return self.accounts[public_key]
+
+    def add_activity(self, public_key, count=1):
+        """Append `count` new transactions to an account's history"""
+        account = self.account(public_key)
+        with self.lock:
+            return [account._append_transaction(len(account.transactions)) for _ in range(count)]
+
+    def record(self, kind):
+        with self.lock:
+            self.calls[kind] += 1
+
+    def reset_counters(self):
+        with self.lock:
+            self.calls.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.calls)
+
+    def over_limit(self):
+        """Whether this call exceeds the per-second rate limit"""
+        if not self.rate_limit:
+            return False
+        second = int(time.time())
+        with self.lock:
+            start, count = self.window
+            count = count + 1 if start == second else 1
+            self.window = (second, count)
+            if count > self.rate_limit:
+                self.calls['rate_limited'] += 1
+                return True
+        return False
+
+    def delay(self):
+        with self.lock:
+            jitter = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+            fail = self.error_rate and self.random.random() < self.error_rate
+        if self.latency or jitter:
+            time.sleep(self.latency + jitter)
+        return fail
+
+
+class FakeHorizonHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeHorizon/1.0'
+    # Send headers and body in one segment; otherwise delayed ACKs add ~40 ms per call
+    disable_nagle_algorithm = True
+    wbufsize = 64 * 1024
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    # -- response helpers ----------------------------------------------------
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/hal+json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _problem(self, status, title, extras=None):
+        payload = {
+            'type': f'https://stellar.org/horizon-errors/{title.lower().replace(" ", "_")}',
+            'title': title,
+            'status': status,
+        }
+        if extras:
+            payload['extras'] = extras
+        self._send_json(payload, status=status)
+
+    def _rate_limited(self):
+        payload = {'type': 'https://stellar.org/horizon-errors/rate_limit_exceeded', 'title': 'Rate Limit Exceeded',
+                   'status': 429}
+        self._send_json(payload, status=429, headers={'Retry-After': '1'})
+
+    def _page(self, records, params):
+        order = params.get('order', 'asc')
+        limit = min(int(params.get('limit', 10)), MAX_LIMIT)
+        cursor = params.get('cursor')
+
+        if order == 'desc':
+            records = list(reversed(records))
+            if cursor:
+                records = [r for r in records if int(r['paging_token']) < int(cursor)]
+        elif cursor:
+            records = [r for r in records if int(r['paging_token']) > int(cursor)]
+        page = records[:limit]
+
+        base = f'http://{self.headers.get("Host")}{urlparse(self.path).path}'
+        next_cursor = page[-1]['paging_token'] if page else cursor or ''
+        prev_cursor = page[0]['paging_token'] if page else cursor or ''
+        prev_order = 'asc' if order == 'desc' else 'desc'
+        join = f'&join={params["join"]}' if 'join' in params else ''
+        return {
+            '_links': {
+                'self': {'href': self.path},
+                'next': {'href': f'{base}?cursor={next_cursor}&limit={limit}&order={order}{join}'},
+                'prev': {'href': f'{base}?cursor={prev_cursor}&limit={limit}&order={prev_order}{join}'},
+            },
+            '_embedded': {'records': page},
+        }
+
+    def _stream(self, account, cursor, payments_only):
+        """Send operations after `cursor` as SSE, then follow new ones until stream_timeout"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+
+        position = len(account.operations) if cursor == 'now' else 0
+        last_token = 0 if cursor == 'now' else int(cursor)
+        deadline = time.monotonic() + self.state.stream_timeout
+        try:
+            self.wfile.write(b'retry: 1000\nevent: open\ndata: "hello"\n\n')
+            self.wfile.flush()
+            while time.monotonic() < deadline:
+                records = account.operations[position:]
+                position += len(records)
+                for op in records:
+                    if int(op['paging_token']) <= last_token:
+                        continue
+                    if payments_only and op['type'] not in ('payment', 'create_account'):
+                        continue
+                    self.wfile.write(
+                        f'id: {op["paging_token"]}\ndata: {json.dumps(op)}\n\n'.encode()
+                    )
+                    last_token = int(op['paging_token'])
+                self.wfile.write(b': keepalive\n\n')
+                self.wfile.flush()
+                time.sleep(0.1)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    # -- routing -------------------------------------------------------------
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        parts = [p for p in parsed.path.split('/') if p]
+
+        if parts == ['_stats']:
+            return self._send_json(self.state.snapshot())
+
+        streaming = 'text/event-stream' in self.headers.get('Accept', '')
+        kind = 'stream' if streaming else self._classify(parts)
+        self.state.record(kind)
+        if self.state.over_limit():
+            return self._rate_limited()
+        if self.state.delay():
+            return self._problem(503, 'Service Unavailable')
+
+        if streaming:
+            if len(parts) == 3 and parts[0] == 'accounts' and parts[2] in ('operations', 'payments'):
+                cursor = self.headers.get('Last-Event-Id') or params.get('cursor') or 'now'
+                return self._stream(self.state.account(parts[1]), cursor, parts[2] == 'payments')
+            return self._problem(404, 'Resource Missing')
+
+        if not parts:
+            return self._send_json({'horizon_version': 'fake', 'network_passphrase': NETWORK_PASSPHRASE})
+        if parts[0] == 'accounts' and len(parts) >= 2:
+            account = self.state.account(parts[1])
+            if len(parts) == 2:
+                return self._send_json(account.account_record())
+            if parts[2] == 'transactions':
+                return self._send_json(self._page(account.transactions, params))
+            if parts[2] == 'operations':
+                records = account.operations
+                if params.get('join') == 'transactions':
+                    by_hash = {tx['hash']: tx for tx in account.transactions}
+                    records = [dict(op, transaction=by_hash[op['transaction_hash']]) for op in records]
+                return self._send_json(self._page(records, params))
+            if parts[2] == 'data':
+                return self._problem(404, 'Resource Missing')
+        if parts[0] == 'transactions' and len(parts) == 2:
+            record = self.state.submitted.get(parts[1])
+            if record is None:
+                return self._problem(404, 'Resource Missing')
+            return self._send_json(record)
+        if parts[0] == 'transactions' and len(parts) == 3 and parts[2] == 'operations':
+            for account in list(self.state.accounts.values()):
+                ops = [
+                    op for op in account.operations + account.foreign_operations
+                    if op['transaction_hash'] == parts[1]
+                ]
+                if ops:
+                    ops.sort(key=lambda op: int(op['id']))
+                    return self._send_json(self._page(ops, params))
+            return self._send_json(self._page([], params))
+        if parts == ['fee_stats']:
+            return self._send_json(_fee_stats())
+        if parts == ['paths', 'strict-send']:
+            return self._send_json(_strict_send_paths(params))
+        if parts == ['order_book']:
+            return self._send_json(_order_book(params))
+        return self._problem(404, 'Resource Missing')
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        parts = [p for p in parsed.path.split('/') if p]
+        if parts == ['_reset']:
+            self.state.reset_counters()
+            return self._send_json({})
+        if len(parts) == 2 and parts[0] == '_activity':
+            count = int(parse_qs(parsed.query).get('count', ['1'])[0])
+            added = self.state.add_activity(parts[1], count)
+            return self._send_json({'transactions': [tx['hash'] for tx in added]})
+
+        length = int(self.headers.get('Content-Length') or 0)
+        body = parse_qs(self.rfile.read(length).decode())
+        self.state.record('submit')
+        if self.state.over_limit():
+            return self._rate_limited()
+        if self.state.delay():
+            return self._problem(503, 'Service Unavailable')
+        if parts != ['transactions'] or 'tx' not in body:
+            return self._problem(400, 'Bad Request')
+
+        envelope = body['tx'][0]
+        try:
+            parsed = TransactionEnvelope.from_xdr(envelope, NETWORK_PASSPHRASE)
+            transaction = parsed.transaction
+        except Exception:
+            return self._problem(400, 'Transaction Malformed')
+
+        # Enforce sequence numbers like stellar-core: exactly current + 1
+        account = self.state.account(transaction.source.account_id)
+        with self.state.lock:
+            if transaction.sequence != account.sequence + 1:
+                bad_seq = True
+            else:
+                bad_seq = False
+                account.sequence = transaction.sequence
+        if bad_seq:
+            self.state.record('tx_bad_seq')
+            return self._problem(400, 'Transaction Failed', {
+                'envelope_xdr': envelope,
+                'result_codes': {'transaction': 'tx_bad_seq'},
+            })
+
+        record = {
+            'hash': parsed.hash_hex(),
+            'ledger': FIRST_LEDGER + int(time.time()) % 100000,
+            'envelope_xdr': envelope,
+            'successful': True,
+        }
+        with self.state.lock:
+            self.state.submitted[record['hash']] = record
+            lost = self.state.timeout_rate and self.state.random.random() < self.state.timeout_rate
+        if lost:
+            self.state.record('submit_timeout')
+            return self._problem(504, 'Timeout')
+        return self._send_json(record)
+
+    @staticmethod
+    def _classify(parts):
+        if not parts:
+            return 'root'
+        if parts[0] == 'accounts' and len(parts) > 2:
+            return parts[2]
+        return parts[0]
+
+
+def _fee_stats():
+    percentiles = {f'p{p}': str(100 + p) for p in (10, 20, 30, 40, 50, 60, 70, 80, 90, 95, 99)}
+    return {
+        'last_ledger': str(FIRST_LEDGER),
+        'last_ledger_base_fee': '100',
+        'ledger_capacity_usage': '0.5',
+        'fee_charged': dict(percentiles, max='300', min='100', mode='100'),
+        'max_fee': dict(percentiles, max='1000', min='100', mode='100'),
+    }
+
+
+def _asset_fields(prefix, params):
+    """(type, code, issuer) of the asset given as <prefix>_asset_* query parameters"""
+    asset_type = params.get(f'{prefix}_asset_type', 'native')
+    if asset_type == 'native':
+        return 'native', None, None
+    return asset_type, params.get(f'{prefix}_asset_code'), params.get(f'{prefix}_asset_issuer')
+
+
+def _strict_send_paths(params):
+    source_type, source_code, source_issuer = _asset_fields('source', params)
+    source_amount = float(params['source_amount'])
+    records = []
+    for destination in params.get('destination_assets', '').split(','):
+        code, _, issuer = destination.partition(':')
+        code = None if destination == 'native' else code
+        if {source_code, code} & {'ILLIQ', 'DEAD'}:
+            continue
+        records.append({
+            'source_asset_type': source_type,
+            'source_asset_code': source_code,
+            'source_asset_issuer': source_issuer,
+            'source_amount': params['source_amount'],
+            'destination_asset_type': 'native' if code is None else 'credit_alphanum4',
+            'destination_asset_code': code,
+            'destination_asset_issuer': issuer or None,
+            'destination_amount': f'{source_amount * _xlm_price(source_code) / _xlm_price(code):.7f}',
+            'path': [],
+        })
+    return {'_embedded': {'records': records}}
+
+
+def _order_book(params):
+    _, selling_code, _ = _asset_fields('selling', params)
+    _, buying_code, _ = _asset_fields('buying', params)
+    bids = []
+    if 'DEAD' not in (selling_code, buying_code):
+        price = _xlm_price(selling_code) / _xlm_price(buying_code)
+        bids = [{'price': f'{price:.7f}', 'amount': '1000.0000000'}]
+    return {'bids': bids, 'asks': [], 'base': {}, 'counter': {}}
+
+
+class FakeHorizon:
+    """A fake Horizon running on a background thread"""
+
+    def __init__(self, host='127.0.0.1', port=0, **options):
+        self.state = FakeHorizonState(**options)
+        self.httpd = ThreadingHTTPServer((host, port), FakeHorizonHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every call')
+    parser.add_argument('--jitter', type=float, default=0.0, help='extra random latency, seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of calls answered with 503')
+    parser.add_argument('--tx-count', type=int, default=300, help='transactions per account')
+    parser.add_argument('--asset-count', type=int, default=1, help='trustlines per account, up to 6')
+    parser.add_argument('--stream-timeout', type=float, default=30.0,
+                        help='seconds before an SSE stream is closed and the client must reconnect')
+    parser.add_argument('--timeout-rate', type=float, default=0.0,
+                        help='fraction of submissions applied but answered with 504')
+    parser.add_argument('--rate-limit', type=int, default=0, help='calls per second before answering 429')
+    args = parser.parse_args()
+
+    horizon = FakeHorizon(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        tx_count=args.tx_count,
+        asset_count=args.asset_count,
+        stream_timeout=args.stream_timeout,
+        timeout_rate=args.timeout_rate,
+        rate_limit=args.rate_limit,
+    )
+    print(f'Fake Horizon listening on {horizon.url}')
+    try:
+        horizon.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Transaction history benchmark
+
+Compares the old one-call-per-transaction loop with the history engine
+strategies against a local fake Horizon, reporting upstream round trips and
+wall-clock latency at several limits.
+
+    python benchmarks/history_bench.py --latency 0.02
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_horizon import FakeHorizon  # noqa: E402
+
+ACCOUNT = 'GBENCHHISTORYACCOUNT00000000000000000000000000000000000'
+
+
+def legacy_history(server, public_key, limit):
+    """The pre-engine TransactionHistoryView loop, kept here as the baseline"""
+    from authentication.history import operation_to_transaction_data
+
+    response = server.transactions().for_account(public_key).limit(limit).order(desc=True).call()
+    transactions = []
+    for tx in response['_embedded']['records']:
+        operations = server.operations().for_transaction(tx['hash']).call()
+        for op in operations['_embedded']['records']:
+            transactions.append(operation_to_transaction_data(op, tx['source_account']))
+    return transactions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transaction history benchmark')
+    parser.add_argument('--latency', type=float, default=0.02, help='fake Horizon latency per call, seconds')
+    parser.add_argument('--limits', default='10,50,100')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    horizon = FakeHorizon(latency=args.latency).start()
+    os.environ['STELLAR_HORIZON_URL'] = horizon.url
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stellar_project.settings')
+
+    import django
+    django.setup()
+
+    from authentication.history import fetch_history
+    from authentication.horizon import get_server
+
+    server = get_server()
+    strategies = {
+        'legacy': lambda limit: legacy_history(server, ACCOUNT, limit),
+        'fanout': lambda limit: fetch_history(server, ACCOUNT, limit, strategy='fanout'),
+        'operations': lambda limit: fetch_history(server, ACCOUNT, limit, strategy='operations'),
+    }
+
+    print(f'fake Horizon latency: {args.latency * 1000:.0f} ms/call')
+    print(f'{"strategy":<12}{"limit":>6}{"records":>9}{"calls":>7}{"p50 ms":>9}{"max ms":>9}')
+    for limit in [int(n) for n in args.limits.split(',')]:
+        baseline = None
+        for name, run in strategies.items():
+            timings = []
+            for _ in range(args.repeat):
+                horizon.state.reset_counters()
+                started = time.perf_counter()
+                records = run(limit)
+                timings.append((time.perf_counter() - started) * 1000)
+            calls = sum(horizon.state.snapshot().values())
+
+            if baseline is None:
+                baseline = records
+            elif records != baseline:
+                print(f'  warning: {name} output differs from legacy at limit={limit}')
+            print(f'{name:<12}{limit:>6}{len(records):>9}{calls:>7}'
+                  f'{statistics.median(timings):>9.1f}{max(timings):>9.1f}')
+
+    horizon.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+"""
+API load test against a local fake Horizon
+
+Starts the fake Horizon and the Django app under gunicorn (on a throwaway
+SQLite database), then drives the connect, verify, balance, payment and
+transactions endpoints with closed-loop clients at each concurrency level.
+Reports throughput, p50/p95/p99 latency and Horizon calls per request, and
+writes everything to a JSON file tagged with the current commit so runs can
+be compared.
+
+    python benchmarks/load_test.py --latency 0.05 --concurrency 1,10,50
+    python benchmarks/load_test.py --server-mode asgi --compare benchmarks/results/<previous>.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import requests
+from stellar_sdk import Keypair
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_horizon import FakeHorizon  # noqa: E402
+
+SCENARIOS = ('connect', 'verify', 'balance', 'payment', 'transactions')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def _percentile(ordered, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    index = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+class AppServer:
+    """The Django app under gunicorn, pointed at the fake Horizon"""
+
+    def __init__(self, horizon_url, mode, workers, threads, extra_env):
+        self.port = _free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.workdir = tempfile.mkdtemp(prefix='stellar-load-')
+        self.env = dict(
+            os.environ,
+            STELLAR_HORIZON_URL=horizon_url,
+            DB_ENGINE='sqlite3',
+            DB_NAME=os.path.join(self.workdir, 'db.sqlite3'),
+            DEBUG='False',
+            ALLOWED_HOSTS='127.0.0.1,localhost',
+            STELLAR_ASYNC_VIEWS='True' if mode == 'asgi' else 'False',
+            # Closed-loop clients from one address would otherwise be rate limited
+            STELLAR_THROTTLE_ENABLED='False',
+            **extra_env,
+        )
+        if mode == 'asgi':
+            target = ['stellar_project.asgi:application', '--worker-class', 'uvicorn.workers.UvicornWorker']
+        else:
+            target = ['stellar_project.wsgi:application', '--threads', str(threads)]
+        self.command = [
+            sys.executable, '-m', 'gunicorn', *target,
+            '--bind', f'127.0.0.1:{self.port}', '--workers', str(workers), '--log-level', 'warning',
+        ]
+        self.process = None
+
+    def start(self):
+        subprocess.run(
+            [sys.executable, 'manage.py', 'migrate', '--run-syncdb', '--verbosity', '0'],
+            cwd=BACKEND_DIR, env=self.env, check=True
+        )
+        self.process = subprocess.Popen(self.command, cwd=BACKEND_DIR, env=self.env)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                requests.get(f'{self.url}/api/auth/wallet/', timeout=5)
+                return self
+            except requests.RequestException:
+                time.sleep(0.2)
+        self.stop()
+        raise RuntimeError('app server did not start')
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=10)
+
+
+class Workload:
+    """Builds each scenario's requests over a fixed set of wallets"""
+
+    def __init__(self, base_url, accounts, history_limit):
+        self.base_url = base_url
+        self.accounts = [Keypair.random() for _ in range(accounts)]
+        self.history_limit = history_limit
+        self._challenges = []
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def _next(self):
+        with self._lock:
+            self._counter += 1
+            return self._counter
+
+    def _account(self):
+        return self.accounts[self._next() % len(self.accounts)]
+
+    def prepare_verify(self, session, count):
+        """Verify consumes challenges, so they are issued up front (not timed)"""
+        challenges = []
+        for _ in range(count):
+            keypair = self._account()
+            response = session.post(f'{self.base_url}/api/auth/connect/', json={'public_key': keypair.public_key})
+            response.raise_for_status()
+            challenges.append((keypair.public_key, response.json()['challenge']))
+        self._challenges = challenges
+
+    def request(self, scenario, session, client_index):
+        if scenario == 'connect':
+            return session.post(
+                f'{self.base_url}/api/auth/connect/', json={'public_key': self._account().public_key}
+            )
+        if scenario == 'verify':
+            with self._lock:
+                public_key, challenge = self._challenges.pop()
+            return session.post(f'{self.base_url}/api/auth/verify/', json={
+                'public_key': public_key, 'signature': 'load-test', 'challenge': challenge,
+            })
+        if scenario == 'balance':
+            return session.get(f'{self.base_url}/api/auth/balance/{self._account().public_key}/')
+        if scenario == 'payment':
+            # One source per client: concurrent clients never contend for a sequence number
+            source = self.accounts[client_index % len(self.accounts)]
+            return session.post(f'{self.base_url}/api/auth/payment/', json={
+                'destination': self._account().public_key, 'amount': '1', 'secret_key': source.secret,
+            })
+        if scenario == 'transactions':
+            return session.get(
+                f'{self.base_url}/api/auth/transactions/{self._account().public_key}/',
+                params={'limit': self.history_limit}
+            )
+        raise ValueError(scenario)
+
+
+def run_scenario(workload, horizon, scenario, concurrency, total, warmup):
+    """
+    Closed loop: `concurrency` clients issue `total` requests between them
+    The first `warmup` requests (lazy imports, connection pools) are not recorded
+    """
+    if scenario == 'verify':
+        workload.prepare_verify(requests.Session(), total + warmup)
+
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+
+    def drive(count, record):
+        remaining = [count]
+
+        def client(index):
+            session = requests.Session()
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                started = time.perf_counter()
+                try:
+                    code = workload.request(scenario, session, index).status_code
+                except requests.RequestException:
+                    code = 'error'
+                elapsed = (time.perf_counter() - started) * 1000
+                if record:
+                    with lock:
+                        latencies.append(elapsed)
+                        statuses[code] += 1
+
+        clients = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+
+    drive(warmup, record=False)
+    horizon.state.reset_counters()
+    started = time.perf_counter()
+    drive(total, record=True)
+    elapsed = time.perf_counter() - started
+    upstream = horizon.state.snapshot()
+
+    latencies.sort()
+    failures = sum(count for code, count in statuses.items() if code == 'error' or code >= 400)
+    upstream_total = sum(upstream.values())
+    return {
+        'scenario': scenario,
+        'concurrency': concurrency,
+        'requests': total,
+        'failures': failures,
+        'status_codes': {str(code): count for code, count in sorted(statuses.items(), key=str)},
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 1),
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 2),
+            'p50': round(_percentile(latencies, 50), 2),
+            'p95': round(_percentile(latencies, 95), 2),
+            'p99': round(_percentile(latencies, 99), 2),
+            'max': round(latencies[-1], 2),
+        },
+        'upstream': {
+            'total': upstream_total,
+            'per_request': round(upstream_total / total, 2),
+            'by_kind': upstream,
+        },
+    }
+
+
+def _print_row(row, previous=None):
+    latency = row['latency_ms']
+    line = (f'{row["scenario"]:<13}{row["concurrency"]:>5}{row["requests"]:>7}{row["failures"]:>6}'
+            f'{row["throughput_rps"]:>9.1f}{latency["p50"]:>9.1f}{latency["p95"]:>9.1f}{latency["p99"]:>9.1f}'
+            f'{row["upstream"]["per_request"]:>10.2f}')
+    if previous:
+        def change(new, old):
+            return f'{(new - old) / old * 100:+.0f}%' if old else 'n/a'
+        line += (f'   vs {previous["commit"]}: rps {change(row["throughput_rps"], previous["throughput_rps"])}'
+                 f', p95 {change(latency["p95"], previous["latency_ms"]["p95"])}')
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API load test against a local fake Horizon')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--concurrency', default='1,10,50', help='comma-separated client counts')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario and concurrency level')
+    parser.add_argument('--warmup', type=int, default=10, help='unrecorded requests before each run')
+    parser.add_argument('--accounts', type=int, default=50, help='distinct wallets used by the clients')
+    parser.add_argument('--history-limit', type=int, default=10)
+    parser.add_argument('--latency', type=float, default=0.05, help='fake Horizon latency per call, seconds')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of Horizon calls answered with 503')
+    parser.add_argument('--server-mode', choices=('wsgi', 'asgi'), default='wsgi')
+    parser.add_argument('--workers', type=int, default=3, help='gunicorn workers (entrypoint.sh uses 3)')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per wsgi worker')
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='extra app setting, e.g. --env STELLAR_BALANCE_CACHE_TTL=0')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/load-<commit>-<time>.json)')
+    parser.add_argument('--compare', help='previous result file to compare against')
+    args = parser.parse_args()
+
+    scenarios = [name for name in args.scenarios.split(',') if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+    levels = [int(level) for level in args.concurrency.split(',')]
+    extra_env = dict(item.split('=', 1) for item in args.env)
+
+    horizon = FakeHorizon(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate).start()
+    app = AppServer(horizon.url, args.server_mode, args.workers, args.threads, extra_env).start()
+    workload = Workload(app.url, args.accounts, args.history_limit)
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        previous = {
+            (row['scenario'], row['concurrency']): dict(row, commit=baseline['commit'])
+            for row in baseline['results']
+        }
+
+    commit = _git_commit()
+    print(f'commit {commit}, {args.server_mode} x{args.workers}, fake Horizon {args.latency * 1000:.0f} ms/call'
+          f', error rate {args.error_rate:.0%}')
+    print(f'{"scenario":<13}{"conc":>5}{"reqs":>7}{"fail":>6}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}'
+          f'{"p99 ms":>9}{"upstream":>10}')
+    results = []
+    try:
+        for scenario in scenarios:
+            for concurrency in levels:
+                row = run_scenario(workload, horizon, scenario, concurrency, args.requests, args.warmup)
+                results.append(row)
+                _print_row(row, previous.get((scenario, concurrency)))
+    finally:
+        app.stop()
+        horizon.stop()
+
+    output = args.output or os.path.join(
+        BACKEND_DIR, 'benchmarks', 'results',
+        f'load-{commit}-{datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")}.json'
+    )
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'commit': commit,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+            'config': {
+                'server_mode': args.server_mode,
+                'workers': args.workers,
+                'threads': args.threads,
+                'latency': args.latency,
+                'jitter': args.jitter,
+                'error_rate': args.error_rate,
+                'accounts': args.accounts,
+                'history_limit': args.history_limit,
+                'requests': args.requests,
+                'warmup': args.warmup,
+                'env': extra_env,
+            },
+            'results': results,
+        }, f, indent=2)
+    print(f'results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
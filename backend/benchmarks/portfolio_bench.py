@@ -0,0 +1,69 @@
+"""
+Portfolio valuation benchmark
+
+Values --accounts accounts holding the same --assets assets (plus XLM) with
+one POST to the portfolio endpoint, against a local fake Horizon, and counts
+the upstream quote lookups:
+
+- cold: empty quote cache; each distinct asset is quoted once
+- warm: the same request again while the quotes are fresh
+
+    python benchmarks/portfolio_bench.py --accounts 1000 --assets 5
+"""
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from stellar_sdk import Keypair  # noqa: E402
+
+from fake_horizon import FakeHorizon  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Portfolio valuation benchmark')
+    parser.add_argument('--accounts', type=int, default=1000)
+    parser.add_argument('--assets', type=int, default=5, help='trustlines per account, up to 6')
+    parser.add_argument('--latency', type=float, default=0.02, help='fake Horizon latency per call, seconds')
+    args = parser.parse_args()
+
+    horizon = FakeHorizon(latency=args.latency, tx_count=1, asset_count=args.assets).start()
+    os.environ['STELLAR_HORIZON_URL'] = horizon.url
+    os.environ['STELLAR_BULK_BALANCE_MAX_KEYS'] = str(args.accounts)
+    os.environ['STELLAR_BULK_BALANCE_TIMEOUT'] = '120'
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stellar_project.settings')
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.test import Client
+
+    settings.ALLOWED_HOSTS = ['*']
+    cache.clear()
+    client = Client()
+    public_keys = [Keypair.from_raw_ed25519_seed(i.to_bytes(32, 'big')).public_key for i in range(args.accounts)]
+
+    print(f'{args.accounts} accounts x {args.assets} assets + XLM, {args.latency * 1000:.0f} ms per Horizon call')
+    print(f'{"run":<6}{"ms":>8}{"accounts calls":>16}{"quote calls":>13}{"naive quote calls":>19}{"total value":>18}')
+    for run in ('cold', 'warm'):
+        horizon.state.reset_counters()
+        started = time.perf_counter()
+        response = client.post('/api/auth/portfolio/', {'public_keys': public_keys}, content_type='application/json')
+        elapsed = (time.perf_counter() - started) * 1000
+        data = response.json()
+        calls = horizon.state.snapshot()
+        quote_calls = calls.get('paths', 0) + calls.get('order_book', 0)
+        naive = sum(
+            1 for account in data['accounts'] for balance in account.get('balances', ())
+            if balance['asset_type'] != 'native'
+        )
+        print(f'{run:<6}{elapsed:>8.0f}{calls.get("accounts", 0):>16}{quote_calls:>13}{naive:>19}'
+              f'{data["total_value"]:>18}')
+    horizon.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Live push vs polling benchmark
+
+N browser clients watch one account for --duration seconds while new
+operations land every --activity-interval seconds. Compares the Horizon calls
+and the delay before clients see a new operation when they
+
+- poll: fetch balance and history every --poll-interval seconds each
+- push: subscribe to the push hub, which keeps one upstream stream
+
+    python benchmarks/push_bench.py --clients 50 --duration 10
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_horizon import FakeHorizon  # noqa: E402
+
+ACCOUNT = 'GBENCHPUSHACCOUNT000000000000000000000000000000000000000'
+
+
+def drive_activity(horizon, duration, interval, landed):
+    """Append one operation every `interval` seconds, recording when each landed"""
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        time.sleep(interval)
+        tx = horizon.state.add_activity(ACCOUNT)[0]
+        landed[tx['paging_token']] = time.monotonic()
+
+
+def run_polling(horizon, clients, duration, poll_interval, activity_interval):
+    from authentication.balances import get_balances
+    from authentication.history import fetch_history
+    from authentication.horizon import get_server
+
+    landed, seen = {}, {}
+    lock = threading.Lock()
+    stop = threading.Event()
+    server = get_server()
+
+    def client():
+        while not stop.is_set():
+            get_balances(server, ACCOUNT)
+            records = fetch_history(server, ACCOUNT, 10)
+            now = time.monotonic()
+            with lock:
+                for record in records:
+                    token = record['transaction_hash']
+                    seen.setdefault(token, now)
+            stop.wait(poll_interval)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    driver = threading.Thread(target=drive_activity, args=(horizon, duration, activity_interval, landed))
+    driver.start()
+    driver.join()
+    time.sleep(poll_interval)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    hashes = {tx['paging_token']: tx['hash'] for tx in horizon.state.account(ACCOUNT).transactions}
+    delays = [seen[hashes[token]] - at for token, at in landed.items() if hashes[token] in seen]
+    return delays
+
+
+def run_push(horizon, clients, duration, activity_interval):
+    from authentication.push import CLOSED, KEEPALIVE, Subscription, get_push_hub
+
+    hub = get_push_hub()
+    landed, delays = {}, []
+    lock = threading.Lock()
+    subscriptions = [Subscription(ACCOUNT) for _ in range(clients)]
+    for subscription in subscriptions:
+        hub.subscribe(subscription)
+
+    def client(subscription):
+        while True:
+            message = subscription.get(1)
+            if message is CLOSED:
+                return
+            if message is KEEPALIVE or not message.startswith(b'id: '):
+                continue
+            operation_id = int(message.split(b'\n', 1)[0][4:])
+            now = time.monotonic()
+            # Operation ids carry their transaction's paging token above 12 bits
+            token = str(operation_id >> 12 << 12)
+            with lock:
+                if token in landed:
+                    delays.append(now - landed[token])
+
+    threads = [threading.Thread(target=client, args=(s,)) for s in subscriptions]
+    for thread in threads:
+        thread.start()
+    # Let the feed connect before activity starts
+    time.sleep(0.5)
+    horizon.state.reset_counters()
+    drive_activity(horizon, duration, activity_interval, landed)
+    time.sleep(0.5)
+    for subscription in subscriptions:
+        subscription.close()
+        hub.unsubscribe(subscription)
+    for thread in threads:
+        thread.join()
+    return delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Live push vs polling benchmark')
+    parser.add_argument('--clients', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--poll-interval', type=float, default=5)
+    parser.add_argument('--activity-interval', type=float, default=1)
+    parser.add_argument('--latency', type=float, default=0.01, help='fake Horizon latency per call, seconds')
+    args = parser.parse_args()
+
+    horizon = FakeHorizon(latency=args.latency, tx_count=20).start()
+    os.environ['STELLAR_HORIZON_URL'] = horizon.url
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stellar_project.settings')
+    import django
+    django.setup()
+
+    print(f'{args.clients} clients, {args.duration:.0f}s, one operation every {args.activity_interval}s')
+    print(f'{"mode":<8}{"horizon calls":>15}{"calls/s":>9}{"mean delay ms":>15}{"max delay ms":>14}')
+
+    horizon.state.reset_counters()
+    delays = run_polling(horizon, args.clients, args.duration, args.poll_interval, args.activity_interval)
+    calls = sum(horizon.state.snapshot().values())
+    print(f'{"poll":<8}{calls:>15}{calls / args.duration:>9.1f}'
+          f'{sum(delays) / max(len(delays), 1) * 1000:>15.0f}{max(delays, default=0) * 1000:>14.0f}')
+
+    delays = run_push(horizon, args.clients, args.duration, args.activity_interval)
+    calls = sum(horizon.state.snapshot().values())
+    print(f'{"push":<8}{calls:>15}{calls / args.duration:>9.1f}'
+          f'{sum(delays) / max(len(delays), 1) * 1000:>15.0f}{max(delays, default=0) * 1000:>14.0f}')
+    horizon.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Balance and transaction serialization micro-benchmark
+
+Times the response body for N balance and N transaction records built from
+fake Horizon data, per record, three ways:
+
+- drf:       Serializer(records, many=True).data rendered by JSONRenderer
+- represent: Serializer.represent(records) rendered by JSONRenderer
+- fast:      Serializer.represent(records) rendered by FastJSONRenderer
+
+and checks that all three produce the same bytes. Floats DRF writes in
+exponent form, and NaN and infinity (which DRF refuses), are checked too.
+
+    python benchmarks/serialization_bench.py --sizes 10,100,10000
+"""
+import argparse
+import os
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from fake_horizon import FakeAccount  # noqa: E402
+
+ACCOUNT = 'GBENCHSERIALIZEACCOUNT000000000000000000000000000000000'
+
+
+def balance_records(count):
+    """`count` shaped balances, cycling through the fake account's trustline and XLM"""
+    from authentication.balances import shape_balances
+
+    account = FakeAccount(ACCOUNT, 1).account_record()
+    trustline, native = account['balances']
+    account['balances'] = [
+        native if i % 2 else dict(trustline, asset_code=f'A{i}') for i in range(count)
+    ]
+    return shape_balances(account)
+
+
+def transaction_records(count):
+    """`count` shaped operations from the fake account's history"""
+    from authentication.history import operation_to_transaction_data
+
+    operations = []
+    tx_count = count
+    while len(operations) < count:
+        operations = FakeAccount(ACCOUNT, tx_count).operations
+        tx_count *= 2
+    return [operation_to_transaction_data(op) for op in operations[:count]]
+
+
+def per_record_us(fn, records, budget):
+    """Best-of-runs microseconds per record, running for about `budget` seconds"""
+    best = float('inf')
+    deadline = time.perf_counter() + budget
+    while True:
+        started = time.perf_counter()
+        fn(records)
+        best = min(best, time.perf_counter() - started)
+        if time.perf_counter() > deadline:
+            return best / len(records) * 1e6
+
+
+EDGE_FLOATS = (1e16, 1e-7, -1e-5, 1.5e300, 5e-324, 1e-4, 0.1, -0.0, 9999999999999998.0)
+
+
+def check_edge_floats(drf_renderer, fast_renderer):
+    """Exit unless the fast renderer matches DRF on awkward floats, including its ValueError"""
+    for value in EDGE_FLOATS:
+        data = [{'amount': '1.0', 'value': value}]
+        if fast_renderer().render(data) != drf_renderer().render(data):
+            raise SystemExit(f'{value!r}: fast path output differs from DRF')
+    for value in (float('nan'), float('inf'), float('-inf')):
+        try:
+            fast_renderer().render({'value': value})
+        except ValueError:
+            continue
+        raise SystemExit(f'{value!r}: fast path rendered a value DRF rejects')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serialization micro-benchmark')
+    parser.add_argument('--sizes', default='10,100,10000')
+    parser.add_argument('--budget', type=float, default=1.0, help='seconds per measurement')
+    args = parser.parse_args()
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stellar_project.settings')
+    import django
+    django.setup()
+    from rest_framework.renderers import JSONRenderer
+
+    from authentication.renderers import FastJSONRenderer, orjson
+    from authentication.serializers import BalanceSerializer, TransactionSerializer
+
+    check_edge_floats(JSONRenderer, FastJSONRenderer)
+
+    kinds = {
+        'balance': (BalanceSerializer, balance_records),
+        'transaction': (TransactionSerializer, transaction_records),
+    }
+    print(f'orjson {"installed" if orjson else "missing"}; microseconds per record, best of runs')
+    print(f'{"payload":<13}{"records":>8}{"drf":>9}{"represent":>11}{"fast":>9}{"speed-up":>10}')
+    for name, (serializer_class, build) in kinds.items():
+        for size in (int(size) for size in args.sizes.split(',')):
+            records = build(size)
+            paths = {
+                'drf': lambda r: JSONRenderer().render(serializer_class(r, many=True).data),
+                'represent': lambda r: JSONRenderer().render(serializer_class.represent(r)),
+                'fast': lambda r: FastJSONRenderer().render(serializer_class.represent(r)),
+            }
+            bodies = {path: fn(records) for path, fn in paths.items()}
+            if len(set(bodies.values())) != 1:
+                raise SystemExit(f'{name} x{size}: fast path output differs from DRF')
+            timings = {path: per_record_us(fn, records, args.budget) for path, fn in paths.items()}
+            print(f'{name:<13}{size:>8}{timings["drf"]:>9.2f}{timings["represent"]:>11.2f}'
+                  f'{timings["fast"]:>9.2f}{timings["drf"] / timings["fast"]:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""
+Worker startup benchmark
+
+Launches the app under gunicorn (gunicorn.conf.py) against a local fake
+Horizon in three modes:
+
+- cold:    every worker imports the app itself; nothing is warmed up
+- warm:    every worker imports the app itself and warms up before serving
+- preload: the master imports and warms the app once, then forks
+
+and reports, per mode:
+
+- ready:  seconds from launch until the first balance request is answered
+- first:  the slowest of the next --requests balance requests, each on a new
+          connection, which includes the other workers' first requests
+- p50:    their median
+- pss:    proportional set size of the master and all workers together, MiB
+- uss:    memory private to each worker on average, MiB (what copy-on-write
+          sharing saves)
+
+    python benchmarks/startup_bench.py --workers 3
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+from stellar_sdk import Keypair
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_horizon import FakeHorizon  # noqa: E402
+from load_test import BACKEND_DIR, AppServer  # noqa: E402
+
+MODES = {
+    'cold': {'GUNICORN_PRELOAD': 'False', 'GUNICORN_WARMUP': 'False'},
+    'warm': {'GUNICORN_PRELOAD': 'False', 'GUNICORN_WARMUP': 'True'},
+    'preload': {'GUNICORN_PRELOAD': 'True', 'GUNICORN_WARMUP': 'True'},
+}
+
+
+def _children(pid):
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def _memory_kib(pid):
+    """(pss, uss) of a process in KiB, from /proc/<pid>/smaps_rollup"""
+    fields = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(':')] = int(parts[1])
+    return fields.get('Pss', 0), fields.get('Private_Clean', 0) + fields.get('Private_Dirty', 0)
+
+
+def measure(horizon_url, mode, args):
+    app = AppServer(horizon_url, 'wsgi', args.workers, args.threads, MODES[mode])
+    subprocess.run(
+        [sys.executable, 'manage.py', 'migrate', '--run-syncdb', '--verbosity', '0'],
+        cwd=BACKEND_DIR, env=app.env, check=True
+    )
+    url = f'{app.url}/api/auth/balance/{Keypair.random().public_key}/'
+
+    started = time.monotonic()
+    app.process = subprocess.Popen(app.command, cwd=BACKEND_DIR, env=app.env)
+    try:
+        while True:
+            if time.monotonic() - started > 60:
+                raise RuntimeError(f'{mode}: app server did not start')
+            try:
+                if requests.get(url, timeout=30).status_code == 200:
+                    break
+            except requests.ConnectionError:
+                time.sleep(0.01)
+        ready = time.monotonic() - started
+
+        latencies = []
+        for _ in range(args.requests):
+            # A new connection each time, so the kernel spreads them over the workers
+            request_started = time.perf_counter()
+            requests.get(url, timeout=30, headers={'Connection': 'close'})
+            latencies.append((time.perf_counter() - request_started) * 1000)
+
+        master = app.process.pid
+        workers = _children(master)
+        pss = sum(_memory_kib(pid)[0] for pid in [master] + workers) / 1024
+        uss = statistics.mean(_memory_kib(pid)[1] for pid in workers) / 1024 if workers else 0.0
+    finally:
+        app.stop()
+    return ready, max(latencies), statistics.median(latencies), pss, uss
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Worker startup benchmark')
+    parser.add_argument('--workers', type=int, default=3)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=20, help='requests after the first one')
+    parser.add_argument('--modes', default=','.join(MODES))
+    args = parser.parse_args()
+
+    horizon = FakeHorizon(tx_count=1).start()
+    print(f'{args.workers} workers x {args.threads} threads')
+    print(f'{"mode":<9}{"ready s":>9}{"first ms":>10}{"p50 ms":>8}{"pss MiB":>9}{"uss MiB":>9}')
+    for mode in args.modes.split(','):
+        ready, first, p50, pss, uss = measure(horizon.url, mode, args)
+        print(f'{mode:<9}{ready:>9.2f}{first:>10.1f}{p50:>8.1f}{pss:>9.1f}{uss:>9.1f}')
+    horizon.stop()
+
+
+if __name__ == '__main__':
+    main()
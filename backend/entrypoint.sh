@@ -7,5 +7,18 @@ python manage.py migrate --noinput
 echo "Collecting static files..."
 python manage.py collectstatic --noinput
 
+# Each gunicorn worker writes its metrics here; /metrics aggregates them
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Bind, worker count, preloading and warm-up: see gunicorn.conf.py
+if [ "$SERVER_MODE" = "asgi" ]; then
+    echo "Starting Gunicorn server (ASGI, uvicorn workers)..."
+    export STELLAR_ASYNC_VIEWS=True
+    exec gunicorn stellar_project.asgi:application --config gunicorn.conf.py \
+        --worker-class uvicorn.workers.UvicornWorker
+fi
+
 echo "Starting Gunicorn server..."
-exec gunicorn stellar_project.wsgi:application --bind 0.0.0.0:8000 --workers 3
+exec gunicorn stellar_project.wsgi:application --config gunicorn.conf.py
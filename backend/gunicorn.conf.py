@@ -0,0 +1,89 @@
+"""
+Gunicorn settings (entrypoint.sh, or `gunicorn -c gunicorn.conf.py`)
+
+The app is preloaded: the master imports Django, DRF and stellar_sdk once,
+runs authentication.warmup.warm_up() and then forks workers that share all
+of it copy-on-write, instead of every worker importing and initialising it
+again. Garbage collection stays off in the master while it loads, and
+gc.freeze() moves everything loaded by then out of the collector's reach,
+so collections in the workers do not write to (and so copy) the shared
+pages. Each worker then builds its own Horizon pool before taking requests.
+
+GUNICORN_PRELOAD=False loads the app in every worker instead. The workers
+still warm up before serving unless GUNICORN_WARMUP=False.
+
+Workers are threaded (gthread): a long streaming response, such as a
+full-history export, ties up one of a worker's GUNICORN_THREADS threads
+rather than the whole worker, and the worker keeps reporting to the master
+while it runs, so the master does not kill it at GUNICORN_TIMEOUT. The
+timeout still catches a worker that stops responding. SERVER_MODE=asgi
+replaces the worker class with uvicorn's on the command line.
+
+With more than one worker the master warns at startup when Django's cache
+is per-process: challenge replay protection, token revocation, sequence
+numbers, submission leases and rate limits are only shared through it.
+"""
+import gc
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', '3'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+warmup = os.getenv('GUNICORN_WARMUP', 'True') == 'True'
+
+if preload_app:
+    # Objects allocated while loading are frozen before the fork; collecting
+    # them now would only move them between generations
+    gc.disable()
+
+
+def _check_shared_cache(server):
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stellar_project.settings')
+    from django.conf import settings
+
+    from authentication.cache import is_shared
+
+    if not is_shared():
+        server.log.warning(
+            '%d workers share nothing through %s: sign-in challenges can be replayed and revoked '
+            'tokens used on another worker, and sequence numbers, leases and rate limits are per '
+            'worker. Set DJANGO_CACHE_BACKEND to Redis or Memcached.',
+            server.cfg.workers, settings.CACHES['default']['BACKEND']
+        )
+
+
+def when_ready(server):
+    """Master, after the preloaded app is imported and before the first fork"""
+    # From server.cfg, which includes command-line overrides such as --workers
+    if server.cfg.workers > 1:
+        _check_shared_cache(server)
+    if not preload_app:
+        return
+    if warmup:
+        from authentication.warmup import warm_up
+
+        timings = warm_up()
+        server.log.info(
+            'Warmed up in %.0f ms (%s)', sum(timings.values()) * 1000,
+            ', '.join(f'{name} {seconds * 1000:.0f} ms' for name, seconds in timings.items())
+        )
+    gc.freeze()
+    gc.enable()
+
+
+def post_fork(server, worker):
+    gc.enable()
+
+
+def post_worker_init(worker):
+    """Worker, after the app is loaded and before it accepts requests"""
+    if not warmup:
+        return
+    from authentication.warmup import warm_up, warm_worker
+
+    if not preload_app:
+        warm_up()
+    warm_worker()
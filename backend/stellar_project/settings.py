@@ -30,6 +30,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'authentication.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -60,13 +61,50 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'stellar_project.wsgi.application'
 
-# Database
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# Database: SQLite unless DB_ENGINE=postgresql. Connections are kept open for
+# DB_CONN_MAX_AGE seconds and health-checked before reuse.
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite3')
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'stellar'),
+            'USER': os.getenv('DB_USER', 'stellar'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5'))},
+        }
     }
-}
+    # Optional read replica for the read-only views (see authentication.db)
+    if os.getenv('DB_REPLICA_HOST'):
+        DATABASES['replica'] = dict(
+            DATABASES['default'],
+            HOST=os.getenv('DB_REPLICA_HOST'),
+            PORT=os.getenv('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+            TEST={'MIRROR': 'default'},
+        )
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.getenv('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            # Seconds a writer waits for the lock before "database is locked"
+            'OPTIONS': {'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', '20'))},
+        }
+    }
+
+# SQLite connections are switched to this journal mode (WAL: readers never
+# block the writer) with synchronous=NORMAL, see authentication.db
+SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+
+DATABASE_ROUTERS = ['authentication.db.ReadReplicaRouter'] if 'replica' in DATABASES else []
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -107,8 +145,23 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'authentication.tokens.WalletTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
+    # Same bytes as DRF's JSONRenderer, encoded with orjson when installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'authentication.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Admission control for views with a throttle_scope or horizon_reads (see
+    # authentication/throttling.py and STELLAR_THROTTLE_* below)
+    'DEFAULT_THROTTLE_CLASSES': [
+        'authentication.throttling.TokenBucketThrottle',
+        'authentication.throttling.HorizonBudgetThrottle',
+    ],
+    # Never take the client address from X-Forwarded-For, which any client can
+    # send; see STELLAR_TRUSTED_PROXIES
+    'NUM_PROXIES': 0,
 }
 
 # Stellar Network Configuration
@@ -117,3 +170,207 @@ STELLAR_HORIZON_URL = os.getenv(
     'STELLAR_HORIZON_URL', 
     'https://horizon-testnet.stellar.org' if STELLAR_NETWORK == 'testnet' else 'https://horizon.stellar.org'
 )
+# Comma-separated list of Horizon URLs to fail over between (default: STELLAR_HORIZON_URL)
+STELLAR_HORIZON_URLS = [
+    url.strip() for url in os.getenv('STELLAR_HORIZON_URLS', '').split(',') if url.strip()
+] or [STELLAR_HORIZON_URL]
+
+# Shared Horizon client (one connection pool per worker process)
+STELLAR_HORIZON_POOL_SIZE = int(os.getenv('STELLAR_HORIZON_POOL_SIZE', '10'))
+STELLAR_HORIZON_NUM_RETRIES = int(os.getenv('STELLAR_HORIZON_NUM_RETRIES', '3'))
+STELLAR_HORIZON_CONNECT_TIMEOUT = float(os.getenv('STELLAR_HORIZON_CONNECT_TIMEOUT', '3.05'))
+STELLAR_HORIZON_READ_TIMEOUT = float(os.getenv('STELLAR_HORIZON_READ_TIMEOUT', '11'))
+STELLAR_HORIZON_SUBMIT_TIMEOUT = float(os.getenv('STELLAR_HORIZON_SUBMIT_TIMEOUT', '33'))
+# Open each worker's first Horizon connection at boot rather than on its first
+# request (see gunicorn.conf.py)
+STELLAR_WARMUP_HORIZON = os.getenv('STELLAR_WARMUP_HORIZON', 'True') == 'True'
+
+# Failover between STELLAR_HORIZON_URLS: a URL's circuit opens after this many
+# consecutive failures and is probed again after the cooldown (seconds). Reads
+# still unanswered after the hedge delay (seconds, 0 = off) are also sent to
+# the next URL; submissions are never hedged.
+STELLAR_HORIZON_BREAKER_FAILURES = int(os.getenv('STELLAR_HORIZON_BREAKER_FAILURES', '5'))
+STELLAR_HORIZON_BREAKER_COOLDOWN = float(os.getenv('STELLAR_HORIZON_BREAKER_COOLDOWN', '30'))
+STELLAR_HORIZON_HEDGE_DELAY = float(os.getenv('STELLAR_HORIZON_HEDGE_DELAY', '0'))
+
+# Per-client rate limits on the public endpoints, '<requests>/<s|min|hour|day>'
+# (empty = unlimited). Each client (signed-in wallet, else IP address) gets a
+# token bucket per endpoint holding that many requests and refilling evenly
+# over the period; over-limit calls get 429 with Retry-After. Buckets live in
+# the cache, so they are shared between workers only with a shared backend.
+# Anonymous clients are told apart by REMOTE_ADDR, or by X-Real-IP when the
+# request comes from one of these proxy addresses or networks (comma-separated,
+# e.g. the frontend's nginx, which overwrites X-Real-IP). Empty = no proxy.
+STELLAR_TRUSTED_PROXIES = [
+    proxy.strip() for proxy in os.getenv('STELLAR_TRUSTED_PROXIES', '').split(',') if proxy.strip()
+]
+STELLAR_THROTTLE_ENABLED = os.getenv('STELLAR_THROTTLE_ENABLED', 'True') == 'True'
+STELLAR_THROTTLE_RATES = {
+    'connect': os.getenv('STELLAR_THROTTLE_CONNECT', '10/min'),
+    'balance': os.getenv('STELLAR_THROTTLE_BALANCE', '60/min'),
+    'bulk_balance': os.getenv('STELLAR_THROTTLE_BULK_BALANCE', '10/min'),
+    'portfolio': os.getenv('STELLAR_THROTTLE_PORTFOLIO', '10/min'),
+    'history': os.getenv('STELLAR_THROTTLE_HISTORY', '30/min'),
+    'export': os.getenv('STELLAR_THROTTLE_EXPORT', '5/min'),
+}
+
+# Horizon budget shared by every worker: calls per second and burst (0 = no
+# budget; public Horizon allows 3600 requests an hour per IP). Anonymous reads
+# are only admitted while more than the reserve fraction of the burst is left
+# and are otherwise shed with 429 and Retry-After; only the ASGI views first
+# wait up to the queue time (seconds) for budget, as they hold no thread while
+# waiting. They are also shed for Horizon's Retry-After (or the default below)
+# after it answers 429.
+STELLAR_HORIZON_BUDGET_RATE = float(os.getenv('STELLAR_HORIZON_BUDGET_RATE', '0'))
+STELLAR_HORIZON_BUDGET_BURST = int(os.getenv('STELLAR_HORIZON_BUDGET_BURST', '60'))
+STELLAR_HORIZON_BUDGET_RESERVE = float(os.getenv('STELLAR_HORIZON_BUDGET_RESERVE', '0.25'))
+STELLAR_HORIZON_BUDGET_QUEUE = float(os.getenv('STELLAR_HORIZON_BUDGET_QUEUE', '1'))
+STELLAR_HORIZON_RETRY_AFTER = float(os.getenv('STELLAR_HORIZON_RETRY_AFTER', '5'))
+
+# Transaction history: 'operations' pages account operations with joined
+# transactions and fetches the rest of the operations of transactions that
+# also involve other accounts, 'fanout' lists transactions and fetches their
+# operations concurrently. Both return every operation of each transaction.
+STELLAR_HISTORY_STRATEGY = os.getenv('STELLAR_HISTORY_STRATEGY', 'operations')
+STELLAR_HISTORY_CONCURRENCY = int(os.getenv('STELLAR_HISTORY_CONCURRENCY', '8'))
+
+# Serve balance, payment and history from coroutine views (requires an ASGI
+# worker, see entrypoint.sh SERVER_MODE=asgi)
+STELLAR_ASYNC_VIEWS = os.getenv('STELLAR_ASYNC_VIEWS', 'False') == 'True'
+
+# /metrics answers only connections from these addresses or networks
+# (comma-separated, e.g. the Prometheus server's); everyone else gets 403.
+# Checked against REMOTE_ADDR: scrape the backend directly, not through a proxy.
+METRICS_ALLOWED_NETWORKS = [
+    network.strip() for network in os.getenv('METRICS_ALLOWED_NETWORKS', '127.0.0.1,::1').split(',')
+    if network.strip()
+]
+
+# Cache (defaults to per-process memory; point at a shared backend such as
+# django.core.cache.backends.redis.RedisCache to share across workers)
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('DJANGO_CACHE_LOCATION', 'stellar'),
+    }
+}
+if CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    # The default of 300 entries is culled by a single bulk balance request
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.getenv('DJANGO_CACHE_MAX_ENTRIES', '10000'))}
+
+# Sign-in challenges: with STATELESS_CHALLENGES they are signed with
+# SECRET_KEY and nothing is stored until verification; a challenge is valid
+# for CHALLENGE_TTL seconds and verifies once (its nonce is kept in the cache)
+STELLAR_STATELESS_CHALLENGES = os.getenv('STELLAR_STATELESS_CHALLENGES', 'False') == 'True'
+STELLAR_CHALLENGE_TTL = int(os.getenv('STELLAR_CHALLENGE_TTL', '900'))
+
+# AuthenticationSession rows are kept this many seconds past their expiry,
+# then deleted by `python manage.py purge_auth_sessions` this many per
+# transaction
+STELLAR_AUTH_SESSION_RETENTION = int(os.getenv('STELLAR_AUTH_SESSION_RETENTION', '86400'))
+STELLAR_AUTH_SESSION_PURGE_BATCH_SIZE = int(os.getenv('STELLAR_AUTH_SESSION_PURGE_BATCH_SIZE', '1000'))
+
+# Bearer tokens issued on sign-in (HS256 JWT); access tokens are short-lived,
+# refresh tokens are exchanged at token/refresh/ for a new pair
+STELLAR_JWT_SECRET = os.getenv('STELLAR_JWT_SECRET', SECRET_KEY)
+STELLAR_JWT_ISSUER = os.getenv('STELLAR_JWT_ISSUER', 'stellar-app')
+STELLAR_JWT_ACCESS_TTL = int(os.getenv('STELLAR_JWT_ACCESS_TTL', '900'))
+STELLAR_JWT_REFRESH_TTL = int(os.getenv('STELLAR_JWT_REFRESH_TTL', '604800'))
+
+# Live updates (SSE): keep-alive comment interval and how long one connection
+# lasts before the browser is asked to reconnect (seconds), and the most
+# accounts one worker follows upstream at a time
+STELLAR_PUSH_KEEPALIVE = float(os.getenv('STELLAR_PUSH_KEEPALIVE', '15'))
+STELLAR_PUSH_MAX_AGE = float(os.getenv('STELLAR_PUSH_MAX_AGE', '300'))
+STELLAR_PUSH_MAX_ACCOUNTS = int(os.getenv('STELLAR_PUSH_MAX_ACCOUNTS', '500'))
+
+# Balance cache: serve fresh for TTL seconds, then stale for up to STALE_TTL
+# more seconds while a background refresh runs. TTL=0 disables it. Balance
+# ETags (conditional.balances_etag) come from the newest last_modified_ledger
+# and the entry count of whatever is served, so a 304 is as stale as the cache.
+STELLAR_BALANCE_CACHE_TTL = float(os.getenv('STELLAR_BALANCE_CACHE_TTL', '5'))
+STELLAR_BALANCE_CACHE_STALE_TTL = float(os.getenv('STELLAR_BALANCE_CACHE_STALE_TTL', '30'))
+
+# Bulk balance endpoint: keys per request, parallel Horizon calls and the
+# latency budget (seconds) after which unanswered keys are reported as errors
+STELLAR_BULK_BALANCE_MAX_KEYS = int(os.getenv('STELLAR_BULK_BALANCE_MAX_KEYS', '500'))
+STELLAR_BULK_BALANCE_CONCURRENCY = int(os.getenv('STELLAR_BULK_BALANCE_CONCURRENCY', '10'))
+STELLAR_BULK_BALANCE_TIMEOUT = float(os.getenv('STELLAR_BULK_BALANCE_TIMEOUT', '5'))
+
+# Portfolio valuation: default reference asset ('XLM' or CODE:ISSUER), the
+# strict-send probe amount a quote is priced at, how long a pair's quote is
+# served fresh and then stale (seconds), and parallel quote lookups per request
+STELLAR_VALUATION_ASSET = os.getenv('STELLAR_VALUATION_ASSET', 'XLM')
+STELLAR_VALUATION_PROBE_AMOUNT = os.getenv('STELLAR_VALUATION_PROBE_AMOUNT', '100')
+STELLAR_VALUATION_QUOTE_TTL = float(os.getenv('STELLAR_VALUATION_QUOTE_TTL', '30'))
+STELLAR_VALUATION_QUOTE_STALE_TTL = float(os.getenv('STELLAR_VALUATION_QUOTE_STALE_TTL', '60'))
+STELLAR_VALUATION_CONCURRENCY = int(os.getenv('STELLAR_VALUATION_CONCURRENCY', '8'))
+
+# History source: 'horizon' always queries Horizon, 'index' serves accounts
+# tracked by the ingest_operations command from the local index and falls
+# back to Horizon for the rest, and for pages older than where an account's
+# ingestion started. The index only holds operations streamed for the
+# account: a transaction's operations on other accounts are left out.
+STELLAR_HISTORY_SOURCE = os.getenv('STELLAR_HISTORY_SOURCE', 'horizon')
+
+# ingest_operations: where new accounts start ('0' backfills full history,
+# 'now' only follows new activity), write batching and wallet rescans
+STELLAR_INGEST_START_CURSOR = os.getenv('STELLAR_INGEST_START_CURSOR', '0')
+STELLAR_INGEST_BATCH_SIZE = int(os.getenv('STELLAR_INGEST_BATCH_SIZE', '500'))
+STELLAR_INGEST_FLUSH_INTERVAL = float(os.getenv('STELLAR_INGEST_FLUSH_INTERVAL', '0.5'))
+STELLAR_INGEST_RESCAN_INTERVAL = float(os.getenv('STELLAR_INGEST_RESCAN_INTERVAL', '30'))
+
+# Account snapshots: the refresh_snapshots command keeps balances and the
+# operations of the latest HISTORY_LIMIT transactions of every wallet in the
+# database. With SNAPSHOT_READS on, balance and history reads are answered
+# from snapshots at most MAX_AGE seconds old (0: any age). Accounts are
+# refreshed BATCH_SIZE at a time with CONCURRENCY Horizon calls in flight;
+# unchanged accounts back off from MIN_INTERVAL to MAX_INTERVAL seconds.
+STELLAR_SNAPSHOT_READS = os.getenv('STELLAR_SNAPSHOT_READS', 'False') == 'True'
+STELLAR_SNAPSHOT_MAX_AGE = float(os.getenv('STELLAR_SNAPSHOT_MAX_AGE', '3600'))
+STELLAR_SNAPSHOT_HISTORY_LIMIT = int(os.getenv('STELLAR_SNAPSHOT_HISTORY_LIMIT', '20'))
+STELLAR_SNAPSHOT_BATCH_SIZE = int(os.getenv('STELLAR_SNAPSHOT_BATCH_SIZE', '100'))
+STELLAR_SNAPSHOT_CONCURRENCY = int(os.getenv('STELLAR_SNAPSHOT_CONCURRENCY', '8'))
+STELLAR_SNAPSHOT_MIN_INTERVAL = float(os.getenv('STELLAR_SNAPSHOT_MIN_INTERVAL', '30'))
+STELLAR_SNAPSHOT_MAX_INTERVAL = float(os.getenv('STELLAR_SNAPSHOT_MAX_INTERVAL', '1800'))
+
+# Transaction fees (stroops per operation): the fee oracle polls Horizon
+# fee_stats every POLL_INTERVAL seconds and bids the PERCENTILE of recently
+# charged fees, capped at FEE_CAP; BASE_FEE is used until the first poll
+STELLAR_BASE_FEE = int(os.getenv('STELLAR_BASE_FEE', '100'))
+STELLAR_FEE_PERCENTILE = os.getenv('STELLAR_FEE_PERCENTILE', 'p90')
+STELLAR_FEE_CAP = int(os.getenv('STELLAR_FEE_CAP', '100000'))
+STELLAR_FEE_POLL_INTERVAL = float(os.getenv('STELLAR_FEE_POLL_INTERVAL', '5'))
+
+# Payment submission: sequence numbers are allocated through the shared cache
+# ('cache'; with a per-process cache such as LocMemCache every payment loads
+# its source account instead, as 'horizon' always does) or in-process
+# ('local', single worker only). Optional channel accounts (comma-separated
+# secret keys) let one funding account have several payments in flight.
+# Channels, and source accounts without channels, are leased to one
+# submission at a time through the cache: a payment waits up to the checkout
+# timeout for a channel or the lock wait for its source account (seconds),
+# and is turned away with 503 rather than pinning a worker thread behind a
+# stuck lease. A lease left by a crashed worker expires after LEASE_TTL
+# seconds, which covers a submission and its bad_seq retries at
+# STELLAR_HORIZON_SUBMIT_TIMEOUT each.
+STELLAR_SEQUENCE_BACKEND = os.getenv('STELLAR_SEQUENCE_BACKEND', 'cache')
+STELLAR_BAD_SEQ_RETRIES = int(os.getenv('STELLAR_BAD_SEQ_RETRIES', '1'))
+STELLAR_CHANNEL_SECRETS = [s for s in os.getenv('STELLAR_CHANNEL_SECRETS', '').split(',') if s]
+STELLAR_CHANNEL_CHECKOUT_TIMEOUT = float(os.getenv('STELLAR_CHANNEL_CHECKOUT_TIMEOUT', '5'))
+STELLAR_SUBMISSION_LOCK_WAIT = float(os.getenv('STELLAR_SUBMISSION_LOCK_WAIT', '5'))
+STELLAR_SUBMISSION_LEASE_TTL = int(os.getenv('STELLAR_SUBMISSION_LEASE_TTL', '120'))
+
+# Bulk payouts: payment operations packed per transaction (protocol limit 100)
+# and transactions submitted in parallel when no channel accounts are set
+STELLAR_MAX_OPS_PER_TX = int(os.getenv('STELLAR_MAX_OPS_PER_TX', '100'))
+STELLAR_PAYOUT_CONCURRENCY = int(os.getenv('STELLAR_PAYOUT_CONCURRENCY', '4'))
+
+# Async payments: with STELLAR_PAYMENT_ASYNC (or ?async=1 per request) the
+# payment endpoint answers 202 with a job id and an in-process worker pool
+# submits the transaction. Transient failures are retried with exponential
+# backoff up to STELLAR_PAYMENT_JOB_MAX_ATTEMPTS times.
+STELLAR_PAYMENT_ASYNC = os.getenv('STELLAR_PAYMENT_ASYNC', 'False') == 'True'
+STELLAR_PAYMENT_WORKERS = int(os.getenv('STELLAR_PAYMENT_WORKERS', '4'))
+STELLAR_PAYMENT_JOB_MAX_ATTEMPTS = int(os.getenv('STELLAR_PAYMENT_JOB_MAX_ATTEMPTS', '5'))
+STELLAR_PAYMENT_JOB_BACKOFF = float(os.getenv('STELLAR_PAYMENT_JOB_BACKOFF', '1'))
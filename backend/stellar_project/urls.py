@@ -4,7 +4,10 @@ URL configuration for stellar_project project.
 from django.contrib import admin
 from django.urls import path, include
 
+from authentication.metrics import metrics_view
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('authentication.urls')),
+    path('metrics', metrics_view, name='metrics'),
 ]